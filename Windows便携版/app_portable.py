@@ -7,14 +7,26 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, simpledialog
 from PIL import Image, ImageDraw, ImageFont, ImageTk
+from functools import lru_cache
 from pathlib import Path
 import platform
 import sys
 import os
 
 
-def get_chinese_font(size: int = 24):
-    """获取中文字体"""
+# 已加载的字体对象最多缓存这么多个（按路径、字号、字体索引区分）
+FONT_CACHE_SIZE = 32
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def load_font(path, size, index=0):
+    """加载字体文件（带缓存），同样的路径、字号和字体索引只解析一次"""
+    return ImageFont.truetype(path, size, index=index)
+
+
+@lru_cache(maxsize=1)
+def find_chinese_font():
+    """找到第一个可用的中文字体（每个进程只查找一次），都不可用时返回 None"""
     system = platform.system()
     font_paths = []
     
@@ -36,11 +48,26 @@ def get_chinese_font(size: int = 24):
     
     for font_path in font_paths:
         try:
-            return ImageFont.truetype(font_path, size)
-        except:
+            load_font(font_path, 24)
+            return font_path
+        except (OSError, IOError):
             continue
     
-    return ImageFont.load_default()
+    return None
+
+
+def font_cache_info():
+    """字体缓存统计：命中、未命中次数和当前缓存的字体数量"""
+    info = load_font.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+
+
+def get_chinese_font(size: int = 24):
+    """获取中文字体（同样的字号返回同一个缓存的对象）"""
+    font_path = find_chinese_font()
+    if font_path is None:
+        return ImageFont.load_default()
+    return load_font(font_path, size)
 
 
 class ScreenshotEditor:
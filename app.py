@@ -10,117 +10,172 @@ from pathlib import Path
 import json
 import os
 
-from browser_screenshot import take_jd_screenshot
-from image_editor import edit_region, add_watermark, save_image, get_chinese_font
+from browser_screenshot import take_jd_screenshot, get_default_pool, jd_context_options
+from capture_cache import get_default_cache
+from image_editor import RegionEdit, WorkingImage, save_image, get_chinese_font
+from edit_spec import EditSpec, WatermarkSettings
 
 
+# 启动时在后台预热的浏览器上下文数量，0 表示不预热
+WARM_CONTEXTS = 2
+
 # 全局状态
-current_image = None
-original_image = None
+work = None  # 当前编辑的图片（WorkingImage，就地修改，可撤销）
 edit_history = []
 
 
-def screenshot_from_url(url: str):
-    """从 URL 截图"""
-    global current_image, original_image, edit_history
+def screenshot_from_url(url: str, refresh: bool = False, image_format: str = "png", quality: int = 85):
+    """从 URL 截图（默认使用缓存，refresh 为 True 时重新截图）"""
+    global work, edit_history
     
     if not url or not url.startswith("http"):
         return None, "❌ 请输入有效的 URL"
     
     try:
-        output_path = "temp_screenshot.png"
-        take_jd_screenshot(url, output_path)
-        
-        original_image = Image.open(output_path)
-        current_image = original_image.copy()
+        # 直接拿到解码后的图片，不经过临时文件
+        image = take_jd_screenshot(
+            url, None,
+            pool=get_default_pool(),
+            cache=get_default_cache(),
+            refresh=refresh,
+            result="image",
+            image_format=image_format,
+            # 质量是缓存键的一部分，PNG 不传，调整 JPEG 质量滑块不会让 PNG 缓存失效
+            quality=int(quality) if image_format == "jpeg" else None
+        )
+        work = WorkingImage(image)
         edit_history = []
         
-        return current_image, f"✅ 截图成功！尺寸: {current_image.width}x{current_image.height}"
+        return work.image, f"✅ 截图成功！尺寸: {image.width}x{image.height}"
     except Exception as e:
         return None, f"❌ 截图失败: {str(e)}"
 
 
 def load_local_image(image):
     """加载本地图片"""
-    global current_image, original_image, edit_history
+    global work, edit_history
     
     if image is None:
         return None, "❌ 请选择图片"
     
-    original_image = image.copy()
-    current_image = image.copy()
+    # 上传的图片每次都是新解码的，直接在上面修改
+    work = WorkingImage(image)
     edit_history = []
     
-    return current_image, f"✅ 图片已加载！尺寸: {current_image.width}x{current_image.height}"
+    return work.image, f"✅ 图片已加载！尺寸: {image.width}x{image.height}"
 
 
 def apply_edit(x: int, y: int, width: int, height: int, new_text: str, 
                text_color: str, font_size: int, bg_color: str):
     """应用编辑"""
-    global current_image, edit_history
+    global edit_history
     
-    if current_image is None:
+    if work is None:
         return None, "❌ 请先加载图片"
     
     if width <= 0 or height <= 0:
-        return current_image, "❌ 请输入有效的区域尺寸"
+        return work.image, "❌ 请输入有效的区域尺寸"
     
     if not new_text:
-        return current_image, "❌ 请输入替换文字"
+        return work.image, "❌ 请输入替换文字"
     
     try:
-        current_image = edit_region(
-            current_image,
-            x, y, width, height,
-            new_text,
-            bg_color=bg_color,
-            text_color=text_color,
-            font_size=font_size
+        edit = RegionEdit(
+            int(x), int(y), int(width), int(height), new_text,
+            bg_color=bg_color, text_color=text_color, font_size=int(font_size)
         )
+        work.apply_edits([edit])
+        edit_history.append(edit.as_dict())
         
-        edit_history.append({
-            "x": x, "y": y, "width": width, "height": height,
-            "text": new_text
-        })
-        
-        return current_image, f"✅ 已修改！共 {len(edit_history)} 处修改"
+        return work.image, f"✅ 已修改！共 {len(edit_history)} 处修改"
+    except Exception as e:
+        return work.image, f"❌ 修改失败: {str(e)}"
+
+
+def apply_batch_edits(rows, text_color: str, font_size: int, bg_color: str):
+    """一次应用表格中的多处修改"""
+    global edit_history
+    
+    if work is None:
+        return None, "❌ 请先加载图片"
+    
+    edits = []
+    try:
+        for row in rows or []:
+            # 跳过空行（表格末尾常有空行）
+            if len(row) < 5 or not str(row[4] or "").strip():
+                continue
+            x, y, width, height = (int(float(v)) for v in row[:4])
+            if width <= 0 or height <= 0:
+                return work.image, f"❌ 区域尺寸无效: {row}"
+            edits.append(RegionEdit(x, y, width, height, str(row[4]),
+                                    bg_color=bg_color, text_color=text_color, font_size=int(font_size)))
+    except (TypeError, ValueError):
+        return work.image, "❌ 坐标和尺寸必须是数字"
+    
+    if not edits:
+        return work.image, "❌ 表格中没有要修改的区域"
+    
+    try:
+        timings = work.apply_edits(edits)
+        edit_history.extend(e.as_dict() for e in edits)
+        return work.image, (f"✅ 已批量修改 {len(edits)} 处（{sum(timings) * 1000:.0f} ms）！"
+                               f"共 {len(edit_history)} 处修改")
     except Exception as e:
-        return current_image, f"❌ 修改失败: {str(e)}"
+        return work.image, f"❌ 修改失败: {str(e)}"
 
 
 def undo_all():
     """撤销所有修改"""
-    global current_image, original_image, edit_history
+    global edit_history
     
-    if original_image is None:
+    if work is None:
         return None, "❌ 没有可撤销的修改"
     
-    current_image = original_image.copy()
+    work.reset()
     edit_history = []
-    return current_image, "✅ 已撤销所有修改"
+    return work.image, "✅ 已撤销所有修改"
 
 
 def save_with_watermark(add_wm: bool):
     """保存图片（带水印）"""
-    global current_image
-    
-    if current_image is None:
+    if work is None:
         return None, "❌ 没有可保存的图片"
     
     try:
         output_path = "edited_screenshot.png"
-        img_to_save = current_image.copy()
         
+        # 水印就地加在工作图片上，保存后撤销，不复制整图
         if add_wm:
-            img_to_save = add_watermark(img_to_save, "仅供内部培训使用")
-        
-        save_image(img_to_save, output_path)
+            work.add_watermark("仅供内部培训使用")
+        try:
+            save_image(work.image, output_path)
+        finally:
+            if add_wm:
+                work.undo()
         
         return output_path, f"✅ 已保存到: {Path(output_path).absolute()}"
     except Exception as e:
         return None, f"❌ 保存失败: {str(e)}"
 
 
+def export_spec(add_wm: bool):
+    """把已应用的修改导出为编辑规格，可以用 render_edits.py 套用到其他截图"""
+    if not edit_history:
+        return None, "❌ 还没有修改可以导出"
+    
+    try:
+        output_path = "edit_spec.json"
+        spec = EditSpec(
+            edits=[RegionEdit.from_dict(item) for item in edit_history],
+            watermark=WatermarkSettings() if add_wm else None
+        )
+        spec.save(output_path)
+        return output_path, f"✅ 已导出 {len(spec.edits)} 处修改到: {Path(output_path).absolute()}"
+    except Exception as e:
+        return None, f"❌ 导出失败: {str(e)}"
+
+
 def create_ui():
     """创建 Gradio 界面"""
     
@@ -154,6 +209,23 @@ def create_ui():
                         placeholder="https://item.jd.com/100012345.html",
                         lines=1
                     )
+                    with gr.Row():
+                        format_input = gr.Dropdown(
+                            label="截图格式",
+                            choices=["png", "jpeg"],
+                            value="png"
+                        )
+                        quality_input = gr.Slider(
+                            label="JPEG 质量",
+                            minimum=30,
+                            maximum=100,
+                            value=85,
+                            step=5
+                        )
+                    refresh_checkbox = gr.Checkbox(
+                        label="重新截图（忽略缓存）",
+                        value=False
+                    )
                     screenshot_btn = gr.Button("🔗 从URL截图", variant="primary")
                     
                     gr.Markdown("**或者**")
@@ -211,6 +283,18 @@ def create_ui():
                     
                     apply_btn = gr.Button("✅ 应用修改", variant="primary")
                 
+                # 批量编辑
+                with gr.Accordion("📋 批量修改", open=False):
+                    gr.Markdown("每行一处修改，使用上面的文字颜色、字体大小和背景色，一次全部应用")
+                    batch_table = gr.Dataframe(
+                        headers=["X", "Y", "宽度", "高度", "替换文字"],
+                        datatype=["number", "number", "number", "number", "str"],
+                        col_count=(5, "fixed"),
+                        row_count=3,
+                        type="array"
+                    )
+                    batch_btn = gr.Button("✅ 批量应用", variant="primary")
+                
                 # 操作区域
                 with gr.Accordion("💾 操作", open=True):
                     undo_btn = gr.Button("↩️ 撤销所有修改")
@@ -220,6 +304,7 @@ def create_ui():
                         value=True
                     )
                     save_btn = gr.Button("💾 保存图片", variant="secondary")
+                    export_btn = gr.Button("📤 导出编辑规格")
                     download_file = gr.File(label="下载")
         
         # 预设快捷坐标（常见京东页面位置）
@@ -239,7 +324,7 @@ def create_ui():
         # 事件绑定
         screenshot_btn.click(
             fn=screenshot_from_url,
-            inputs=[url_input],
+            inputs=[url_input, refresh_checkbox, format_input, quality_input],
             outputs=[image_display, status_text]
         )
         
@@ -256,6 +341,12 @@ def create_ui():
             outputs=[image_display, status_text]
         )
         
+        batch_btn.click(
+            fn=apply_batch_edits,
+            inputs=[batch_table, color_input, font_size_input, bg_color_input],
+            outputs=[image_display, status_text]
+        )
+        
         undo_btn.click(
             fn=undo_all,
             inputs=[],
@@ -267,11 +358,21 @@ def create_ui():
             inputs=[watermark_checkbox],
             outputs=[download_file, status_text]
         )
+        
+        export_btn.click(
+            fn=export_spec,
+            inputs=[watermark_checkbox],
+            outputs=[download_file, status_text]
+        )
     
     return app
 
 
 if __name__ == "__main__":
+    # 后台启动浏览器并准备好页面，第一次截图不用等浏览器启动
+    if WARM_CONTEXTS:
+        get_default_pool().warm(WARM_CONTEXTS, **jd_context_options())
+
     app = create_ui()
     app.launch(
         server_name="127.0.0.1",
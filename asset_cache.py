@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+静态资源缓存模块
+多次截图（包括不同的浏览器上下文、不同的进程）共用一个磁盘缓存，
+样式表、脚本、图片、字体等静态资源第一次下载后直接从缓存返回，减少流量和加载时间
+
+Playwright 的每个上下文都相当于无痕窗口，Chromium 自带的磁盘缓存不会在上下文之间共享，
+因此这里通过 context.route 拦截请求：命中时用缓存的内容 fulfill，未命中时 route.fetch()
+下载后写入缓存再返回。命中的响应带有 CACHE_HIT_HEADER 头，watch_requests 据此单独统计。
+"""
+
+from pathlib import Path
+from typing import Iterable, Optional
+import asyncio
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+
+from request_policy import CACHE_HIT_HEADER
+
+
+# 默认缓存的资源类型（Playwright 的 resource_type）
+CACHEABLE_TYPES = ("stylesheet", "script", "image", "font")
+
+# 不写入缓存的响应头：响应体已经解压，长度在返回时重新计算
+_DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "set-cookie"}
+
+
+class AssetCache:
+    """
+    静态资源磁盘缓存
+
+    每个条目是 <key>.body 加一个 <key>.json 元数据文件（状态码、响应头、创建时间）。
+    文件的修改时间记录最近一次命中，总大小超过 max_bytes 时按最近访问时间淘汰。
+    写入先写临时文件再替换，多个进程可以共用同一个目录。
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_bytes: int = 500 * 1024 * 1024,
+        ttl: float = 86400,
+        resource_types: Iterable[str] = CACHEABLE_TYPES
+    ):
+        """
+        Args:
+            cache_dir: 缓存目录，默认 ~/.cache/jd_screenshot/assets
+            max_bytes: 缓存总大小上限（字节）
+            ttl: 条目有效期（秒）
+            resource_types: 缓存的资源类型
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else Path.home() / ".cache" / "jd_screenshot" / "assets"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.resource_types = frozenset(resource_types)
+        # 单个资源超过总容量的 1/20 时不缓存，避免一个大文件挤掉所有条目
+        self.max_entry_bytes = max_bytes // 20
+
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.hit_bytes = 0
+        self.fetched_bytes = 0
+        self._lock = threading.Lock()
+        self._total = self._scan_size()
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str):
+        return self.cache_dir / f"{key}.body", self.cache_dir / f"{key}.json"
+
+    def _scan_size(self) -> int:
+        total = 0
+        for body_path in self.cache_dir.glob("*.body"):
+            try:
+                total += body_path.stat().st_size
+            except FileNotFoundError:
+                continue
+        return total
+
+    def get(self, url: str) -> Optional[dict]:
+        """
+        查找缓存，命中时刷新访问时间
+
+        Returns:
+            {"status", "headers", "body"}，未命中或已过期返回 None
+        """
+        body_path, meta_path = self._paths(self.key(url))
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            if time.time() - meta.get("created", 0) > self.ttl:
+                raise ValueError("expired")
+            body = body_path.read_bytes()
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            os.utime(body_path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+            self.hit_bytes += len(body)
+        return {"status": meta["status"], "headers": meta["headers"], "body": body}
+
+    def put(self, url: str, status: int, headers: dict, body: bytes) -> bool:
+        """缓存一个响应，不可缓存（非 200、no-store、按 Accept-Encoding 以外的请求头变化、过大）时返回 False"""
+        with self._lock:
+            self.fetched_bytes += len(body)
+        if status != 200 or len(body) > self.max_entry_bytes:
+            return False
+        if "no-store" in headers.get("cache-control", "").lower():
+            return False
+        # 缓存键只有 URL：按其它请求头（Cookie、User-Agent 等）返回不同内容的响应不缓存，
+        # 避免把一个版本返回给本该拿到另一个版本的请求；Accept-Encoding 不影响解压后的内容
+        vary = {name.strip().lower() for name in headers.get("vary", "").split(",") if name.strip()}
+        if vary - {"accept-encoding"}:
+            return False
+
+        key = self.key(url)
+        body_path, meta_path = self._paths(key)
+        suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+        kept = {name: value for name, value in headers.items() if name.lower() not in _DROP_HEADERS}
+        meta = json.dumps({"url": url, "status": status, "headers": kept, "created": time.time()},
+                          ensure_ascii=False)
+
+        tmp_body = body_path.with_name(f"{body_path.name}.{suffix}")
+        tmp_meta = meta_path.with_name(f"{meta_path.name}.{suffix}")
+        tmp_body.write_bytes(body)
+        tmp_meta.write_text(meta, encoding="utf-8")
+        os.replace(tmp_body, body_path)
+        os.replace(tmp_meta, meta_path)
+
+        with self._lock:
+            self.stored += 1
+            self._total += len(body)
+            over = self._total > self.max_bytes
+        if over:
+            self.evict()
+        return True
+
+    def _remove(self, key: str):
+        for path in self._paths(key):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def evict(self):
+        """删除过期条目，并按最近访问时间淘汰到总大小的 90% 以下"""
+        with self._lock:
+            now = time.time()
+            entries = []
+            total = 0
+            for body_path in self.cache_dir.glob("*.body"):
+                try:
+                    stat = body_path.stat()
+                except FileNotFoundError:
+                    continue
+                if now - stat.st_mtime > self.ttl:
+                    self._remove(body_path.stem)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, body_path.stem))
+                total += stat.st_size
+
+            # 多淘汰一些，避免之后每写入一个条目都要扫描整个目录
+            target = self.max_bytes * 0.9
+            entries.sort()
+            for _, size, key in entries:
+                if total <= target:
+                    break
+                self._remove(key)
+                total -= size
+            self._total = total
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            for path in self.cache_dir.glob("*"):
+                if path.is_file():
+                    path.unlink()
+            self._total = 0
+
+    def stats(self) -> dict:
+        """命中统计：命中 / 未命中次数、命中率、从缓存返回和从网络下载的字节数、缓存大小"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "stored": self.stored,
+                "hit_bytes": self.hit_bytes,
+                "fetched_bytes": self.fetched_bytes,
+                "size_bytes": self._total,
+            }
+
+    def _cacheable(self, request) -> bool:
+        return request.method == "GET" and request.resource_type in self.resource_types
+
+    def _fetch_sync(self, route):
+        """未命中时下载、写入缓存并返回（sync_api）"""
+        try:
+            response = route.fetch()
+            body = response.body()
+        except Exception:
+            # 下载失败时交给浏览器自己请求，错误照常出现在页面上
+            return route.fallback()
+        self.put(route.request.url, response.status, response.headers, body)
+        route.fulfill(response=response, body=body)
+
+    def _fulfill_cached(self, route, cached: dict):
+        headers = dict(cached["headers"])
+        headers[CACHE_HIT_HEADER] = "1"
+        return route.fulfill(status=cached["status"], headers=headers, body=cached["body"])
+
+    async def _handle_async(self, route):
+        """
+        async_api 的处理函数
+
+        读写缓存文件放到线程池中执行，不阻塞事件循环上同时进行的其它页面
+        """
+        loop = asyncio.get_event_loop()
+        cached = await loop.run_in_executor(None, self.get, route.request.url)
+        if cached is not None:
+            return await self._fulfill_cached(route, cached)
+
+        try:
+            response = await route.fetch()
+            body = await response.body()
+        except Exception:
+            return await route.fallback()
+        await loop.run_in_executor(None, self.put, route.request.url, response.status, response.headers, body)
+        await route.fulfill(response=response, body=body)
+
+    def install(self, context):
+        """
+        在浏览器上下文上安装缓存
+
+        请求拦截策略（RequestPolicy）应在之后安装：后安装的处理函数先执行，
+        策略放行的请求通过 route.fallback() 交给缓存。
+
+        Args:
+            context: sync_api 或 async_api 的 BrowserContext 或 Page
+
+        Returns:
+            context.route 的返回值，异步 API 下是协程，调用方需要 await
+        """
+        def handle(route):
+            request = route.request
+            if not self._cacheable(request):
+                return route.fallback()
+
+            if inspect.iscoroutinefunction(route.fetch):
+                return self._handle_async(route)
+
+            cached = self.get(request.url)
+            if cached is not None:
+                return self._fulfill_cached(route, cached)
+            return self._fetch_sync(route)
+
+        return context.route("**/*", handle)
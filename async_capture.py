@@ -0,0 +1,542 @@
+# -*- coding: utf-8 -*-
+"""
+异步批量截图模块
+基于 playwright.async_api，在共享的浏览器上并发截取多个页面
+"""
+
+from playwright.async_api import async_playwright
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
+import asyncio
+import hashlib
+import time
+
+from browser_screenshot import (
+    DEFAULT_USER_AGENT, DEFAULT_LAUNCH_ARGS, DEFAULT_JPEG_QUALITY, screenshot_page, format_suffix, get_profile
+)
+from readiness import ReadyCondition, wait_until_ready_async, NEXT_FRAME_SCRIPT
+from request_policy import RequestPolicy, RequestStats, watch_requests
+from capture_cache import CaptureCache
+from asset_cache import AssetCache
+from capture_metrics import CaptureMetrics
+from capture_retry import StageTimeouts, RetryPolicy, HostHealth, call_with_retry_async
+from memory_watchdog import MemoryWatchdog, browser_root_pids, find_new_browser, process_tree_rss
+
+
+@dataclass
+class CaptureResult:
+    """单个页面的截图结果"""
+    url: str
+    output_path: str
+    elapsed: float = 0.0
+    error: Optional[str] = None
+    ready: bool = True
+    timings: Dict[str, float] = field(default_factory=dict)
+    requests: Optional[dict] = None
+    cached: bool = False
+    formats: Optional[Dict[str, dict]] = None
+    page_height: Optional[int] = None
+    metrics: Optional[CaptureMetrics] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def attempts(self) -> int:
+        return self.metrics.attempts if self.metrics is not None else 1
+
+
+@dataclass
+class _Attempt:
+    """一次截图尝试的结果"""
+    metrics: CaptureMetrics
+    stats: RequestStats = field(default_factory=RequestStats)
+    data: bytes = b""
+    ready: bool = False
+    formats: Optional[Dict[str, dict]] = None
+
+
+def output_name_for_url(url: str, suffix: str = ".png") -> str:
+    """根据 URL 生成稳定的文件名（同一 URL 每次得到相同的名字）"""
+    digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+    return f"{digest}{suffix}"
+
+
+def format_label(image_format: str, quality: Optional[int] = None) -> str:
+    """格式对比报告中的名称，如 png、jpeg:80"""
+    if image_format.lower() == "png":
+        return "png"
+    return f"jpeg:{DEFAULT_JPEG_QUALITY if quality is None else quality}"
+
+
+class AsyncCaptureEngine:
+    """
+    异步并发截图引擎
+
+    启动 browsers 个 Chromium，每个浏览器最多同时打开 pages_per_browser 个页面，
+    所有浏览器加起来最多同时处理 max_concurrency 个页面。
+
+    设置 memory_limit_mb 后定期统计每个浏览器进程树的内存，超过阈值的浏览器不再分配新页面，
+    等进行中的页面完成后重启，其它浏览器照常工作。
+
+    传入 asset_cache 时所有页面共用一个静态资源磁盘缓存，同一站点的样式、脚本、图片只下载一次。
+
+    用法:
+        async with AsyncCaptureEngine(browsers=2, pages_per_browser=4) as engine:
+            async for result in engine.capture_many(urls, "output"):
+                print(result.url, result.error)
+    """
+
+    def __init__(
+        self,
+        browsers: int = 1,
+        pages_per_browser: int = 4,
+        max_concurrency: Optional[int] = None,
+        headless: bool = True,
+        launch_args: Optional[List[str]] = None,
+        retry: Optional[RetryPolicy] = None,
+        host_health: Optional[HostHealth] = None,
+        memory_limit_mb: Optional[float] = None,
+        memory_check_interval: float = 5.0,
+        asset_cache: Optional[AssetCache] = None
+    ):
+        """
+        Args:
+            browsers: 启动的浏览器数量
+            pages_per_browser: 每个浏览器同时打开的页面上限
+            max_concurrency: 总并发上限，默认等于 browsers * pages_per_browser
+            headless: 是否无头模式
+            launch_args: Chromium 启动参数
+            retry: 重试策略（见 capture_retry 模块），None 表示失败不重试
+            host_health: 主机失败统计，同一主机连续失败过多时暂停访问
+            memory_limit_mb: 单个浏览器进程树的内存阈值（MB），None 表示不监控
+            memory_check_interval: 内存采样间隔（秒）
+            asset_cache: 静态资源缓存（见 asset_cache 模块），None 表示不缓存
+        """
+        if browsers < 1 or pages_per_browser < 1:
+            raise ValueError("browsers 和 pages_per_browser 必须大于 0")
+
+        capacity = browsers * pages_per_browser
+        self.browser_count = browsers
+        self.pages_per_browser = pages_per_browser
+        self.max_concurrency = min(max_concurrency or capacity, capacity)
+        self.headless = headless
+        self.launch_args = list(DEFAULT_LAUNCH_ARGS if launch_args is None else launch_args)
+        self.retry = retry
+        self.host_health = host_health
+        self.asset_cache = asset_cache
+
+        self.memory = MemoryWatchdog(memory_limit_mb, memory_check_interval)
+
+        self._playwright = None
+        self._browsers = []
+        self._active = []
+        self._pids = []
+        self._draining = []
+        self._slots = None
+        self._launch_lock = None
+        self._watch_task = None
+        # 启动所有浏览器的耗时（秒），所有截图共用，不计入单次截图的指标
+        self.launch_seconds = 0.0
+
+    @classmethod
+    def for_profile(cls, profile: str, **kwargs) -> "AsyncCaptureEngine":
+        """按配置档创建引擎（启动参数、每个浏览器的页面上限），kwargs 可覆盖配置档中的参数"""
+        config = get_profile(profile)
+        options = {
+            'launch_args': list(config.launch_args),
+            'pages_per_browser': config.pages_per_browser,
+        }
+        options.update(kwargs)
+        return cls(**options)
+
+    async def _launch(self):
+        """启动一个浏览器，返回 (browser, 主进程号)"""
+        # 同一时间只启动一个，才能从进程列表的变化中认出新浏览器
+        async with self._launch_lock:
+            before = browser_root_pids() if self.memory.limit_bytes else set()
+            browser = await self._playwright.chromium.launch(
+                headless=self.headless,
+                args=self.launch_args
+            )
+            pid = find_new_browser(before) if self.memory.limit_bytes else None
+        return browser, pid
+
+    async def start(self):
+        """启动 Playwright 和所有浏览器"""
+        if self._playwright is not None:
+            return
+        started = time.perf_counter()
+        self._launch_lock = asyncio.Lock()
+        self._playwright = await async_playwright().start()
+        for _ in range(self.browser_count):
+            browser, pid = await self._launch()
+            self._browsers.append(browser)
+            self._pids.append(pid)
+            self._active.append(0)
+            self._draining.append(False)
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self.launch_seconds = round(time.perf_counter() - started, 4)
+        if self.memory.limit_bytes:
+            self._watch_task = asyncio.ensure_future(self._watch_memory())
+
+    async def _watch_memory(self):
+        """定期统计各浏览器内存，超过阈值的浏览器排空后重启"""
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(self.memory.interval)
+            pids = list(self._pids)
+            samples = await loop.run_in_executor(
+                None, lambda: [process_tree_rss([pid]) if pid else None for pid in pids]
+            )
+            measured = [rss for rss in samples if rss is not None]
+            if measured:
+                self.memory.record(sum(measured))
+            for index, rss in enumerate(samples):
+                if self.memory.over_limit(rss) and not self._draining[index]:
+                    self._draining[index] = True
+                    asyncio.ensure_future(self._restart_browser(index, rss))
+
+    async def _restart_browser(self, index: int, rss: int):
+        """等浏览器上进行中的页面全部完成后重启它"""
+        while self._active[index]:
+            await asyncio.sleep(0.1)
+        self.memory.record_restart(rss)
+        try:
+            await self._browsers[index].close()
+        except Exception as e:
+            print(f"关闭浏览器失败: {e}")
+        try:
+            self._browsers[index], self._pids[index] = await self._launch()
+        except Exception as e:
+            # 启动失败时仍放行，让截图报错而不是一直等待
+            print(f"重启浏览器失败: {e}")
+        self._draining[index] = False
+
+    def memory_stats(self) -> dict:
+        """浏览器内存统计：重启次数、峰值内存（所有浏览器之和）等"""
+        return self.memory.as_dict()
+
+    async def close(self):
+        """关闭所有浏览器"""
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            await asyncio.gather(self._watch_task, return_exceptions=True)
+            self._watch_task = None
+        for browser in self._browsers:
+            try:
+                await browser.close()
+            except Exception as e:
+                print(f"关闭浏览器失败: {e}")
+        self._browsers = []
+        self._active = []
+        self._pids = []
+        self._draining = []
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def _pick_browser(self) -> Optional[int]:
+        """选出当前页面最少、未满且不在排空中的浏览器，没有时返回 None"""
+        candidates = [
+            i for i in range(len(self._browsers))
+            if not self._draining[i] and self._active[i] < self.pages_per_browser
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda i: self._active[i])
+
+    async def _attempt(
+        self,
+        url: str,
+        width: int,
+        height: int,
+        device_scale_factor: float,
+        wait_time: float,
+        ready: Optional[Sequence[ReadyCondition]],
+        policy: Optional[RequestPolicy],
+        timeouts: StageTimeouts,
+        shot_options: dict,
+        compare_formats: Sequence[Tuple[str, Optional[int]]],
+        record_har: Optional[str] = None,
+        replay_har: Optional[str] = None
+    ) -> _Attempt:
+        """在空闲的浏览器上完成一次截图（不写盘），失败时抛出异常"""
+        outcome = _Attempt(metrics=CaptureMetrics(url))
+        metrics = outcome.metrics
+
+        queued = time.perf_counter()
+        async with self._slots:
+            metrics.add("queue", time.perf_counter() - queued)
+            index = self._pick_browser()
+            while index is None:
+                # 浏览器正在排空重启
+                await asyncio.sleep(0.05)
+                index = self._pick_browser()
+            self._active[index] += 1
+            context = None
+            try:
+                with metrics.stage("context"):
+                    context_options = {}
+                    if record_har:
+                        # HAR 在上下文关闭时写入
+                        context_options['record_har_path'] = str(record_har)
+                    context = await self._browsers[index].new_context(
+                        viewport={'width': width, 'height': height},
+                        device_scale_factor=device_scale_factor,
+                        user_agent=DEFAULT_USER_AGENT,
+                        **context_options
+                    )
+                    watch_requests(context, outcome.stats)
+                    # 缓存、HAR 回放先装，策略后装：策略先执行，放行的请求再交给它们
+                    if self.asset_cache is not None:
+                        await self.asset_cache.install(context)
+                    if replay_har:
+                        await context.route_from_har(str(replay_har), not_found="abort")
+                    if policy is not None:
+                        await policy.install(context, outcome.stats)
+                    page = await context.new_page()
+                with metrics.stage("goto"):
+                    await page.goto(url, wait_until='domcontentloaded', timeout=timeouts.goto * 1000)
+                with metrics.stage("ready"):
+                    outcome.ready = await wait_until_ready_async(page, ready, timeout=wait_time)
+                with metrics.stage("scroll"):
+                    await page.evaluate("window.scrollTo(0, 0)")
+                    await page.evaluate(NEXT_FRAME_SCRIPT)
+                with metrics.stage("screenshot"):
+                    outcome.data = await screenshot_page(
+                        page, None, timeout=timeouts.screenshot, **shot_options
+                    )
+                metrics.page_height = await page.evaluate("document.documentElement.scrollHeight")
+
+                if compare_formats:
+                    outcome.formats = {
+                        format_label(shot_options["image_format"], shot_options["quality"]): {
+                            "bytes": len(outcome.data), "seconds": metrics.stages["screenshot"]
+                        }
+                    }
+                    options = dict(shot_options)
+                    for other_format, other_quality in compare_formats:
+                        options.update(image_format=other_format, quality=other_quality)
+                        t = time.perf_counter()
+                        other = await screenshot_page(page, None, timeout=timeouts.screenshot, **options)
+                        outcome.formats[format_label(other_format, other_quality)] = {
+                            "bytes": len(other), "seconds": round(time.perf_counter() - t, 4)
+                        }
+            finally:
+                if context is not None:
+                    try:
+                        await context.close()
+                    except Exception:
+                        pass
+                self._active[index] -= 1
+
+        metrics.requests = outcome.stats.total
+        metrics.transferred_bytes = outcome.stats.loaded_bytes
+        metrics.asset_cache_hits = outcome.stats.cache_hits
+        metrics.asset_cache_bytes = outcome.stats.cache_bytes
+        return outcome
+
+    async def capture(
+        self,
+        url: str,
+        output_path: str,
+        width: int = 1920,
+        height: int = 1080,
+        wait_time: float = 3,
+        full_page: bool = False,
+        ready: Optional[Sequence[ReadyCondition]] = None,
+        policy: Optional[RequestPolicy] = None,
+        cache: Optional[CaptureCache] = None,
+        refresh: bool = False,
+        selector: Optional[str] = None,
+        clip: Optional[tuple] = None,
+        image_format: str = "png",
+        quality: Optional[int] = None,
+        compare_formats: Sequence[Tuple[str, Optional[int]]] = (),
+        timeouts: Optional[StageTimeouts] = None,
+        device_scale_factor: float = 1,
+        record_har: Optional[str] = None,
+        replay_har: Optional[str] = None
+    ) -> CaptureResult:
+        """
+        截取单个页面，失败时不抛异常，错误记录在结果里
+
+        按引擎的 retry 策略重试；结果中的各阶段耗时取自成功的那次尝试，总耗时包含所有尝试。
+
+        Args:
+            url: 页面链接
+            output_path: 截图保存路径
+            width: 浏览器宽度
+            height: 浏览器高度
+            wait_time: 页面加载后最长等待时间（秒），页面就绪后立即截图
+            full_page: 是否截取整页
+            ready: 就绪条件（见 readiness 模块），None 表示 load 完成且网络安静 500ms
+            policy: 请求拦截策略（见 request_policy 模块），None 表示不拦截
+            cache: 截图缓存，None 表示不使用缓存
+            refresh: 忽略已有缓存重新截图（结果仍会写入缓存）
+            selector: CSS 选择器，只截取该元素
+            clip: 只截取页面上的矩形区域 (x, y, width, height)
+            image_format: 截图格式 png 或 jpeg
+            quality: JPEG 质量 (0-100)
+            compare_formats: 额外用这些 (格式, 质量) 各编码一次（不写盘），
+                把字节数和耗时记录在 CaptureResult.formats 中，用于选择格式
+            timeouts: 打开页面和截图的超时，None 表示各 30 秒
+            device_scale_factor: 设备像素比，1 以上截图更清晰但更占内存
+            record_har: 把页面的所有请求和响应录制到这个 HAR 文件（会跳过截图缓存读取）
+            replay_har: 只从这个 HAR 文件回放页面，HAR 中没有的请求直接中断，不访问网络
+
+        Returns:
+            CaptureResult
+        """
+        if self._playwright is None:
+            raise RuntimeError("引擎未启动，请先调用 start()")
+
+        output_file = Path(output_path)
+        metrics = CaptureMetrics(url)
+        if replay_har and not Path(replay_har).is_file():
+            metrics.finish(error=ValueError(f"HAR 文件不存在: {replay_har}"))
+            return self._result(output_file, metrics, ready=False)
+        if record_har:
+            Path(record_har).parent.mkdir(parents=True, exist_ok=True)
+
+        cache_key = None
+        if cache is not None:
+            cache_key = cache.key(
+                url, width=width, height=height, device_scale_factor=device_scale_factor,
+                full_page=full_page, wait_time=wait_time, ready=ready, policy=policy,
+                selector=selector, clip=clip, image_format=image_format, quality=quality,
+                replay_har=replay_har
+            )
+            # 录制时必须真正访问页面，不读取截图缓存
+            if not (refresh or record_har):
+                with metrics.stage("cache"):
+                    hit = cache.fetch(cache_key, str(output_file))
+                if hit:
+                    metrics.cached = True
+                    metrics.finish(output_bytes=output_file.stat().st_size)
+                    return self._result(output_file, metrics, cached=True)
+
+        shot_options = {
+            'full_page': full_page, 'selector': selector, 'clip': clip,
+            'image_format': image_format, 'quality': quality
+        }
+        timeouts = timeouts or StageTimeouts()
+
+        def attempt():
+            metrics.attempts += 1
+            return self._attempt(
+                url, width, height, device_scale_factor, wait_time, ready, policy, timeouts,
+                shot_options, compare_formats, record_har, replay_har
+            )
+
+        metrics.attempts = 0
+        outcome = None
+        error = None
+        try:
+            outcome = await call_with_retry_async(attempt, url, self.retry, self.host_health)
+            for stage, seconds in outcome.metrics.stages.items():
+                metrics.add(stage, seconds)
+            metrics.page_height = outcome.metrics.page_height
+            metrics.requests = outcome.metrics.requests
+            metrics.transferred_bytes = outcome.metrics.transferred_bytes
+            metrics.asset_cache_hits = outcome.metrics.asset_cache_hits
+            metrics.asset_cache_bytes = outcome.metrics.asset_cache_bytes
+
+            # 写盘放到线程池，不阻塞其它页面的事件循环
+            with metrics.stage("write"):
+                await asyncio.get_event_loop().run_in_executor(None, output_file.write_bytes, outcome.data)
+        except Exception as e:
+            error = e
+
+        if cache is not None and error is None:
+            cache.put_bytes(cache_key, outcome.data, url)
+
+        metrics.finish(output_bytes=len(outcome.data) if error is None else None, error=error)
+        return self._result(
+            output_file, metrics,
+            ready=outcome.ready if outcome is not None else False,
+            requests=outcome.stats.as_dict() if outcome is not None else None,
+            formats=outcome.formats if outcome is not None else None
+        )
+
+    @staticmethod
+    def _result(output_file: Path, metrics: CaptureMetrics, **fields) -> CaptureResult:
+        """由截图指标生成 CaptureResult"""
+        return CaptureResult(
+            url=metrics.url,
+            output_path=str(output_file.absolute()),
+            elapsed=metrics.total,
+            error=metrics.error,
+            timings=metrics.stages,
+            page_height=metrics.page_height,
+            metrics=metrics,
+            **fields
+        )
+
+    async def capture_many(
+        self,
+        urls: Iterable[str],
+        output_dir: str = "screenshots",
+        har_dir: Optional[str] = None,
+        har_mode: str = "record",
+        **capture_options
+    ) -> AsyncIterator[CaptureResult]:
+        """
+        并发截取多个页面，按完成顺序逐个返回结果
+
+        Args:
+            urls: 页面链接列表
+            output_dir: 截图保存目录，文件名由 output_name_for_url 生成
+            har_dir: HAR 目录，每个页面一个文件（文件名同样由 output_name_for_url 生成）
+            har_mode: record 录制到 har_dir，replay 从 har_dir 回放
+            **capture_options: 传给 capture() 的其它参数
+
+        Yields:
+            CaptureResult
+        """
+        out_dir = Path(output_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        suffix = format_suffix(capture_options.get("image_format", "png"))
+        if har_mode not in ("record", "replay"):
+            raise ValueError(f"不支持的 HAR 模式: {har_mode}")
+
+        pending = iter(urls)
+        results = asyncio.Queue()
+        done_marker = object()
+
+        async def worker():
+            try:
+                for url in pending:
+                    output_path = out_dir / output_name_for_url(url, suffix)
+                    options = capture_options
+                    if har_dir is not None:
+                        har_path = str(Path(har_dir) / output_name_for_url(url, ".har"))
+                        options = dict(capture_options, **{f"{har_mode}_har": har_path})
+                    result = await self.capture(url, str(output_path), **options)
+                    await results.put(result)
+            finally:
+                await results.put(done_marker)
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(self.max_concurrency)]
+        remaining = len(workers)
+        try:
+            while remaining:
+                item = await results.get()
+                if item is done_marker:
+                    remaining -= 1
+                    continue
+                yield item
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+"""
+批量截图命令行工具
+从文件或标准输入读取 URL，并发截图并输出 JSONL 清单
+
+用法:
+    python batch_capture.py urls.txt -o screenshots
+    cat urls.txt | python batch_capture.py - -o screenshots --resume
+"""
+
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from PIL import Image
+
+from async_capture import AsyncCaptureEngine, CaptureResult
+from browser_screenshot import PROFILES, get_profile
+from readiness import parse_ready
+from request_policy import RequestPolicy, TRACKER_DOMAINS, BEACON_PATTERNS
+from capture_cache import CaptureCache
+from asset_cache import AssetCache
+from capture_dedupe import DedupeStore
+from capture_metrics import append_metrics, summarize_stages
+from capture_retry import StageTimeouts, RetryPolicy, HostHealth
+
+
+def read_urls(lines: Iterable[str]) -> List[str]:
+    """读取 URL 列表，忽略空行、# 注释和重复的 URL"""
+    urls = []
+    seen = set()
+    for line in lines:
+        url = line.strip()
+        if not url or url.startswith("#") or url in seen:
+            continue
+        seen.add(url)
+        urls.append(url)
+    return urls
+
+
+def load_finished_urls(manifest_path: Path) -> Set[str]:
+    """从已有清单中找出已成功截图且文件仍存在的 URL（用于断点续跑）"""
+    finished = set()
+    if not manifest_path.exists():
+        return finished
+
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 上次运行中断时可能留下半行
+                continue
+            if record.get("error") is None and Path(record.get("output_path", "")).exists():
+                finished.add(record["url"])
+    return finished
+
+
+def manifest_record(result: CaptureResult) -> dict:
+    """把截图结果转换成清单中的一行"""
+    record = {
+        "url": result.url,
+        "output_path": result.output_path,
+        "width": None,
+        "height": None,
+        "bytes": None,
+        "elapsed": round(result.elapsed, 4),
+        "ready": result.ready,
+        "timings": result.timings,
+        "page_height": result.page_height,
+        "requests": result.requests,
+        "cached": result.cached,
+        "attempts": result.attempts,
+        "formats": result.formats,
+        "error": result.error,
+    }
+
+    if result.ok:
+        output_file = Path(result.output_path)
+        record["bytes"] = output_file.stat().st_size
+        # Image.open 只解析文件头，不会解码整张图片
+        with Image.open(output_file) as img:
+            record["width"], record["height"] = img.size
+
+    return record
+
+
+def run_output_dir(base: Path) -> Path:
+    """在 base 下创建本次运行的子目录（按开始时间命名，同一秒内多次运行时加序号）"""
+    name = time.strftime("%Y%m%d-%H%M%S")
+    path = base / name
+    index = 1
+    while path.exists():
+        path = base / f"{name}-{index}"
+        index += 1
+    path.mkdir(parents=True)
+    return path
+
+
+async def run_batch(urls: List[str], args) -> int:
+    """执行批量截图，返回失败数量"""
+    manifest_path = Path(args.manifest) if args.manifest else Path(args.output_dir) / "manifest.jsonl"
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+
+    if args.resume:
+        finished = load_finished_urls(manifest_path)
+        skipped = len([url for url in urls if url in finished])
+        urls = [url for url in urls if url not in finished]
+        print(f"断点续跑: 跳过 {skipped} 个已完成的 URL", file=sys.stderr)
+
+    total = len(urls)
+    failed = 0
+    started = time.perf_counter()
+
+    ready = [parse_ready(spec) for spec in args.ready] if args.ready else None
+    policy = build_policy(args)
+    cache = CaptureCache(args.cache_dir, ttl=args.cache_ttl) if args.cache_dir else None
+    asset_cache = None
+    if args.asset_cache:
+        asset_cache = AssetCache(args.asset_cache, max_bytes=int(args.asset_cache_size * 1024 * 1024))
+    compare_formats = parse_formats(args.compare_formats) if args.compare_formats else ()
+    format_totals = {}
+    stage_records = []
+    dedupe = DedupeStore(args.dedupe, near_threshold=args.near_threshold) if args.dedupe else None
+    dedupe_counts = {}
+    output_dir = Path(args.output_dir)
+    if dedupe is not None:
+        # 文件名只由 URL 决定，写回同一目录会覆盖上一次的截图，去重时每次运行写入新的子目录
+        output_dir = run_output_dir(output_dir)
+        print(f"截图保存到 {output_dir}", file=sys.stderr)
+    loop = asyncio.get_event_loop()
+
+    profile = get_profile(args.profile)
+    host_health = HostHealth(args.host_max_failures, args.host_cooldown)
+    engine = AsyncCaptureEngine.for_profile(
+        profile.name,
+        browsers=args.browsers,
+        pages_per_browser=args.pages_per_browser or profile.pages_per_browser,
+        max_concurrency=args.concurrency,
+        retry=RetryPolicy(
+            attempts=args.retries + 1,
+            backoff=args.backoff,
+            hedge_after=args.hedge_after
+        ),
+        host_health=host_health,
+        memory_limit_mb=args.memory_limit,
+        asset_cache=asset_cache
+    )
+
+    # 追加写入，每行写完立即 flush，进程被杀时清单仍然可用
+    with open(manifest_path, "a", encoding="utf-8") as manifest:
+        async with engine:
+            done = 0
+            async for result in engine.capture_many(
+                urls,
+                str(output_dir),
+                width=args.width or profile.width,
+                height=args.height or profile.height,
+                device_scale_factor=profile.device_scale_factor,
+                wait_time=args.wait_time,
+                full_page=args.full_page,
+                ready=ready,
+                policy=policy,
+                cache=cache,
+                refresh=args.refresh,
+                selector=args.selector,
+                clip=parse_clip(args.clip) if args.clip else None,
+                image_format=args.format,
+                quality=args.quality,
+                compare_formats=compare_formats,
+                har_dir=args.record_har or args.replay_har,
+                har_mode="replay" if args.replay_har else "record",
+                timeouts=StageTimeouts(goto=args.goto_timeout, screenshot=args.screenshot_timeout)
+            ):
+                done += 1
+                if not result.ok:
+                    failed += 1
+                for label, report in (result.formats or {}).items():
+                    total_row = format_totals.setdefault(label, [0, 0, 0.0])
+                    total_row[0] += 1
+                    total_row[1] += report["bytes"]
+                    total_row[2] += report["seconds"]
+                stage_records.append(result.timings)
+                if args.metrics_log and result.metrics is not None:
+                    append_metrics(args.metrics_log, result.metrics)
+                record = manifest_record(result)
+                if dedupe is not None and result.ok:
+                    # 解码和比较图片放到线程池，不阻塞其它页面
+                    checked = await loop.run_in_executor(None, dedupe.check, result.url, result.output_path)
+                    record["dedupe"] = {
+                        "status": checked.status,
+                        "reference": checked.reference,
+                        "distance": checked.distance,
+                        "regions": checked.regions,
+                        "linked": checked.linked,
+                    }
+                    dedupe_counts[checked.status] = dedupe_counts.get(checked.status, 0) + 1
+                manifest.write(json.dumps(record, ensure_ascii=False) + "\n")
+                manifest.flush()
+
+                status = "OK" if result.ok else f"失败: {result.error}"
+                print(f"[{done}/{total}] {result.url} {status}", file=sys.stderr)
+
+    elapsed = time.perf_counter() - started
+    print(f"完成 {total} 个，失败 {failed} 个，用时 {elapsed:.1f} 秒"
+          f"（浏览器启动 {engine.launch_seconds:.1f} 秒）", file=sys.stderr)
+    print_stage_report(stage_records)
+    print_format_report(format_totals)
+    print_host_report(host_health)
+    if args.memory_limit:
+        memory = engine.memory_stats()
+        print(f"浏览器内存峰值 {memory['peak_rss_mb']:.0f} MB，因内存重启 {memory['restarts']} 次",
+              file=sys.stderr)
+    if asset_cache is not None:
+        print_asset_cache_report(asset_cache.stats())
+    if dedupe_counts:
+        print("与上一次截图比较: " + "，".join(
+            f"{status} {count} 个" for status, count in sorted(dedupe_counts.items())
+        ), file=sys.stderr)
+    return failed
+
+
+def parse_clip(text: str) -> tuple:
+    """解析 x,y,width,height 格式的截图区域"""
+    parts = [float(v) for v in text.split(",")]
+    if len(parts) != 4:
+        raise ValueError(f"截图区域格式应为 x,y,width,height: {text}")
+    return tuple(parts)
+
+
+def parse_formats(text: str) -> List[Tuple[str, Optional[int]]]:
+    """解析 png,jpeg:80,jpeg:60 格式的对比列表"""
+    formats = []
+    for item in text.split(","):
+        name, _, quality = item.strip().partition(":")
+        formats.append((name, int(quality) if quality else None))
+    return formats
+
+
+def print_stage_report(records: List[Dict[str, float]]):
+    """打印各阶段耗时的 p50 / p95"""
+    summary = summarize_stages(records)
+    if not summary:
+        return
+    print("阶段耗时:", file=sys.stderr)
+    for stage, row in summary.items():
+        print(f"  {stage:<10} p50 {row['p50'] * 1000:7.0f} ms  p95 {row['p95'] * 1000:7.0f} ms"
+              f"  max {row['max'] * 1000:7.0f} ms  ({row['count']} 次)", file=sys.stderr)
+
+
+def print_host_report(host_health: HostHealth):
+    """打印有失败记录的主机"""
+    hosts = host_health.snapshot()
+    if not hosts:
+        return
+    print("失败主机:", file=sys.stderr)
+    for host, row in sorted(hosts.items(), key=lambda item: -item[1]["total"]):
+        paused = "（已暂停）" if row["paused"] else ""
+        print(f"  {host:<30} 失败 {row['total']} 次{paused}", file=sys.stderr)
+
+
+def print_format_report(totals: Dict[str, List[float]]):
+    """打印各格式的平均字节数和编码耗时"""
+    if not totals:
+        return
+    print("格式对比（平均值）:", file=sys.stderr)
+    for label, (count, size, seconds) in sorted(totals.items()):
+        print(f"  {label:<10} {size / count / 1024:8.1f} KB  {seconds / count * 1000:7.1f} ms",
+              file=sys.stderr)
+
+
+def print_asset_cache_report(stats: dict):
+    """打印静态资源缓存的命中统计"""
+    print(f"静态资源缓存: 命中 {stats['hits']} 次，未命中 {stats['misses']} 次"
+          f"（命中率 {stats['hit_rate']:.0%}），从缓存返回 {stats['hit_bytes'] / 1024 / 1024:.1f} MB，"
+          f"下载 {stats['fetched_bytes'] / 1024 / 1024:.1f} MB，缓存大小 {stats['size_bytes'] / 1024 / 1024:.1f} MB",
+          file=sys.stderr)
+
+
+def build_policy(args):
+    """根据命令行参数生成请求拦截策略，没有相关参数时返回 None"""
+    if not (args.block_trackers or args.block_types or args.deny_domain or args.allow_domain):
+        return None
+
+    deny_domains = list(args.deny_domain or [])
+    stub_patterns = []
+    if args.block_trackers:
+        deny_domains.extend(TRACKER_DOMAINS)
+        stub_patterns.extend(BEACON_PATTERNS)
+
+    return RequestPolicy(
+        block_types=args.block_types.split(",") if args.block_types else ("media",),
+        deny_domains=deny_domains,
+        allow_domains=args.allow_domain,
+        stub_patterns=stub_patterns
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="批量截图并输出 JSONL 清单")
+    parser.add_argument("input", help="URL 列表文件，每行一个；- 表示从标准输入读取")
+    parser.add_argument("-o", "--output-dir", default="screenshots", help="截图保存目录")
+    parser.add_argument("--manifest", help="清单路径，默认 <output-dir>/manifest.jsonl")
+    parser.add_argument("--profile", default="default", choices=list(PROFILES),
+                        help="配置档：low-memory 使用低内存启动参数、1280x800 视口、每个浏览器 2 个页面")
+    parser.add_argument("--width", type=int, help="浏览器宽度，默认由配置档决定（1920）")
+    parser.add_argument("--height", type=int, help="浏览器高度，默认由配置档决定（1080）")
+    parser.add_argument("--wait-time", type=float, default=3, help="页面加载后最长等待时间（秒）")
+    parser.add_argument("--ready", action="append", metavar="COND",
+                        help="就绪条件，可重复：selector:<css>、load、domcontentloaded、"
+                             "network-quiet[:ms]、visual-stable[:ms]、sleep:<秒>")
+    parser.add_argument("--full-page", action="store_true", help="截取整页")
+    parser.add_argument("--format", default="png", choices=["png", "jpeg"], help="截图格式")
+    parser.add_argument("--quality", type=int, help="JPEG 质量 (0-100)，默认 85")
+    parser.add_argument("--compare-formats", metavar="LIST",
+                        help="额外编码对比的格式，如 png,jpeg:80,jpeg:60，结果写入清单并在结束时汇总")
+    parser.add_argument("--selector", help="只截取该 CSS 选择器对应的元素")
+    parser.add_argument("--clip", help="只截取页面区域 x,y,width,height")
+    parser.add_argument("--browsers", type=int, default=1, help="浏览器数量")
+    parser.add_argument("--pages-per-browser", type=int, help="每个浏览器的并发页面数，默认由配置档决定（4）")
+    parser.add_argument("--concurrency", type=int, help="总并发数上限")
+    parser.add_argument("--block-trackers", action="store_true", help="拦截常见统计/跟踪域名，埋点返回空响应")
+    parser.add_argument("--block-types", help="拦截的资源类型，逗号分隔，默认 media（如 media,font）")
+    parser.add_argument("--deny-domain", action="append", help="拦截的域名（含子域名），可重复")
+    parser.add_argument("--allow-domain", action="append", help="只放行这些域名（含子域名），可重复")
+    parser.add_argument("--cache-dir", help="截图缓存目录，不指定则不使用缓存")
+    parser.add_argument("--cache-ttl", type=float, default=3600, help="缓存有效期（秒）")
+    parser.add_argument("--refresh", action="store_true", help="忽略缓存重新截图")
+    parser.add_argument("--asset-cache", metavar="DIR",
+                        help="静态资源缓存目录，样式、脚本、图片、字体在各页面和多次运行之间共用")
+    parser.add_argument("--asset-cache-size", type=float, default=500, metavar="MB",
+                        help="静态资源缓存大小上限（MB）")
+    parser.add_argument("--resume", action="store_true", help="跳过清单中已成功的 URL")
+    parser.add_argument("--dedupe", metavar="DIR",
+                        help="去重索引目录：与每个 URL 上一次的截图比较，相同的改为硬链接，记录变化区域；"
+                             "截图保存到 <output-dir>/<运行时间>/ 子目录，保留上一次的截图")
+    parser.add_argument("--near-threshold", type=float, default=0.05,
+                        help="感知哈希差异占比不超过该值时标记为近似重复")
+    har = parser.add_mutually_exclusive_group()
+    har.add_argument("--record-har", metavar="DIR", help="把每个页面的请求和响应录制成 HAR，保存到该目录")
+    har.add_argument("--replay-har", metavar="DIR",
+                     help="只从该目录中录制好的 HAR 回放页面，不访问网络（可换视口或参数重新截图）")
+    parser.add_argument("--goto-timeout", type=float, default=30, help="打开页面超时（秒）")
+    parser.add_argument("--screenshot-timeout", type=float, default=30, help="截图超时（秒）")
+    parser.add_argument("--retries", type=int, default=2, help="失败后最多重试次数")
+    parser.add_argument("--backoff", type=float, default=1.0, help="第一次重试前等待的秒数，之后每次翻倍")
+    parser.add_argument("--hedge-after", type=float,
+                        help="一次尝试超过这么多秒未完成时并行再发起一次，取先完成的结果")
+    parser.add_argument("--host-max-failures", type=int, default=5,
+                        help="同一主机连续失败多少次后暂停访问")
+    parser.add_argument("--host-cooldown", type=float, default=60, help="主机暂停访问的时间（秒）")
+    parser.add_argument("--memory-limit", type=float, metavar="MB",
+                        help="单个浏览器的内存阈值（MB），超过后排空页面并重启该浏览器")
+    parser.add_argument("--metrics-log", help="指标日志路径，每次截图追加一行 JSON（各阶段耗时、请求数等）")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+
+    if args.input == "-":
+        urls = read_urls(sys.stdin)
+    else:
+        with open(args.input, "r", encoding="utf-8") as f:
+            urls = read_urls(f)
+
+    failed = asyncio.run(run_batch(urls, args))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
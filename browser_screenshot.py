@@ -5,118 +5,1312 @@
 """
 
 from playwright.sync_api import sync_playwright
+from concurrent.futures import Future
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Dict, Optional, List, Sequence, Tuple, Union
+from PIL import Image
+import threading
+import atexit
+import io
+import queue
 import time
 
+from readiness import ReadyCondition, WaitForViewportImages, wait_until_ready, NEXT_FRAME_SCRIPT
+from request_policy import RequestPolicy, RequestStats, watch_requests
+from capture_cache import CaptureCache
+from asset_cache import AssetCache
+from png_stream import PngStreamWriter
+from capture_metrics import CaptureMetrics, append_metrics
+from capture_retry import StageTimeouts, RetryPolicy, HostHealth, call_with_retry
+from memory_watchdog import MemoryWatchdog, browser_root_pids, find_new_browser
+
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+DEFAULT_LAUNCH_ARGS = ['--disable-blink-features=AutomationControlled']
+
+# 低内存启动参数，适合 1-2 GB 内存的容器
+LOW_MEMORY_LAUNCH_ARGS = DEFAULT_LAUNCH_ARGS + [
+    '--disable-dev-shm-usage',              # 容器里 /dev/shm 通常只有 64MB，改用 /tmp
+    '--disable-gpu',
+    '--renderer-process-limit=2',           # 限制渲染进程数量
+    '--disable-features=Translate,BackForwardCache,MediaRouter,OptimizationHints,'
+    'IsolateOrigins,site-per-process',      # 关闭站点隔离，跨站 iframe 不再单独起进程
+    '--js-flags=--max-old-space-size=256',  # V8 堆上限（MB）
+    '--disk-cache-size=33554432',           # 磁盘缓存上限 32MB
+    '--aggressive-cache-discard',
+    '--disable-extensions',
+    '--disable-background-networking',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--mute-audio',
+    '--no-first-run',
+]
+
+
+@dataclass(frozen=True)
+class CaptureProfile:
+    """
+    截图配置档：浏览器启动参数、默认视口和并发上限
+
+    截图函数的 profile 参数只影响单独启动的浏览器和默认视口；
+    使用浏览器池 / 异步引擎时，用 BrowserPool.for_profile / AsyncCaptureEngine.for_profile 创建。
+    """
+    name: str
+    launch_args: Tuple[str, ...]
+    width: int = 1920
+    height: int = 1080
+    device_scale_factor: float = 1
+    pages_per_browser: int = 4      # 异步引擎每个浏览器同时打开的页面上限
+    max_uses: int = 50              # 浏览器池重启浏览器前最多分配的上下文数量
+    context_max_uses: int = 20      # 预热的上下文最多复用的次数
+
+
+PROFILES = {
+    "default": CaptureProfile("default", tuple(DEFAULT_LAUNCH_ARGS)),
+    "low-memory": CaptureProfile(
+        "low-memory",
+        tuple(LOW_MEMORY_LAUNCH_ARGS),
+        width=1280,
+        height=800,
+        device_scale_factor=1,
+        pages_per_browser=2,
+        max_uses=20,
+        context_max_uses=5,
+    ),
+}
+
+
+def get_profile(name: Optional[str] = None) -> CaptureProfile:
+    """按名称取配置档，None 表示 default"""
+    name = name or "default"
+    if name not in PROFILES:
+        raise ValueError(f"未知的配置档: {name}，可选: {', '.join(PROFILES)}")
+    return PROFILES[name]
+
+# page.screenshot 支持的编码格式
+IMAGE_FORMATS = ("png", "jpeg")
+DEFAULT_JPEG_QUALITY = 85
+
+# 隐藏固定定位的元素（吸顶导航、悬浮按钮等），避免分块长截图中每一块都出现一次
+HIDE_FIXED_SCRIPT = """() => {
+    for (const el of document.querySelectorAll('body *')) {
+        const position = getComputedStyle(el).position;
+        if (position === 'fixed' || position === 'sticky') {
+            el.style.setProperty('visibility', 'hidden', 'important');
+        }
+    }
+}"""
+
+
+class _PoolThread:
+    """
+    浏览器池专用的工作线程（按顺序执行提交的函数）
+
+    不使用 ThreadPoolExecutor：解释器退出时 concurrent.futures 会在 atexit 回调之前
+    关闭所有线程池，之后再提交任务会报错，atexit 中就无法关闭浏览器。
+    这里的线程是守护线程，atexit 回调执行时仍在运行，由 shutdown() 结束。
+    """
+
+    def __init__(self, name: str):
+        self._queue = queue.Queue()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            future, fn, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    @property
+    def alive(self) -> bool:
+        return not self._stopped and self._thread.is_alive()
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        if not self.alive:
+            raise RuntimeError("浏览器池的工作线程已停止")
+        future = Future()
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def shutdown(self, wait: bool = True):
+        """执行完已提交的任务后结束线程"""
+        if not self._stopped:
+            self._stopped = True
+            self._queue.put(None)
+        if wait and self._thread is not threading.current_thread():
+            self._thread.join()
+
+
+class BrowserPool:
+    """
+    长驻浏览器池
+
+    只启动一次 Chromium，每次截图分配一个独立的上下文（Cookie、缓存互不影响）。
+    浏览器被使用 max_uses 次或存活超过 max_age 秒后，会在下一次取用时重启。
+
+    调用 warm() 后，池会在后台预先创建若干个带空白页面的上下文，参数相同的 new_context
+    直接取用，省掉启动浏览器、创建上下文和页面的等待；用完的上下文关闭页面、清除 Cookie 后
+    放回池中，被使用 context_max_uses 次后关闭并补充新的。浏览器重启后在后台重新预热；
+    只是存活超过 max_age（如界面空闲了很久）时，先用现有的预热上下文完成这次截图再重启。
+
+    设置 memory_limit_mb 后，后台线程每隔 memory_check_interval 秒统计一次浏览器进程树的内存，
+    超过阈值时等当前截图完成，在下一次取用前重启浏览器（同步池一次只处理一个截图，
+    重启时没有进行中的页面）。重启次数和内存峰值见 memory_stats()。
+
+    传入 asset_cache 时每个上下文都从这个磁盘缓存读取静态资源，同一站点的样式、脚本、
+    图片只下载一次，命中统计见 asset_cache.stats()。
+
+    Playwright 同步 API 只能在创建它的线程里调用，因此所有浏览器操作都通过
+    run() 提交到池自己的工作线程执行。不要在 run() 提交的函数里再次调用 run()。
+    """
+
+    def __init__(
+        self,
+        max_uses: int = 50,
+        max_age: float = 600.0,
+        headless: bool = True,
+        launch_args: Optional[List[str]] = None,
+        context_max_uses: int = 20,
+        memory_limit_mb: Optional[float] = None,
+        memory_check_interval: float = 5.0,
+        asset_cache: Optional[AssetCache] = None
+    ):
+        """
+        Args:
+            max_uses: 单个浏览器最多分配的上下文数量
+            max_age: 单个浏览器最长存活时间（秒）
+            headless: 是否无头模式
+            launch_args: Chromium 启动参数
+            context_max_uses: 预热的上下文最多复用的次数
+            memory_limit_mb: 浏览器进程树内存阈值（MB），None 表示不监控
+            memory_check_interval: 内存采样间隔（秒）
+            asset_cache: 静态资源缓存（见 asset_cache 模块），None 表示不缓存
+        """
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.headless = headless
+        self.launch_args = list(DEFAULT_LAUNCH_ARGS if launch_args is None else launch_args)
+
+        self._executor = _PoolThread("browser-pool")
+        self._playwright = None
+        self._browser = None
+        self._uses = 0
+        self._launched_at = 0.0
+        self._closed = False
+        self.launch_count = 0
+
+        self.context_max_uses = context_max_uses
+        self._warm = []              # [上下文, 已使用次数]
+        self._warm_target = 0
+        self._warm_options = None
+        self._recycle_pending = False    # 预热的上下文用完后重启浏览器
+        self.warm_hits = 0
+        self.warm_misses = 0
+
+        self.memory = MemoryWatchdog(memory_limit_mb, memory_check_interval)
+        self._browser_pid = None
+        self._memory_exceeded = None     # 超过阈值时的 RSS，由监控线程设置
+        self._watch_thread = None
+        self._stop_watch = threading.Event()
+
+        self.asset_cache = asset_cache
+
+    @classmethod
+    def for_profile(cls, profile: str, **kwargs) -> "BrowserPool":
+        """按配置档创建浏览器池，kwargs 可覆盖配置档中的参数"""
+        config = get_profile(profile)
+        options = {
+            'launch_args': list(config.launch_args),
+            'max_uses': config.max_uses,
+            'context_max_uses': config.context_max_uses,
+        }
+        options.update(kwargs)
+        return cls(**options)
+
+    def _recycle_reason(self) -> Optional[str]:
+        """当前浏览器需要重启的原因，不需要时返回 None"""
+        if not self._browser.is_connected():
+            return "disconnected"
+        if self._memory_exceeded is not None:
+            return "memory"
+        if self._uses >= self.max_uses:
+            return "uses"
+        if time.monotonic() - self._launched_at >= self.max_age:
+            return "age"
+        return None
+
+    def _close_browser(self):
+        """关闭当前浏览器（工作线程内调用）"""
+        if self._browser is not None:
+            try:
+                self._browser.close()
+            except Exception as e:
+                print(f"关闭浏览器失败: {e}")
+            self._browser = None
+        # 预热的上下文随浏览器一起关闭
+        self._warm = []
+        self._browser_pid = None
+        self._memory_exceeded = None
+
+    def _recycle_if_needed(self):
+        """需要时关闭当前浏览器，下一次取用时重新启动（工作线程内调用）"""
+        if self._browser is None or self._recycle_reason() is None:
+            return
+        if self._memory_exceeded is not None:
+            self.memory.record_restart(self._memory_exceeded)
+        self._close_browser()
+        self._rewarm()
+
+    def _rewarm(self):
+        """预热的上下文随浏览器关闭了，当前任务完成后在后台重新预热（工作线程内调用）"""
+        self._recycle_pending = False
+        if self._warm_target and not self._closed:
+            self._executor.submit(self._refill)
+
+    def _acquire_browser(self):
+        """取得可用的浏览器，必要时启动或重启（工作线程内调用）"""
+        self._recycle_if_needed()
+
+        if self._browser is None:
+            if self._playwright is None:
+                self._playwright = sync_playwright().start()
+            before = browser_root_pids() if self.memory.limit_bytes else set()
+            self._browser = self._playwright.chromium.launch(
+                headless=self.headless,
+                args=self.launch_args
+            )
+            self._launched_at = time.monotonic()
+            self._uses = 0
+            self.launch_count += 1
+            if self.memory.limit_bytes:
+                self._browser_pid = find_new_browser(before)
+                self._start_watch()
+
+        self._uses += 1
+        return self._browser
+
+    def _start_watch(self):
+        """启动内存监控线程（只启动一次）"""
+        if self._watch_thread is None:
+            self._watch_thread = threading.Thread(
+                target=self._watch_memory, name="browser-memory", daemon=True
+            )
+            self._watch_thread.start()
+
+    def _watch_memory(self):
+        """定期采样浏览器内存，超过阈值时标记需要重启（监控线程）"""
+        while not self._stop_watch.wait(self.memory.interval):
+            pid = self._browser_pid
+            if pid is None:
+                continue
+            rss = self.memory.sample([pid])
+            if self.memory.over_limit(rss) and self._memory_exceeded is None:
+                self._memory_exceeded = rss
+
+    def memory_stats(self) -> dict:
+        """浏览器内存统计：重启次数、峰值内存等，另附启动次数"""
+        if self._browser_pid is not None:
+            self.memory.sample([self._browser_pid])
+        return {**self.memory.as_dict(), "launch_count": self.launch_count}
+
+    def warm(self, count: int, **context_options):
+        """
+        在后台预热 count 个上下文（各带一个空白页面），不等待完成
+
+        之后参数与 context_options 相同的 new_context 会直接取用预热好的上下文。
+
+        Returns:
+            concurrent.futures.Future，预热完成时结束
+        """
+        if self._closed:
+            raise RuntimeError("浏览器池已关闭")
+        self._warm_target = count
+        self._warm_options = context_options
+        return self._executor.submit(self._refill)
+
+    def _refill(self):
+        """补足预热的上下文（工作线程内调用）"""
+        try:
+            while len(self._warm) < self._warm_target:
+                browser = self._acquire_browser()
+                context = self._create_context(browser, self._warm_options)
+                context.new_page()
+                self._warm.append([context, 0])
+        except Exception as e:
+            print(f"预热浏览器失败: {e}")
+
+    def _create_context(self, browser, context_options: dict):
+        """创建上下文，设置了静态资源缓存时一并安装（工作线程内调用）"""
+        context = browser.new_context(**context_options)
+        if self.asset_cache is not None:
+            self.asset_cache.install(context)
+        return context
+
+    def _take_warm(self, context_options: dict):
+        """取出一个参数相同的预热上下文，没有时返回 None（工作线程内调用）"""
+        if not self._warm_target or context_options != self._warm_options:
+            return None
+        if self._warm and self._browser is not None and self._recycle_reason() == "age":
+            # 只是存活时间到了（例如界面空闲了很久）：这次仍用预热好的上下文，
+            # 用完后再重启浏览器并在后台重新预热，不让这次截图等浏览器启动
+            self._recycle_pending = True
+        else:
+            self._recycle_if_needed()
+        if not self._warm:
+            self.warm_misses += 1
+            return None
+        self.warm_hits += 1
+        return self._warm.pop(0)
+
+    def _release_warm(self, entry: list):
+        """清理用过的预热上下文并放回池中，超过复用次数时关闭（工作线程内调用）"""
+        context = entry[0]
+        entry[1] += 1
+        if self._recycle_pending:
+            try:
+                context.close()
+            except Exception as e:
+                print(f"回收浏览器上下文失败: {e}")
+            self._close_browser()
+            self._rewarm()
+            return
+        try:
+            if entry[1] >= self.context_max_uses or self._browser is None or not self._browser.is_connected():
+                context.close()
+            else:
+                for page in context.pages:
+                    page.close()
+                context.clear_cookies()
+                context.new_page()
+                self._warm.append(entry)
+        except Exception as e:
+            print(f"回收浏览器上下文失败: {e}")
+        self._refill()
+
+    @contextmanager
+    def new_context(self, metrics: Optional[CaptureMetrics] = None, **context_options):
+        """
+        分配一个独立的浏览器上下文，用完自动关闭（预热的上下文放回池中）
+
+        必须在 run() 提交的函数中使用。
+
+        Args:
+            metrics: 截图指标，传入时记录浏览器启动（仅本次触发启动时）和创建上下文的耗时
+            **context_options: 传给 browser.new_context 的参数
+        """
+        entry = self._take_warm(context_options)
+        if entry is not None:
+            if metrics is not None:
+                metrics.add("context", 0.0)
+            try:
+                yield entry[0]
+            finally:
+                # 清理和补充放到下一个任务中执行，调用方不用等待
+                self._executor.submit(self._release_warm, entry)
+            return
+
+        started = time.perf_counter()
+        launches = self.launch_count
+        browser = self._acquire_browser()
+        if metrics is not None and self.launch_count != launches:
+            metrics.add("launch", time.perf_counter() - started)
+
+        started = time.perf_counter()
+        context = self._create_context(browser, context_options)
+        if metrics is not None:
+            metrics.add("context", time.perf_counter() - started)
+        try:
+            yield context
+        finally:
+            context.close()
+
+    def run(self, fn, *args, **kwargs):
+        """
+        在池的工作线程中执行 fn，阻塞直到返回
+
+        Returns:
+            fn 的返回值（fn 抛出的异常会原样抛出）
+        """
+        if self._closed:
+            raise RuntimeError("浏览器池已关闭")
+        return self._executor.submit(fn, *args, **kwargs).result()
+
+    def _shutdown(self):
+        """释放浏览器和 Playwright（工作线程内调用）"""
+        self._stop_watch.set()
+        self._close_browser()
+        if self._playwright is not None:
+            self._playwright.stop()
+            self._playwright = None
+
+    def close(self):
+        """关闭浏览器池，可重复调用（也可以在 atexit 中调用）"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._executor.submit(self._shutdown).result()
+        except RuntimeError as e:
+            # 工作线程已经不在了，浏览器随进程一起退出
+            print(f"关闭浏览器池失败: {e}")
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def jd_context_options(width: int = 1920, height: int = 1080, device_scale_factor: float = 1) -> dict:
+    """take_jd_screenshot 使用的上下文参数，预热浏览器池时传入相同的参数"""
+    # 模拟真实浏览器
+    return {
+        'viewport': {'width': width, 'height': height},
+        'device_scale_factor': device_scale_factor,
+        'user_agent': DEFAULT_USER_AGENT
+    }
+
+
+def get_default_pool() -> BrowserPool:
+    """
+    获取进程级共享的浏览器池（首次调用时创建，进程退出时自动关闭）
+    """
+    global _default_pool
+
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = BrowserPool()
+            atexit.register(_default_pool.close)
+        return _default_pool
+
+
+def _wait_for_page(page, ready: Optional[Sequence[ReadyCondition]], wait_time: float):
+    """等待页面就绪，超时只提示不报错"""
+    if not wait_until_ready(page, ready, timeout=wait_time):
+        print(f"等待页面就绪超时（{wait_time} 秒），继续截图")
+
+
+def _install_policy(target, policy: Optional[RequestPolicy]) -> RequestStats:
+    """在上下文或页面上开始统计请求，设置了拦截策略时一并安装"""
+    stats = RequestStats()
+    watch_requests(target, stats)
+    if policy is not None:
+        policy.install(target, stats)
+    return stats
+
+
+def _report_requests(stats: RequestStats):
+    """打印请求统计"""
+    cached = f"，缓存命中 {stats.cache_hits} 个（{stats.cache_bytes / 1024:.0f} KB）" if stats.cache_hits else ""
+    print(f"请求 {stats.total} 个，拦截 {stats.blocked} 个，空响应 {stats.stubbed} 个，"
+          f"加载 {stats.loaded_bytes / 1024:.0f} KB{cached}")
+
+
+def _open_page(
+    context,
+    url: str,
+    wait_time: float,
+    ready: Optional[Sequence[ReadyCondition]],
+    policy: Optional[RequestPolicy],
+    timeouts: StageTimeouts,
+    metrics: CaptureMetrics
+):
+    """新建页面、访问 url 并等待就绪，返回 (page, 请求统计)"""
+    # 预热的上下文已经带有空白页面
+    page = context.pages[0] if context.pages else context.new_page()
+    # 统计和拦截装在页面上，上下文复用时不会累积
+    stats = _install_policy(page, policy)
+
+    print(f"正在访问: {url}")
+    with metrics.stage("goto"):
+        page.goto(url, wait_until='domcontentloaded', timeout=timeouts.goto * 1000)
+
+    # 等待页面就绪（最多 wait_time 秒）
+    with metrics.stage("ready"):
+        _wait_for_page(page, ready, wait_time)
+    return page, stats
+
+
+def _finish_page(page, stats: RequestStats, metrics: CaptureMetrics):
+    """记录页面高度和请求统计"""
+    metrics.page_height = page.evaluate("document.documentElement.scrollHeight")
+    metrics.requests = stats.total
+    metrics.transferred_bytes = stats.loaded_bytes
+    metrics.asset_cache_hits = stats.cache_hits
+    metrics.asset_cache_bytes = stats.cache_bytes
+    _report_requests(stats)
+
+
+def _write_output(data: bytes, output_file: Optional[Path], metrics: CaptureMetrics):
+    """需要时把截图数据写入文件"""
+    if output_file is None:
+        return
+    with metrics.stage("write"):
+        output_file.write_bytes(data)
+    print(f"截图已保存: {output_file.absolute()}")
+
+
+def _clip_dict(clip: Union[Tuple[float, float, float, float], dict]) -> dict:
+    """把 (x, y, width, height) 转换成 Playwright 的 clip 参数"""
+    if isinstance(clip, dict):
+        return clip
+    x, y, width, height = clip
+    return {'x': x, 'y': y, 'width': width, 'height': height}
+
+
+def _encode_options(image_format: str, quality: Optional[int]) -> dict:
+    """转换成 page.screenshot 的 type / quality 参数"""
+    image_format = image_format.lower()
+    if image_format == "jpg":
+        image_format = "jpeg"
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"不支持的截图格式: {image_format}")
+    options = {'type': image_format}
+    if image_format == "jpeg":
+        options['quality'] = DEFAULT_JPEG_QUALITY if quality is None else quality
+    return options
+
+
+def format_suffix(image_format: str) -> str:
+    """截图格式对应的文件扩展名"""
+    return ".png" if image_format.lower() == "png" else ".jpg"
+
+
+def screenshot_page(
+    page,
+    path: Optional[str] = None,
+    full_page: bool = False,
+    selector: Optional[str] = None,
+    clip: Optional[Union[Tuple[float, float, float, float], dict]] = None,
+    image_format: str = "png",
+    quality: Optional[int] = None,
+    timeout: Optional[float] = None
+):
+    """
+    截取整个视口 / 整页、某个元素或指定矩形区域
+
+    sync_api 和 async_api 的页面都可以用：异步页面返回协程，调用方 await 即可。
+
+    Args:
+        page: Playwright Page
+        path: 保存路径，None 表示只返回数据
+        full_page: 是否截取整页（selector、clip 都未指定时生效）
+        selector: CSS 选择器，只截取第一个匹配的元素
+        clip: 页面坐标中的矩形 (x, y, width, height)，可以超出首屏
+        image_format: png 或 jpeg，由浏览器直接编码
+        quality: JPEG 质量 (0-100)，默认 DEFAULT_JPEG_QUALITY
+        timeout: 截图超时（秒），None 表示使用 Playwright 默认值
+    """
+    encode = _encode_options(image_format, quality)
+    if timeout is not None:
+        encode['timeout'] = timeout * 1000
+    if selector is not None:
+        return page.locator(selector).first.screenshot(path=path, **encode)
+    if clip is not None:
+        # full_page=True 时 clip 按整页坐标计算，区域可以在首屏之外
+        return page.screenshot(path=path, clip=_clip_dict(clip), full_page=True, **encode)
+    return page.screenshot(path=path, full_page=full_page, **encode)
+
+
+def _capture_jd_page(
+    context,
+    url: str,
+    output_file: Optional[Path],
+    wait_time: float,
+    ready: Optional[Sequence[ReadyCondition]],
+    policy: Optional[RequestPolicy],
+    timeouts: StageTimeouts,
+    metrics: CaptureMetrics,
+    **shot_options
+) -> bytes:
+    """
+    在给定上下文中打开京东页面并截取首屏，output_file 为 None 时只返回图片数据
+
+    shot_options 传给 screenshot_page（selector、clip、image_format、quality）
+    """
+    try:
+        page, stats = _open_page(context, url, wait_time, ready, policy, timeouts, metrics)
+
+        # 滚动到顶部确保显示完整，等渲染两帧再截图
+        with metrics.stage("scroll"):
+            page.evaluate("window.scrollTo(0, 0)")
+            page.evaluate(NEXT_FRAME_SCRIPT)
+
+        # 截图只取编码后的数据，写盘单独计时
+        with metrics.stage("screenshot"):
+            data = screenshot_page(page, None, timeout=timeouts.screenshot, **shot_options)
+
+        _finish_page(page, stats, metrics)
+        _write_output(data, output_file, metrics)
+        return data
+
+    except Exception as e:
+        print(f"截图失败: {e}")
+        raise
+
+
+def _capture_full_page(
+    context,
+    url: str,
+    output_file: Optional[Path],
+    wait_time: float,
+    ready: Optional[Sequence[ReadyCondition]],
+    policy: Optional[RequestPolicy],
+    timeouts: StageTimeouts,
+    metrics: CaptureMetrics,
+    **shot_options
+) -> bytes:
+    """
+    在给定上下文中打开页面并截取整页，output_file 为 None 时只返回图片数据
+
+    shot_options 传给 screenshot_page（selector、clip、image_format、quality）
+    """
+    page, stats = _open_page(context, url, wait_time, ready, policy, timeouts, metrics)
+
+    # 全页面截图
+    with metrics.stage("screenshot"):
+        data = screenshot_page(page, None, full_page=True, timeout=timeouts.screenshot, **shot_options)
+
+    _finish_page(page, stats, metrics)
+    _write_output(data, output_file, metrics)
+    return data
+
+
+def _capture_tiled_page(
+    context,
+    url: str,
+    output_file: Path,
+    wait_time: float,
+    ready: Optional[Sequence[ReadyCondition]],
+    policy: Optional[RequestPolicy],
+    timeouts: StageTimeouts,
+    metrics: CaptureMetrics,
+    tile_wait: float = 2.0,
+    max_height: int = 50000,
+    hide_fixed: bool = True
+):
+    """
+    分块截取整页：每次滚动一屏，等视口内的懒加载图片加载完再截这一屏，
+    截好的分块立即压缩写入 PNG，内存中最多只保留一两个分块
+
+    Args:
+        tile_wait: 每一屏等待图片加载的最长时间（秒）
+        max_height: 最大截取高度（CSS 像素），防止无限滚动页面一直截下去
+        hide_fixed: 第一屏之后隐藏固定定位元素
+    """
+    page, stats = _open_page(context, url, wait_time, ready, policy, timeouts, metrics)
+
+    viewport_height = page.evaluate("window.innerHeight")
+    writer = None
+    written = 0  # 已写入的高度（CSS 像素）
+
+    try:
+        while written < max_height:
+            with metrics.stage("scroll"):
+                page.evaluate("y => window.scrollTo(0, y)", written)
+                wait_until_ready(page, [WaitForViewportImages()], timeout=tile_wait)
+                page.evaluate(NEXT_FRAME_SCRIPT)
+                scroll_y = page.evaluate("window.scrollY")
+
+            with metrics.stage("screenshot"):
+                data = page.screenshot(full_page=False, timeout=timeouts.screenshot * 1000)
+
+            with metrics.stage("write"):
+                tile = Image.open(io.BytesIO(data))
+                scale = tile.height / viewport_height
+
+                # 滚到底部时浏览器不会再往下滚，这一屏顶部和已写入的部分重叠，需要裁掉
+                overlap = max(0, written - scroll_y)
+                if overlap:
+                    tile = tile.crop((0, round(overlap * scale), tile.width, tile.height))
+
+                if writer is None:
+                    writer = PngStreamWriter(str(output_file), tile.width)
+                writer.write_rows(tile)
+                del tile, data
+
+            if hide_fixed and written == 0:
+                page.evaluate(HIDE_FIXED_SCRIPT)
+
+            written = scroll_y + viewport_height
+            if written >= page.evaluate("document.documentElement.scrollHeight"):
+                break
+    except BaseException:
+        # 中途失败时删掉写了一半的文件，否则补上结尾后它看起来像一张完整的截图
+        if writer is not None:
+            writer.abort()
+        raise
+    if writer is not None:
+        with metrics.stage("write"):
+            writer.close()
+
+    _finish_page(page, stats, metrics)
+    print(f"分块长截图已保存: {output_file.absolute()}（高度 {writer.height if writer else 0} 像素）")
+
+
+def _check_har(record_har: Optional[str], replay_har: Optional[str]):
+    """检查 HAR 录制 / 回放参数"""
+    if record_har and replay_har:
+        raise ValueError("record_har 和 replay_har 不能同时使用")
+    if replay_har and not Path(replay_har).is_file():
+        raise ValueError(f"HAR 文件不存在: {replay_har}")
+    if record_har:
+        Path(record_har).parent.mkdir(parents=True, exist_ok=True)
+
+
+def _run_with_context(
+    pool: Optional[BrowserPool],
+    context_options: dict,
+    fn,
+    metrics: CaptureMetrics,
+    launch_args: Optional[List[str]] = None,
+    record_har: Optional[str] = None,
+    replay_har: Optional[str] = None
+):
+    """
+    创建浏览器上下文并执行 fn(context)
+
+    传入浏览器池时在池的工作线程中执行，否则单独启动一次浏览器，用完关闭。
+    record_har 把本次访问的所有请求和响应录制成 HAR（上下文关闭时写入）；
+    replay_har 只从 HAR 返回响应，HAR 中没有的请求直接中断，不访问网络。
+    """
+    if record_har:
+        # 参数与预热的上下文不同，总是新建上下文
+        context_options = dict(context_options, record_har_path=str(record_har))
+    if replay_har:
+        capture = fn
+
+        def fn(context):
+            # 装在页面上（_open_page 会取用这个页面），预热的上下文复用时不会累积
+            page = context.pages[0] if context.pages else context.new_page()
+            page.route_from_har(str(replay_har), not_found="abort")
+            return capture(context)
+
+    if pool is not None:
+        def task():
+            with pool.new_context(metrics=metrics, **context_options) as context:
+                return fn(context)
+
+        return pool.run(task)
+
+    with sync_playwright() as p:
+        # 启动浏览器（非无头模式可以看到过程）
+        with metrics.stage("launch"):
+            browser = p.chromium.launch(
+                headless=True,
+                args=DEFAULT_LAUNCH_ARGS if launch_args is None else launch_args
+            )
+
+        try:
+            with metrics.stage("context"):
+                context = browser.new_context(**context_options)
+            try:
+                return fn(context)
+            finally:
+                # 显式关闭上下文，录制的 HAR 才会写入
+                context.close()
+        finally:
+            browser.close()
+
+
+def _cached_capture(
+    cache: Optional[CaptureCache],
+    refresh: bool,
+    url: str,
+    output_file: Optional[Path],
+    capture,
+    metrics: CaptureMetrics,
+    **key_options
+) -> bytes:
+    """
+    先查缓存，未命中（或要求刷新）时执行 capture() 并写入缓存
+
+    Returns:
+        图片数据
+    """
+    if cache is None:
+        return capture()
+
+    key = cache.key(url, **key_options)
+    if not refresh:
+        with metrics.stage("cache"):
+            data = cache.read(key)
+        if data is not None:
+            metrics.cached = True
+            print(f"使用缓存截图: {url}")
+            _write_output(data, output_file, metrics)
+            return data
+
+    data = capture()
+    cache.put_bytes(key, data, url)
+    return data
+
+
+def _with_retry(
+    capture,
+    url: str,
+    retry: Optional[RetryPolicy],
+    host_health: Optional[HostHealth],
+    metrics: CaptureMetrics
+):
+    """给 capture 加上重试和主机失败统计，尝试次数记录在 metrics.attempts，阶段耗时只保留最后一次尝试"""
+    if retry is None and host_health is None:
+        return capture
+
+    before = {}
+
+    def attempt():
+        # 每次尝试从同一个起点开始计时，不把失败尝试的阶段耗时累加进来（与异步引擎一致）
+        if "stages" not in before:
+            before["stages"] = dict(metrics.stages)
+        else:
+            metrics.reset_attempt(before["stages"])
+        return capture()
+
+    def on_retry(attempt, error):
+        metrics.attempts = attempt + 1
+        print(f"截图失败，第 {attempt} 次重试: {error}")
+
+    return lambda: call_with_retry(attempt, url, retry, host_health, on_retry)
+
+
+def _record_metrics(
+    metrics: CaptureMetrics,
+    metrics_log: Optional[str],
+    output_bytes: Optional[int] = None,
+    error: Optional[BaseException] = None
+):
+    """结束计时，需要时追加写入指标日志"""
+    metrics.finish(output_bytes=output_bytes, error=error)
+    if metrics_log:
+        append_metrics(metrics_log, metrics)
+
+
+def _make_result(data: bytes, output_file: Optional[Path], result: str):
+    """
+    按 result 返回截图：path 返回文件路径，bytes 返回编码后的数据，image 返回已解码的 PIL Image
+    """
+    if result == "path":
+        if output_file is None:
+            raise ValueError("result='path' 需要指定 output_path")
+        return str(output_file.absolute())
+    if result == "bytes":
+        return data
+    if result == "image":
+        image = Image.open(io.BytesIO(data))
+        # 在当前（通常是后台）线程完成解码，避免界面线程第一次访问像素时卡顿
+        image.load()
+        return image
+    raise ValueError(f"不支持的返回类型: {result}")
+
 
 def take_jd_screenshot(
     url: str,
-    output_path: str = "screenshot.png",
-    width: int = 1920,
-    height: int = 1080,
-    wait_time: int = 3
-) -> str:
+    output_path: Optional[str] = "screenshot.png",
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    wait_time: float = 3,
+    pool: Optional[BrowserPool] = None,
+    ready: Optional[Sequence[ReadyCondition]] = None,
+    policy: Optional[RequestPolicy] = None,
+    cache: Optional[CaptureCache] = None,
+    refresh: bool = False,
+    result: str = "path",
+    selector: Optional[str] = None,
+    clip: Optional[Union[Tuple[float, float, float, float], dict]] = None,
+    image_format: str = "png",
+    quality: Optional[int] = None,
+    timeouts: Optional[StageTimeouts] = None,
+    retry: Optional[RetryPolicy] = None,
+    host_health: Optional[HostHealth] = None,
+    profile: Optional[str] = None,
+    record_har: Optional[str] = None,
+    replay_har: Optional[str] = None,
+    with_metrics: bool = False,
+    metrics_log: Optional[str] = None
+):
     """
     自动截取京东商品页面
-    
+
     Args:
         url: 京东商品链接
-        output_path: 截图保存路径
-        width: 浏览器宽度
-        height: 浏览器高度
-        wait_time: 页面加载后等待时间（秒）
-    
+        output_path: 截图保存路径，None 表示不写盘
+        width: 浏览器宽度，None 表示使用配置档的默认值（1920）
+        height: 浏览器高度，None 表示使用配置档的默认值（1080）
+        wait_time: 页面加载后最长等待时间（秒），页面就绪后立即截图
+        pool: 浏览器池，传入时复用已启动的浏览器，否则单独启动一次
+        ready: 就绪条件（见 readiness 模块），None 表示 load 完成且网络安静 500ms
+        policy: 请求拦截策略（见 request_policy 模块），None 表示不拦截
+        cache: 截图缓存，None 表示不使用缓存
+        refresh: 忽略已有缓存重新截图（结果仍会写入缓存）
+        result: 返回类型，"path" 返回文件路径，"bytes" 返回编码后的图片数据，
+            "image" 返回 PIL Image；后两种可以把 output_path 设为 None 跳过写盘
+        selector: CSS 选择器，只截取该元素（如商品信息区块）
+        clip: 只截取页面上的矩形区域 (x, y, width, height)
+        image_format: 截图格式 png 或 jpeg（照片多的页面 JPEG 编码更快、文件更小）
+        quality: JPEG 质量 (0-100)
+        timeouts: 打开页面和截图的超时，None 表示各 30 秒
+        retry: 重试策略（见 capture_retry 模块），None 表示失败不重试
+        host_health: 主机失败统计，同一主机连续失败过多时暂停访问
+        profile: 配置档名称（见 PROFILES，如 low-memory），决定启动参数、默认视口和像素比
+        record_har: 把页面的所有请求和响应录制到这个 HAR 文件（会跳过截图缓存读取）
+        replay_har: 只从这个 HAR 文件回放页面，不访问网络，可以换视口或参数重新截图
+        with_metrics: 同时返回本次截图的 CaptureMetrics（各阶段耗时、请求数、页面高度等）
+        metrics_log: 指标日志路径，设置后每次截图追加一行 JSON
+
     Returns:
-        截图保存的完整路径
+        截图保存的完整路径，或按 result 返回图片数据 / PIL Image；
+        with_metrics=True 时返回 (结果, CaptureMetrics)
     """
-    output_file = Path(output_path)
-    
-    with sync_playwright() as p:
-        # 启动浏览器（非无头模式可以看到过程）
-        browser = p.chromium.launch(
-            headless=True,
-            args=['--disable-blink-features=AutomationControlled']
+    output_file = Path(output_path) if output_path is not None else None
+    shot_options = {'selector': selector, 'clip': clip, 'image_format': image_format, 'quality': quality}
+    timeouts = timeouts or StageTimeouts()
+    metrics = CaptureMetrics(url)
+    _check_har(record_har, replay_har)
+
+    config = get_profile(profile)
+    width = width or config.width
+    height = height or config.height
+    context_options = jd_context_options(width, height, config.device_scale_factor)
+
+    def capture():
+        return _run_with_context(
+            pool,
+            context_options,
+            lambda context: _capture_jd_page(
+                context, url, output_file, wait_time, ready, policy, timeouts, metrics, **shot_options
+            ),
+            metrics,
+            launch_args=list(config.launch_args),
+            record_har=record_har,
+            replay_har=replay_har
         )
-        
-        # 创建上下文，模拟真实浏览器
-        context = browser.new_context(
-            viewport={'width': width, 'height': height},
-            user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+    capture = _with_retry(capture, url, retry, host_health, metrics)
+    try:
+        # 录制时必须真正访问页面，不读取截图缓存
+        data = _cached_capture(
+            cache, refresh or bool(record_har), url, output_file, capture, metrics,
+            width=width, height=height, device_scale_factor=config.device_scale_factor, full_page=False,
+            wait_time=wait_time, ready=ready, policy=policy, replay_har=replay_har, **shot_options
         )
-        
-        page = context.new_page()
-        
-        try:
-            # 访问页面
-            print(f"正在访问: {url}")
-            page.goto(url, wait_until='domcontentloaded', timeout=30000)
-            
-            # 等待页面完全加载
-            time.sleep(wait_time)
-            
-            # 滚动到顶部确保显示完整
-            page.evaluate("window.scrollTo(0, 0)")
-            time.sleep(0.5)
-            
-            # 截图
-            page.screenshot(path=str(output_file), full_page=False)
-            print(f"截图已保存: {output_file.absolute()}")
-            
-        except Exception as e:
-            print(f"截图失败: {e}")
-            raise
-        finally:
-            browser.close()
-    
-    return str(output_file.absolute())
+    except Exception as e:
+        _record_metrics(metrics, metrics_log, error=e)
+        raise
+
+    _record_metrics(metrics, metrics_log, output_bytes=len(data))
+    value = _make_result(data, output_file, result)
+    return (value, metrics) if with_metrics else value
 
 
 def take_screenshot_with_scroll(
     url: str,
-    output_path: str = "screenshot_full.png",
-    width: int = 1920
-) -> str:
+    output_path: Optional[str] = "screenshot_full.png",
+    width: Optional[int] = None,
+    pool: Optional[BrowserPool] = None,
+    wait_time: float = 30,
+    ready: Optional[Sequence[ReadyCondition]] = None,
+    policy: Optional[RequestPolicy] = None,
+    cache: Optional[CaptureCache] = None,
+    refresh: bool = False,
+    result: str = "path",
+    tiled: bool = False,
+    tile_height: int = 1080,
+    selector: Optional[str] = None,
+    clip: Optional[Union[Tuple[float, float, float, float], dict]] = None,
+    image_format: str = "png",
+    quality: Optional[int] = None,
+    timeouts: Optional[StageTimeouts] = None,
+    retry: Optional[RetryPolicy] = None,
+    host_health: Optional[HostHealth] = None,
+    profile: Optional[str] = None,
+    record_har: Optional[str] = None,
+    replay_har: Optional[str] = None,
+    with_metrics: bool = False,
+    metrics_log: Optional[str] = None
+):
     """
     截取整个页面（长截图）
-    
+
     Args:
         url: 页面链接
-        output_path: 截图保存路径
-        width: 浏览器宽度
-    
+        output_path: 截图保存路径，None 表示不写盘
+        width: 浏览器宽度，None 表示使用配置档的默认值（1920）
+        pool: 浏览器池，传入时复用已启动的浏览器，否则单独启动一次
+        wait_time: 页面加载后最长等待时间（秒），页面就绪后立即截图
+        ready: 就绪条件（见 readiness 模块），None 表示 load 完成且网络安静 500ms
+        policy: 请求拦截策略（见 request_policy 模块），None 表示不拦截
+        cache: 截图缓存，None 表示不使用缓存
+        refresh: 忽略已有缓存重新截图（结果仍会写入缓存）
+        result: 返回类型，"path" 返回文件路径，"bytes" 返回编码后的图片数据，
+            "image" 返回 PIL Image；后两种可以把 output_path 设为 None 跳过写盘
+        tiled: 分块截取并边截边写入文件，适合很长的页面，内存占用与页面高度无关；
+            需要指定 output_path
+        tile_height: 分块模式下每一块（即浏览器视口）的高度
+        selector: CSS 选择器，只截取该元素（不能与 tiled 同时使用）
+        clip: 只截取页面上的矩形区域 (x, y, width, height)（不能与 tiled 同时使用）
+        image_format: 截图格式 png 或 jpeg（分块模式只支持 png）
+        quality: JPEG 质量 (0-100)
+        timeouts: 打开页面和截图的超时，None 表示各 30 秒
+        retry: 重试策略（见 capture_retry 模块），None 表示失败不重试
+        host_health: 主机失败统计，同一主机连续失败过多时暂停访问
+        profile: 配置档名称（见 PROFILES，如 low-memory），决定启动参数、默认视口和像素比
+        record_har: 把页面的所有请求和响应录制到这个 HAR 文件（会跳过截图缓存读取）
+        replay_har: 只从这个 HAR 文件回放页面，不访问网络，可以换视口或参数重新截图
+        with_metrics: 同时返回本次截图的 CaptureMetrics
+        metrics_log: 指标日志路径，设置后每次截图追加一行 JSON
+
     Returns:
-        截图保存的完整路径
+        截图保存的完整路径，或按 result 返回图片数据 / PIL Image；
+        with_metrics=True 时返回 (结果, CaptureMetrics)
     """
-    output_file = Path(output_path)
-    
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context(
-            viewport={'width': width, 'height': 800},
-            user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-        )
-        page = context.new_page()
-        
+    output_file = Path(output_path) if output_path is not None else None
+    timeouts = timeouts or StageTimeouts()
+    metrics = CaptureMetrics(url)
+    _check_har(record_har, replay_har)
+
+    config = get_profile(profile)
+    width = width or config.width
+    # 未指定配置档时保持原来的启动方式（不加任何启动参数）
+    launch_args = list(config.launch_args) if profile else []
+
+    context_options = {
+        'viewport': {'width': width, 'height': tile_height if tiled else 800},
+        'device_scale_factor': config.device_scale_factor,
+        'user_agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
+    }
+
+    shot_options = {'selector': selector, 'clip': clip, 'image_format': image_format, 'quality': quality}
+
+    if tiled:
+        if selector is not None or clip is not None:
+            raise ValueError("分块长截图不支持 selector / clip")
+        if image_format.lower() != "png":
+            raise ValueError("分块长截图只支持 png 格式")
+        if output_file is None:
+            raise ValueError("分块长截图需要指定 output_path")
+
+        key = None
+        if cache is not None:
+            key = cache.key(
+                url, width=width, height=tile_height, device_scale_factor=config.device_scale_factor,
+                full_page=True, tiled=True,
+                wait_time=wait_time, ready=ready, policy=policy, replay_har=replay_har
+            )
         try:
-            page.goto(url, wait_until='networkidle', timeout=30000)
-            time.sleep(2)
-            
-            # 全页面截图
-            page.screenshot(path=str(output_file), full_page=True)
-            print(f"长截图已保存: {output_file.absolute()}")
-            
-        finally:
-            browser.close()
-    
-    return str(output_file.absolute())
+            hit = False
+            if key is not None and not (refresh or record_har):
+                with metrics.stage("cache"):
+                    hit = cache.fetch(key, str(output_file))
+            if hit:
+                metrics.cached = True
+                print(f"使用缓存截图: {url}")
+            else:
+                capture = _with_retry(
+                    lambda: _run_with_context(
+                        pool,
+                        context_options,
+                        lambda context: _capture_tiled_page(
+                            context, url, output_file, wait_time, ready, policy, timeouts, metrics
+                        ),
+                        metrics,
+                        launch_args=launch_args,
+                        record_har=record_har,
+                        replay_har=replay_har
+                    ),
+                    url, retry, host_health, metrics
+                )
+                capture()
+                if key is not None:
+                    cache.put(key, str(output_file), url)
+        except Exception as e:
+            _record_metrics(metrics, metrics_log, error=e)
+            raise
 
+        _record_metrics(metrics, metrics_log, output_bytes=output_file.stat().st_size)
+        data = output_file.read_bytes() if result != "path" else b""
+        value = _make_result(data, output_file, result)
+        return (value, metrics) if with_metrics else value
 
-if __name__ == "__main__":
-    # 测试
-    test_url = "https://item.jd.com/100012043978.html"
-    take_jd_screenshot(test_url, "test_screenshot.png")
+    def capture():
+        return _run_with_context(
+            pool,
+            context_options,
+            lambda context: _capture_full_page(
+                context, url, output_file, wait_time, ready, policy, timeouts, metrics, **shot_options
+            ),
+            metrics,
+            launch_args=launch_args,
+            record_har=record_har,
+            replay_har=replay_har
+        )
+
+    capture = _with_retry(capture, url, retry, host_health, metrics)
+    try:
+        data = _cached_capture(
+            cache, refresh or bool(record_har), url, output_file, capture, metrics,
+            width=width, height=800, device_scale_factor=config.device_scale_factor, full_page=True,
+            wait_time=wait_time, ready=ready, policy=policy, replay_har=replay_har, **shot_options
+        )
+    except Exception as e:
+        _record_metrics(metrics, metrics_log, error=e)
+        raise
+
+    _record_metrics(metrics, metrics_log, output_bytes=len(data))
+    value = _make_result(data, output_file, result)
+    return (value, metrics) if with_metrics else value
+
+
+def _capture_elements(
+    context,
+    url: str,
+    selectors: Sequence[str],
+    output_files: Dict[str, Optional[Path]],
+    wait_time: float,
+    ready: Optional[Sequence[ReadyCondition]],
+    policy: Optional[RequestPolicy],
+    timeouts: StageTimeouts,
+    metrics: CaptureMetrics,
+    **encode_options
+) -> Dict[str, Optional[bytes]]:
+    """打开一次页面，依次截取多个元素；找不到的元素结果为 None"""
+    page, stats = _open_page(context, url, wait_time, ready, policy, timeouts, metrics)
 
+    results = {}
+    for selector in selectors:
+        if page.locator(selector).count() == 0:
+            print(f"未找到元素: {selector}")
+            results[selector] = None
+            continue
+        with metrics.stage("screenshot"):
+            data = screenshot_page(
+                page, None, selector=selector, timeout=timeouts.screenshot, **encode_options
+            )
+        _write_output(data, output_files[selector], metrics)
+        results[selector] = data
 
+    _finish_page(page, stats, metrics)
+    return results
 
 
+def take_element_screenshots(
+    url: str,
+    selectors: Sequence[str],
+    output_dir: Optional[str] = None,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    wait_time: float = 3,
+    pool: Optional[BrowserPool] = None,
+    ready: Optional[Sequence[ReadyCondition]] = None,
+    policy: Optional[RequestPolicy] = None,
+    image_format: str = "png",
+    quality: Optional[int] = None,
+    timeouts: Optional[StageTimeouts] = None,
+    retry: Optional[RetryPolicy] = None,
+    host_health: Optional[HostHealth] = None,
+    profile: Optional[str] = None,
+    record_har: Optional[str] = None,
+    replay_har: Optional[str] = None,
+    with_metrics: bool = False,
+    metrics_log: Optional[str] = None
+):
+    """
+    只加载一次页面，截取多个元素
+
+    Args:
+        url: 页面链接
+        selectors: CSS 选择器列表
+        output_dir: 保存目录，文件名为 element_<序号>.png（或 .jpg）；None 表示不写盘、返回图片数据
+        width: 浏览器宽度，None 表示使用配置档的默认值
+        height: 浏览器高度，None 表示使用配置档的默认值
+        wait_time: 页面加载后最长等待时间（秒）
+        pool: 浏览器池
+        ready: 就绪条件
+        policy: 请求拦截策略
+        image_format: 截图格式 png 或 jpeg
+        quality: JPEG 质量 (0-100)
+        timeouts: 打开页面和截图的超时，None 表示各 30 秒
+        retry: 重试策略（见 capture_retry 模块），None 表示失败不重试
+        host_health: 主机失败统计，同一主机连续失败过多时暂停访问
+        profile: 配置档名称（见 PROFILES，如 low-memory），决定启动参数、默认视口和像素比
+        record_har: 把页面的所有请求和响应录制到这个 HAR 文件（会跳过截图缓存读取）
+        replay_har: 只从这个 HAR 文件回放页面，不访问网络，可以换视口或参数重新截图
+        with_metrics: 同时返回本次截图的 CaptureMetrics
+        metrics_log: 指标日志路径，设置后每次截图追加一行 JSON
+
+    Returns:
+        {选择器: 文件路径或图片数据}，页面上找不到的元素为 None；
+        with_metrics=True 时返回 (结果, CaptureMetrics)
+    """
+    timeouts = timeouts or StageTimeouts()
+    metrics = CaptureMetrics(url)
+    _check_har(record_har, replay_har)
+    output_files = {}
+    for index, selector in enumerate(selectors):
+        name = f"element_{index}{format_suffix(image_format)}"
+        output_files[selector] = Path(output_dir) / name if output_dir else None
+    if output_dir:
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
 
+    config = get_profile(profile)
+    context_options = jd_context_options(
+        width or config.width, height or config.height, config.device_scale_factor
+    )
+    capture = _with_retry(
+        lambda: _run_with_context(
+            pool,
+            context_options,
+            lambda context: _capture_elements(
+                context, url, selectors, output_files, wait_time, ready, policy, timeouts, metrics,
+                image_format=image_format, quality=quality
+            ),
+            metrics,
+            launch_args=list(config.launch_args),
+            record_har=record_har,
+            replay_har=replay_har
+        ),
+        url, retry, host_health, metrics
+    )
+    try:
+        captured = capture()
+    except Exception as e:
+        _record_metrics(metrics, metrics_log, error=e)
+        raise
+    _record_metrics(
+        metrics, metrics_log,
+        output_bytes=sum(len(data) for data in captured.values() if data is not None)
+    )
+
+    results = {}
+    for selector, data in captured.items():
+        if data is None or output_files[selector] is None:
+            results[selector] = data
+        else:
+            results[selector] = str(output_files[selector].absolute())
+    return (results, metrics) if with_metrics else results
+
+
+if __name__ == "__main__":
+    # 测试
+    test_url = "https://item.jd.com/100012043978.html"
+    take_jd_screenshot(test_url, "test_screenshot.png")
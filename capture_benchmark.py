@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+截图基准测试
+在本地测试站点（fixture_site）上测量单次、浏览器池、并发三种模式的截图延迟、吞吐和浏览器内存峰值，不需要联网
+
+用法:
+    python capture_benchmark.py --repeat 3 -o bench.json
+    python capture_benchmark.py --modes pooled,concurrent --baseline bench.json
+    python capture_benchmark.py --profiles default,low-memory
+    python capture_benchmark.py --modes pooled,concurrent --asset-cache
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import tempfile
+import threading
+import time
+
+from fixture_site import FixtureServer, FIXTURE_PAGES
+from browser_screenshot import BrowserPool, PROFILES, get_profile, take_jd_screenshot, take_screenshot_with_scroll
+from async_capture import AsyncCaptureEngine
+from capture_metrics import percentile, summarize_stages
+from memory_watchdog import MemoryWatchdog, browser_root_pids
+from asset_cache import AssetCache
+
+
+MODES = ("single", "pooled", "concurrent")
+
+
+class _MemorySampler:
+    """测试期间在后台线程中定期统计本进程启动的所有浏览器的内存"""
+
+    def __init__(self, interval: float = 0.2):
+        self.watchdog = MemoryWatchdog(interval=interval)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="bench-memory", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.watchdog.interval):
+            self.watchdog.sample(browser_root_pids())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+
+
+def _capture_sync(url: str, args, profile: str, pool: Optional[BrowserPool]):
+    """同步截图一次，返回 CaptureMetrics"""
+    options = dict(pool=pool, wait_time=args.wait_time, result="bytes", with_metrics=True, profile=profile)
+    if args.full_page:
+        _, metrics = take_screenshot_with_scroll(url, None, width=args.width, **options)
+    else:
+        _, metrics = take_jd_screenshot(url, None, width=args.width, height=args.height, **options)
+    return metrics
+
+
+def _run_sequential(urls: List[str], args, profile: str, pool: Optional[BrowserPool]) -> List[dict]:
+    records = []
+    for url in urls:
+        try:
+            records.append(_capture_sync(url, args, profile, pool).as_dict())
+        except Exception as e:
+            records.append({"url": url, "error": f"{type(e).__name__}: {e}", "stages": {}})
+    return records
+
+
+def bench_single(urls: List[str], args, profile: str, asset_cache: Optional[AssetCache]) -> List[dict]:
+    """每次截图单独启动浏览器（不使用静态资源缓存）"""
+    return _run_sequential(urls, args, profile, None)
+
+
+def bench_pooled(urls: List[str], args, profile: str, asset_cache: Optional[AssetCache]) -> List[dict]:
+    """复用同一个浏览器池，依次截图"""
+    with BrowserPool.for_profile(profile, asset_cache=asset_cache) as pool:
+        return _run_sequential(urls, args, profile, pool)
+
+
+def bench_concurrent(urls: List[str], args, profile: str, asset_cache: Optional[AssetCache]) -> List[dict]:
+    """异步引擎并发截图，并发数默认取配置档中每个浏览器的页面上限"""
+    config = get_profile(profile)
+
+    async def run():
+        records = []
+        with tempfile.TemporaryDirectory() as output_dir:
+            engine = AsyncCaptureEngine.for_profile(
+                profile, pages_per_browser=args.concurrency or config.pages_per_browser,
+                asset_cache=asset_cache
+            )
+            async with engine:
+                async for result in engine.capture_many(
+                    urls, output_dir,
+                    width=args.width or config.width,
+                    height=args.height or config.height,
+                    device_scale_factor=config.device_scale_factor,
+                    wait_time=args.wait_time, full_page=args.full_page
+                ):
+                    records.append(result.metrics.as_dict())
+        return records
+
+    return asyncio.run(run())
+
+
+BENCHMARKS = {
+    "single": bench_single,
+    "pooled": bench_pooled,
+    "concurrent": bench_concurrent,
+}
+
+
+def summarize(
+    mode: str,
+    profile: str,
+    records: List[dict],
+    wall_time: float,
+    memory: dict,
+    asset_cache: Optional[dict] = None
+) -> dict:
+    """汇总一种模式的结果"""
+    ok = [r for r in records if not r.get("error")]
+    latencies = [r["total"] for r in ok]
+    return {
+        "mode": mode,
+        "profile": profile,
+        "peak_rss_mb": memory["peak_rss_mb"] if memory["samples"] else None,
+        "transferred_bytes": sum(r.get("transferred_bytes", 0) for r in ok),
+        "asset_cache": asset_cache,
+        "captures": len(records),
+        "errors": len(records) - len(ok),
+        "wall_time": round(wall_time, 3),
+        "throughput": round(len(ok) / wall_time, 3) if wall_time > 0 else 0.0,
+        "latency": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "max": max(latencies) if latencies else 0.0,
+        },
+        "stages": summarize_stages(r["stages"] for r in ok),
+        "records": records,
+    }
+
+
+def compare_with_baseline(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """
+    和上一次的结果比较，返回退化项的说明
+
+    p95 延迟变慢、吞吐下降或内存峰值上升超过 tolerance（比例）即视为退化，新增错误也算退化。
+    """
+    regressions = []
+    for mode, current in results.items():
+        previous = baseline.get(mode)
+        if previous is None:
+            continue
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{mode}: 失败数 {previous['errors']} → {current['errors']}")
+        before, after = previous["latency"]["p95"], current["latency"]["p95"]
+        if before and after > before * (1 + tolerance):
+            regressions.append(f"{mode}: p95 延迟 {before:.2f}s → {after:.2f}s")
+        before, after = previous["throughput"], current["throughput"]
+        if before and after < before * (1 - tolerance):
+            regressions.append(f"{mode}: 吞吐 {before:.2f} → {after:.2f} 张/秒")
+        before, after = previous.get("peak_rss_mb"), current.get("peak_rss_mb")
+        if before and after and after > before * (1 + tolerance):
+            regressions.append(f"{mode}: 内存峰值 {before:.0f} MB → {after:.0f} MB")
+    return regressions
+
+
+def print_summary(name: str, summary: dict):
+    latency = summary["latency"]
+    peak = summary["peak_rss_mb"]
+    memory = f"{peak:7.0f} MB" if peak is not None else "      - MB"
+    print(f"{name:<22} {summary['captures']:>4} 张  失败 {summary['errors']:<3}"
+          f" p50 {latency['p50']:6.2f}s  p95 {latency['p95']:6.2f}s"
+          f"  吞吐 {summary['throughput']:5.2f} 张/秒  内存峰值 {memory}"
+          f"  下载 {summary['transferred_bytes'] / 1024 / 1024:6.1f} MB", file=sys.stderr)
+    if summary["asset_cache"]:
+        cache = summary["asset_cache"]
+        print(f"{'':<22} 静态资源缓存命中 {cache['hits']} 次，未命中 {cache['misses']} 次"
+              f"（命中率 {cache['hit_rate']:.0%}）", file=sys.stderr)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="在本地测试站点上测量截图延迟和吞吐")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"测试模式，逗号分隔: {', '.join(MODES)}")
+    parser.add_argument("--pages", default=",".join(FIXTURE_PAGES),
+                        help=f"测试页面，逗号分隔: {', '.join(FIXTURE_PAGES)}")
+    parser.add_argument("--repeat", type=int, default=2, help="每个页面截图次数")
+    parser.add_argument("--profiles", default="default",
+                        help=f"配置档，逗号分隔，每个配置档各测一遍: {', '.join(PROFILES)}")
+    parser.add_argument("--concurrency", type=int, help="并发模式的页面数，默认由配置档决定")
+    parser.add_argument("--width", type=int, help="浏览器宽度，默认由配置档决定")
+    parser.add_argument("--height", type=int, help="浏览器高度，默认由配置档决定")
+    parser.add_argument("--wait-time", type=float, default=5, help="页面加载后最长等待时间（秒）")
+    parser.add_argument("--full-page", action="store_true", help="截取整页")
+    parser.add_argument("--asset-cache", action="store_true",
+                        help="浏览器池和并发模式使用静态资源缓存（每次测试从空缓存开始）")
+    parser.add_argument("-o", "--output", help="结果 JSON 路径，不指定则输出到标准输出")
+    parser.add_argument("--baseline", help="上一次的结果 JSON，有退化时退出码为 1")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的退化比例")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    for mode in modes:
+        if mode not in BENCHMARKS:
+            raise SystemExit(f"未知的测试模式: {mode}")
+    profiles = [p.strip() for p in args.profiles.split(",") if p.strip()]
+    for profile in profiles:
+        get_profile(profile)
+
+    results = {}
+    with FixtureServer() as site:
+        pages = site.urls([p.strip() for p in args.pages.split(",") if p.strip()])
+        # 每轮加不同的查询参数，并发模式下输出文件名不会重复
+        urls = [f"{url}?round={i}" for i in range(args.repeat) for url in pages]
+        for profile in profiles:
+            for mode in modes:
+                # 只测一个配置档时结果键保持为模式名，便于和旧结果比较
+                name = mode if len(profiles) == 1 else f"{mode}@{profile}"
+                print(f"正在测试 {name}（{len(urls)} 张）...", file=sys.stderr)
+                started = time.perf_counter()
+                with tempfile.TemporaryDirectory() as cache_dir, _MemorySampler() as sampler:
+                    asset_cache = AssetCache(cache_dir) if args.asset_cache else None
+                    records = BENCHMARKS[mode](urls, args, profile, asset_cache)
+                results[name] = summarize(
+                    mode, profile, records, time.perf_counter() - started, sampler.watchdog.as_dict(),
+                    asset_cache.stats() if asset_cache is not None else None
+                )
+                print_summary(name, results[name])
+
+    report = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": vars(args),
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))["results"]
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"退化: {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+截图缓存模块
+按 URL 和截图参数缓存截图文件，TTL 内重复截图直接复制缓存，超出容量时淘汰最久未使用的条目
+"""
+
+from pathlib import Path
+from typing import Optional
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+
+def _describe(value):
+    """把截图参数转换成可稳定序列化的结构（就绪条件、拦截策略等对象取公开属性）"""
+    if isinstance(value, (list, tuple)):
+        return [_describe(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _describe(v) for k, v in sorted(value.items())}
+    if isinstance(value, (frozenset, set)):
+        return sorted(_describe(v) for v in value)
+    if hasattr(value, "__dict__"):
+        public = {k: v for k, v in vars(value).items() if not k.startswith("_")}
+        return {"type": type(value).__name__, **_describe(public)}
+    return value
+
+
+class CaptureCache:
+    """
+    磁盘截图缓存
+
+    每个条目是 <key>.png 加一个 <key>.json 元数据文件。
+    文件的修改时间记录最近一次命中，用于 LRU 淘汰；元数据中的 created 用于 TTL 判断。
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        ttl: float = 3600,
+        max_bytes: int = 500 * 1024 * 1024
+    ):
+        """
+        Args:
+            cache_dir: 缓存目录，默认 ~/.cache/jd_screenshot/captures
+            ttl: 条目有效期（秒）
+            max_bytes: 缓存总大小上限（字节）
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else Path.home() / ".cache" / "jd_screenshot" / "captures"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(url: str, **options) -> str:
+        """根据 URL 和截图参数（视口、整页、就绪条件等）计算缓存键"""
+        payload = json.dumps({"url": url, "options": _describe(options)}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str):
+        return self.cache_dir / f"{key}.png", self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Path]:
+        """
+        查找缓存，命中时刷新访问时间
+
+        Returns:
+            缓存文件路径，未命中或已过期返回 None
+        """
+        image_path, meta_path = self._paths(key)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        if time.time() - meta.get("created", 0) > self.ttl or not image_path.exists():
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        os.utime(image_path)
+        self.hits += 1
+        return image_path
+
+    def read(self, key: str) -> Optional[bytes]:
+        """命中时返回缓存的图片数据，否则返回 None"""
+        cached = self.get(key)
+        if cached is None:
+            return None
+        return cached.read_bytes()
+
+    def fetch(self, key: str, output_path: str) -> bool:
+        """命中时把缓存复制到 output_path，返回是否命中"""
+        cached = self.get(key)
+        if cached is None:
+            return False
+        shutil.copyfile(cached, output_path)
+        return True
+
+    def put(self, key: str, source_path: str, url: str) -> Path:
+        """把截图文件存入缓存（按块复制，不整体读入内存），必要时淘汰旧条目"""
+        return self._store(key, url, lambda tmp_path: shutil.copyfile(source_path, tmp_path))
+
+    def put_bytes(self, key: str, data: bytes, url: str) -> Path:
+        """把截图数据存入缓存，必要时淘汰旧条目"""
+        return self._store(key, url, lambda tmp_path: tmp_path.write_bytes(data))
+
+    def _store(self, key: str, url: str, write) -> Path:
+        image_path, meta_path = self._paths(key)
+
+        # 先写临时文件再替换，避免并发读到半个文件
+        tmp_path = image_path.with_name(f"{image_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        write(tmp_path)
+        os.replace(tmp_path, image_path)
+        meta_path.write_text(
+            json.dumps({"url": url, "created": time.time()}, ensure_ascii=False),
+            encoding="utf-8"
+        )
+
+        self.evict()
+        return image_path
+
+    def _remove(self, key: str):
+        for path in self._paths(key):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def evict(self):
+        """删除过期条目，并按最近访问时间淘汰直到总大小不超过 max_bytes"""
+        with self._lock:
+            now = time.time()
+            entries = []
+            total = 0
+            for image_path in self.cache_dir.glob("*.png"):
+                try:
+                    stat = image_path.stat()
+                except FileNotFoundError:
+                    continue
+                if now - stat.st_mtime > self.ttl:
+                    # 超过 TTL 没被访问过的条目一定已经过期
+                    self._remove(image_path.stem)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, image_path.stem))
+                total += stat.st_size
+
+            entries.sort()
+            for _, size, key in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(key)
+                total -= size
+
+    def clear(self):
+        """清空缓存"""
+        for path in self.cache_dir.glob("*"):
+            if path.is_file():
+                path.unlink()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> CaptureCache:
+    """获取进程级共享的截图缓存"""
+    global _default_cache
+
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = CaptureCache()
+        return _default_cache
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+截图去重与变化检测模块
+定期重新截图同一批 URL 时，为每张截图计算精确哈希和感知哈希，与该 URL 上一次的截图比较：
+
+    identical       像素完全相同，用硬链接指向上一次的文件，不再占用空间
+    near-duplicate  感知哈希非常接近（如价格、角标等小改动），标记出来并给出变化区域
+    changed         明显变化，同样给出变化区域
+    new             该 URL 第一次截图
+
+每张截图旁边写一个 <截图>.hash.json 记录哈希和比较结果；每个 URL 最近一次的截图记录在索引目录中。
+装有 numpy 时用向量化运算计算变化区域，否则只给出一个包含所有变化的矩形。
+"""
+
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+import hashlib
+import json
+import os
+import threading
+
+from PIL import Image, ImageChops
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+Box = Tuple[int, int, int, int]
+
+
+@dataclass
+class Fingerprint:
+    """截图指纹：像素数据的 SHA-256 和 dHash 感知哈希（十六进制）"""
+    sha256: str
+    phash: str
+    width: int
+    height: int
+
+
+@dataclass
+class DedupeResult:
+    """一张截图与该 URL 上一次截图的比较结果"""
+    url: str
+    path: str
+    status: str
+    fingerprint: Fingerprint
+    reference: Optional[str] = None     # 上一次截图的路径
+    distance: Optional[float] = None    # 感知哈希的汉明距离占比（0 表示相同）
+    regions: List[Box] = field(default_factory=list)
+    linked: bool = False                # 是否已替换为指向 reference 的硬链接
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def _open(image: Union[str, Path, Image.Image]) -> Image.Image:
+    if isinstance(image, Image.Image):
+        return image
+    with Image.open(image) as opened:
+        opened.load()
+        return opened
+
+
+def perceptual_hash(image: Image.Image, hash_size: int = 16) -> str:
+    """
+    dHash：缩小为 (hash_size + 1) x hash_size 的灰度图，比较相邻像素的明暗
+
+    对重新编码、轻微缩放不敏感，局部小改动只影响少数几位。
+    """
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+
+def hash_distance(a: str, b: str) -> float:
+    """两个感知哈希不同的位数占比，长度不同时返回 1"""
+    if len(a) != len(b):
+        return 1.0
+    return bin(int(a, 16) ^ int(b, 16)).count("1") / (len(a) * 4)
+
+
+def fingerprint(image: Union[str, Path, Image.Image]) -> Fingerprint:
+    """
+    计算截图指纹
+
+    精确哈希基于解码后的像素（含尺寸和模式），不受 PNG 编码参数影响。
+    """
+    image = _open(image)
+    digest = hashlib.sha256(f"{image.mode}:{image.size}".encode("ascii"))
+    digest.update(image.tobytes())
+    return Fingerprint(
+        sha256=digest.hexdigest(),
+        phash=perceptual_hash(image),
+        width=image.width,
+        height=image.height,
+    )
+
+
+def _grid_regions(changed, cell: int) -> List[Box]:
+    """把变化网格（二维 bool 数组）按 8 邻接合并成连通区域，返回像素坐标的矩形"""
+    rows, cols = changed.shape
+    remaining = set(zip(*np.nonzero(changed)))
+    boxes = []
+    while remaining:
+        stack = [remaining.pop()]
+        top, left = stack[0]
+        bottom, right = top, left
+        while stack:
+            r, c = stack.pop()
+            top, bottom = min(top, r), max(bottom, r)
+            left, right = min(left, c), max(right, c)
+            for dr in (-1, 0, 1):
+                for dc in (-1, 0, 1):
+                    neighbor = (r + dr, c + dc)
+                    if neighbor in remaining:
+                        remaining.remove(neighbor)
+                        stack.append(neighbor)
+        boxes.append((int(left * cell), int(top * cell), int((right + 1) * cell), int((bottom + 1) * cell)))
+    return sorted(boxes, key=lambda box: (box[1], box[0]))
+
+
+def diff_regions(
+    before: Union[str, Path, Image.Image],
+    after: Union[str, Path, Image.Image],
+    tolerance: int = 16,
+    cell: int = 16
+) -> List[Box]:
+    """
+    找出两张截图之间变化的区域
+
+    Args:
+        before: 上一次的截图
+        after: 这一次的截图
+        tolerance: 像素任一通道差值超过这个值才算变化（忽略抗锯齿、压缩噪声）
+        cell: 网格大小（像素），变化按网格合并，区域边界对齐到网格
+
+    Returns:
+        [(left, top, right, bottom)]，按从上到下排列；尺寸不同时多出的部分也算变化区域
+    """
+    a, b = _open(before), _open(after)
+    # 已经是 RGB 时不复制（长截图一张就有上百 MB）
+    a = a if a.mode == "RGB" else a.convert("RGB")
+    b = b if b.mode == "RGB" else b.convert("RGB")
+    width, height = min(a.width, b.width), min(a.height, b.height)
+
+    extra = []
+    if b.width > width:
+        extra.append((width, 0, b.width, b.height))
+    if b.height > height:
+        extra.append((0, height, width, b.height))
+    if width == 0 or height == 0:
+        return extra
+
+    if a.size != (width, height):
+        a = a.crop((0, 0, width, height))
+    if b.size != (width, height):
+        b = b.crop((0, 0, width, height))
+
+    # 逐像素差值在 PIL 中完成；先取所有差异的外接矩形（对齐到网格），之后只处理这一块
+    diff = ImageChops.difference(a, b)
+    box = diff.getbbox()
+    if box is None:
+        return extra
+    left, top = box[0] // cell * cell, box[1] // cell * cell
+    diff = diff.crop((left, top, box[2], box[3]))
+
+    # 各通道差值取最大值，超过 tolerance 才算变化
+    red, green, blue = diff.split()
+    strongest = ImageChops.lighter(ImageChops.lighter(red, green), blue)
+    lut = [255 if v > tolerance else 0 for v in range(256)]
+
+    if np is None:
+        # 没有 numpy 时只返回包含所有变化的一个矩形
+        inner = strongest.point(lut).getbbox()
+        if inner is None:
+            return extra
+        return [(left + inner[0], top + inner[1], left + inner[2], top + inner[3])] + extra
+
+    mask = np.asarray(strongest) > tolerance
+    if not mask.any():
+        return extra
+
+    # 补齐到 cell 的整数倍后按网格归约，每个格子只要有一个像素变化就算变化
+    h, w = mask.shape
+    rows, cols = -(-h // cell), -(-w // cell)
+    padded = np.zeros((rows * cell, cols * cell), dtype=bool)
+    padded[:h, :w] = mask
+    changed = padded.reshape(rows, cell, cols * cell).any(axis=1).reshape(rows, cols, cell).any(axis=2)
+
+    boxes = [
+        (left + x0, top + y0, min(left + x1, width), min(top + y1, height))
+        for x0, y0, x1, y1 in _grid_regions(changed, cell)
+    ]
+    return boxes + extra
+
+
+class DedupeStore:
+    """
+    按 URL 记录最近一次截图，新截图与之比较并去重
+
+    索引目录中每个 URL 一个 <sha1>.json，先写临时文件再替换，多个进程可以共用。
+
+    新截图要写到与上一次不同的路径（如每次运行一个子目录）：写到同一路径会原地覆盖上一次的截图，
+    以及与它硬链接的文件，此时已没有旧图可比。
+    """
+
+    def __init__(self, index_dir: str, near_threshold: float = 0.05, link_identical: bool = True):
+        """
+        Args:
+            index_dir: 索引目录
+            near_threshold: 感知哈希距离占比不超过这个值视为近似重复
+            link_identical: 与上一次完全相同时，把新文件替换为指向上一次文件的硬链接
+        """
+        self.index_dir = Path(index_dir)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.near_threshold = near_threshold
+        self.link_identical = link_identical
+        self._lock = threading.Lock()
+
+    def _entry_path(self, url: str) -> Path:
+        return self.index_dir / f"{hashlib.sha1(url.encode('utf-8')).hexdigest()}.json"
+
+    def previous(self, url: str) -> Optional[dict]:
+        """该 URL 上一次截图的记录 {"path", "fingerprint"}，没有时返回 None"""
+        try:
+            return json.loads(self._entry_path(url).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_json(path: Path, data: dict):
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def _link(self, reference: Path, path: Path) -> bool:
+        """把 path 替换为指向 reference 的硬链接，失败时保留原文件"""
+        if not self.link_identical:
+            return False
+        try:
+            if os.path.samefile(reference, path):
+                return True
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.link")
+            os.link(reference, tmp_path)
+            os.replace(tmp_path, path)
+            return True
+        except OSError:
+            return False
+
+    def check(self, url: str, path: Union[str, Path]) -> DedupeResult:
+        """
+        比较新截图与该 URL 上一次的截图，写入 <截图>.hash.json 并更新索引
+
+        Args:
+            url: 页面链接
+            path: 新截图的路径
+
+        Returns:
+            DedupeResult
+        """
+        path = Path(path)
+        with Image.open(path) as image:
+            image.load()
+            current = fingerprint(image)
+
+            previous = self.previous(url)
+            reference = Path(previous["path"]) if previous else None
+            if reference is None or not reference.exists():
+                result = DedupeResult(url, str(path), "new", current)
+            else:
+                before = Fingerprint(**previous["fingerprint"])
+                result = DedupeResult(url, str(path), "changed", current, reference=str(reference))
+                if before.sha256 == current.sha256:
+                    result.status = "identical"
+                    result.distance = 0.0
+                    result.linked = self._link(reference, path)
+                else:
+                    result.distance = round(hash_distance(before.phash, current.phash), 4)
+                    if result.distance <= self.near_threshold:
+                        result.status = "near-duplicate"
+                    if os.path.samefile(reference, path):
+                        # 新截图原地覆盖了上一次的文件，只能根据索引中的哈希判断，给不出变化区域
+                        print(f"警告: {path} 覆盖了上一次的截图，无法比较变化区域（每次运行请写入不同的目录）")
+                    else:
+                        result.regions = diff_regions(reference, image)
+
+        self._write_json(path.with_name(f"{path.name}.hash.json"), result.as_dict())
+        # 完全相同时索引继续指向最早的那份文件
+        if result.status != "identical":
+            with self._lock:
+                self._write_json(self._entry_path(url), {"path": str(path.absolute()), "fingerprint": asdict(current)})
+        return result
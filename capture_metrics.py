@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+截图耗时统计模块
+记录每次截图各阶段的耗时、请求数、传输字节数和页面高度，可追加写入 JSONL 指标日志
+"""
+
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import json
+import math
+import threading
+import time
+
+
+# 截图流程中的阶段，按发生顺序排列
+STAGES = ("queue", "cache", "launch", "context", "goto", "ready", "scroll", "screenshot", "write")
+
+
+class _Stage:
+    """计时上下文，退出时把耗时累加到对应阶段"""
+
+    def __init__(self, metrics: "CaptureMetrics", name: str):
+        self.metrics = metrics
+        self.name = name
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.add(self.name, time.perf_counter() - self.started)
+
+
+@dataclass
+class CaptureMetrics:
+    """
+    单次截图的指标
+
+    用法:
+        metrics = CaptureMetrics(url)
+        with metrics.stage("goto"):
+            page.goto(url)
+        metrics.finish(output_bytes=len(data))
+    """
+    url: str
+    stages: Dict[str, float] = field(default_factory=dict)
+    total: float = 0.0
+    requests: int = 0
+    transferred_bytes: int = 0
+    asset_cache_hits: int = 0
+    asset_cache_bytes: int = 0
+    page_height: Optional[int] = None
+    output_bytes: Optional[int] = None
+    cached: bool = False
+    attempts: int = 1
+    error: Optional[str] = None
+    timestamp: float = field(default_factory=time.time)
+
+    def __post_init__(self):
+        # 不是 dataclass 字段，不会写入日志
+        self._started = time.perf_counter()
+
+    def add(self, name: str, seconds: float):
+        """累加某个阶段的耗时（同一阶段可能进入多次，如分块截图的每一屏）"""
+        self.stages[name] = round(self.stages.get(name, 0.0) + seconds, 4)
+
+    def stage(self, name: str) -> _Stage:
+        """返回计时上下文：with metrics.stage("goto"): ..."""
+        return _Stage(self, name)
+
+    def reset_attempt(self, stages: Dict[str, float]):
+        """
+        重试前丢弃上一次失败尝试的记录
+
+        阶段耗时恢复为 stages（第一次尝试开始前已记录的阶段，如查缓存），请求统计和页面高度清零，
+        最终只保留成功那一次尝试的数据。
+        """
+        self.stages = dict(stages)
+        self.requests = 0
+        self.transferred_bytes = 0
+        self.asset_cache_hits = 0
+        self.asset_cache_bytes = 0
+        self.page_height = None
+
+    def finish(self, output_bytes: Optional[int] = None, error: Optional[BaseException] = None):
+        """记录总耗时、输出大小和错误"""
+        self.total = round(time.perf_counter() - self._started, 4)
+        self.output_bytes = output_bytes
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+_log_lock = threading.Lock()
+
+
+def append_metrics(log_path: str, metrics: CaptureMetrics):
+    """把一条指标追加写入 JSONL 日志（多线程安全）"""
+    line = json.dumps(metrics.as_dict(), ensure_ascii=False) + "\n"
+    with _log_lock:
+        with open(Path(log_path), "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩法百分位数，values 为空时返回 0"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+def summarize_stages(records: Iterable[Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    """
+    汇总多次截图的阶段耗时
+
+    Args:
+        records: 每次截图的 {阶段: 秒}
+
+    Returns:
+        {阶段: {"count", "p50", "p95", "max"}}，按 STAGES 顺序排列
+    """
+    values = {}
+    for stages in records:
+        for name, seconds in stages.items():
+            values.setdefault(name, []).append(seconds)
+
+    order = {name: i for i, name in enumerate(STAGES)}
+    summary = {}
+    for name in sorted(values, key=lambda n: order.get(n, len(order))):
+        samples = values[name]
+        summary[name] = {
+            "count": len(samples),
+            "p50": percentile(samples, 50),
+            "p95": percentile(samples, 95),
+            "max": max(samples),
+        }
+    return summary
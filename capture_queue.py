@@ -0,0 +1,526 @@
+# -*- coding: utf-8 -*-
+"""
+本地截图任务队列
+任务和状态保存在本地 SQLite 文件中，多个工作进程领取任务并调用现有的截图函数，
+进程崩溃或被杀后任务不会丢失，不依赖任何外部服务
+
+任务状态：pending（等待）→ running（执行中）→ done（完成）/ failed（失败）。
+工作进程领取任务时获得一段时间的租约，执行期间定期续租；租约过期（进程已退出）的任务
+会重新回到等待状态，由其它工作进程接手。每次领取计为一次尝试，达到 max_attempts 后标记为失败。
+
+用法:
+    python capture_queue.py add urls.txt -o screenshots --full-page
+    python capture_queue.py work --workers 4 --exit-when-empty
+    python capture_queue.py status
+    python capture_queue.py retry-failed
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+
+
+DEFAULT_DB = "capture_queue.db"
+STATUSES = ("pending", "running", "done", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    output_path TEXT NOT NULL,
+    options TEXT NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    worker TEXT,
+    lease_expires REAL,
+    error TEXT,
+    result TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+"""
+
+
+@dataclass
+class Job:
+    """队列中的一个截图任务"""
+    id: int
+    url: str
+    output_path: str
+    options: dict
+    status: str
+    attempts: int
+    max_attempts: int
+    worker: Optional[str] = None
+    error: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "Job":
+        return cls(
+            id=row["id"],
+            url=row["url"],
+            output_path=row["output_path"],
+            options=json.loads(row["options"]),
+            status=row["status"],
+            attempts=row["attempts"],
+            max_attempts=row["max_attempts"],
+            worker=row["worker"],
+            error=row["error"],
+        )
+
+
+class CaptureQueue:
+    """
+    SQLite 任务队列
+
+    每个进程各自创建 CaptureQueue（SQLite 连接不能跨进程共享）。
+    领取任务在 BEGIN IMMEDIATE 事务中完成，多个进程同时领取也不会拿到同一个任务。
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB, lease_seconds: float = 120.0):
+        """
+        Args:
+            db_path: SQLite 文件路径
+            lease_seconds: 租约时长（秒），工作进程超过这么久没有续租，任务会被其它进程接手
+        """
+        self.db_path = str(db_path)
+        self.lease_seconds = lease_seconds
+        self._conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        # 续租在后台线程中进行，和领取、完成共用一个连接
+        self._lock = threading.Lock()
+        with self._lock:
+            # WAL 模式下读写互不阻塞
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _transaction(self, fn):
+        """在写事务中执行 fn(conn)，返回它的结果"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                value = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return value
+
+    def enqueue(self, url: str, output_path: str, options: Optional[dict] = None, max_attempts: int = 3) -> int:
+        """添加一个任务，返回任务编号"""
+        return self.enqueue_many([url], lambda _: output_path, options, max_attempts)[0]
+
+    def enqueue_many(
+        self,
+        urls: Iterable[str],
+        output_path_for,
+        options: Optional[dict] = None,
+        max_attempts: int = 3
+    ) -> List[int]:
+        """
+        批量添加任务（一个事务）
+
+        Args:
+            urls: 页面链接
+            output_path_for: output_path_for(url) 返回截图保存路径
+            options: 截图参数（见 run_job），所有任务相同
+            max_attempts: 每个任务最多尝试次数
+
+        Returns:
+            任务编号列表
+        """
+        payload = json.dumps(options or {}, ensure_ascii=False)
+        now = time.time()
+
+        def insert(conn):
+            ids = []
+            for url in urls:
+                cursor = conn.execute(
+                    "INSERT INTO jobs (url, output_path, options, max_attempts, created) VALUES (?, ?, ?, ?, ?)",
+                    (url, str(output_path_for(url)), payload, max_attempts, now)
+                )
+                ids.append(cursor.lastrowid)
+            return ids
+
+        return self._transaction(insert)
+
+    def _expire_leases(self, conn, now: float):
+        """租约过期的任务：还有尝试次数的回到等待，否则标记为失败"""
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', worker = NULL, lease_expires = NULL, finished = ?,"
+            " error = COALESCE(error, '租约过期（工作进程可能已退出）')"
+            " WHERE status = 'running' AND lease_expires < ? AND attempts >= max_attempts",
+            (now, now)
+        )
+        conn.execute(
+            "UPDATE jobs SET status = 'pending', worker = NULL, lease_expires = NULL"
+            " WHERE status = 'running' AND lease_expires < ?",
+            (now,)
+        )
+
+    def claim(self, worker: str) -> Optional[Job]:
+        """领取最早的等待任务并获得租约，没有任务时返回 None"""
+        def claim_one(conn):
+            now = time.time()
+            self._expire_leases(conn, now)
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'pending' ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, lease_expires = ?, started = ?,"
+                " attempts = attempts + 1 WHERE id = ?",
+                (worker, now + self.lease_seconds, now, row["id"])
+            )
+            return Job.from_row(conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+
+        return self._transaction(claim_one)
+
+    def renew(self, job_id: int, worker: str) -> bool:
+        """续租，任务已不属于该工作进程时返回 False"""
+        def update(conn):
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + self.lease_seconds, job_id, worker)
+            )
+            return cursor.rowcount == 1
+
+        return self._transaction(update)
+
+    def complete(self, job_id: int, worker: str, result: Optional[dict] = None) -> bool:
+        """标记任务完成；租约已被其它进程接手时不修改，返回 False"""
+        def update(conn):
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'done', worker = NULL, lease_expires = NULL, finished = ?,"
+                " error = NULL, result = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time(), json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 job_id, worker)
+            )
+            return cursor.rowcount == 1
+
+        return self._transaction(update)
+
+    def fail(self, job_id: int, worker: str, error: str) -> Optional[str]:
+        """
+        记录一次失败：还有尝试次数时回到等待，否则标记为失败
+
+        Returns:
+            任务的新状态，租约已被其它进程接手时返回 None
+        """
+        def update(conn):
+            cursor = conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,"
+                " finished = CASE WHEN attempts >= max_attempts THEN ? ELSE NULL END,"
+                " worker = NULL, lease_expires = NULL, error = ?"
+                " WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time(), error, job_id, worker)
+            )
+            if cursor.rowcount != 1:
+                return None
+            return conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()["status"]
+
+        return self._transaction(update)
+
+    def retry_failed(self) -> int:
+        """把失败的任务重新放回等待（尝试次数清零），返回数量"""
+        def update(conn):
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'pending', attempts = 0, error = NULL, finished = NULL"
+                " WHERE status = 'failed'"
+            )
+            return cursor.rowcount
+
+        return self._transaction(update)
+
+    def counts(self) -> Dict[str, int]:
+        """各状态的任务数"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in STATUSES}
+        counts.update({row["status"]: row["n"] for row in rows})
+        return counts
+
+    def status(self, window: float = 300.0) -> dict:
+        """
+        队列状态
+
+        Args:
+            window: 统计吞吐的时间窗口（秒）
+
+        Returns:
+            各状态数量、最早等待任务的等待时间、最近 window 秒的完成数和吞吐（个/分钟）、
+            平均单个任务耗时、执行中任务的工作进程
+        """
+        now = time.time()
+        with self._lock:
+            oldest = self._conn.execute(
+                "SELECT MIN(created) AS t FROM jobs WHERE status = 'pending'"
+            ).fetchone()["t"]
+            recent = self._conn.execute(
+                "SELECT COUNT(*) AS n, AVG(finished - started) AS avg FROM jobs"
+                " WHERE status = 'done' AND finished >= ?",
+                (now - window,)
+            ).fetchone()
+            failed_recent = self._conn.execute(
+                "SELECT COUNT(*) AS n FROM jobs WHERE status = 'failed' AND finished >= ?",
+                (now - window,)
+            ).fetchone()["n"]
+            workers = [row["worker"] for row in self._conn.execute(
+                "SELECT DISTINCT worker FROM jobs WHERE status = 'running' AND lease_expires >= ?", (now,)
+            )]
+        return {
+            "counts": self.counts(),
+            "oldest_pending_seconds": round(now - oldest, 1) if oldest is not None else None,
+            "window_seconds": window,
+            "done_in_window": recent["n"],
+            "failed_in_window": failed_recent,
+            "throughput_per_minute": round(recent["n"] / window * 60, 2),
+            "avg_job_seconds": round(recent["avg"], 3) if recent["avg"] is not None else None,
+            "active_workers": workers,
+        }
+
+
+def run_job(job: Job, pool, profile: Optional[str] = None) -> dict:
+    """
+    用现有的截图函数执行一个任务
+
+    job.options 支持：full_page、width、height、wait_time、image_format、quality、selector、profile。
+    任务里的 profile 优先，没有时使用工作进程的 profile。失败时抛出异常；重试由队列负责，这里只截一次。
+
+    Returns:
+        写入任务 result 字段的结果（文件路径和 CaptureMetrics）
+    """
+    from browser_screenshot import take_jd_screenshot, take_screenshot_with_scroll
+
+    options = dict(job.options)
+    full_page = options.pop("full_page", False)
+    profile = options.pop("profile", None) or profile
+    Path(job.output_path).parent.mkdir(parents=True, exist_ok=True)
+    capture = take_screenshot_with_scroll if full_page else take_jd_screenshot
+    if full_page:
+        options.pop("height", None)
+    path, metrics = capture(job.url, job.output_path, pool=pool, profile=profile, with_metrics=True, **options)
+    return {"output_path": path, "metrics": metrics.as_dict()}
+
+
+class _LeaseKeeper:
+    """执行任务期间在后台线程中定期续租"""
+
+    def __init__(self, queue: CaptureQueue, job: Job, worker: str):
+        self.queue = queue
+        self.job = job
+        self.worker = worker
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lease-keeper", daemon=True)
+
+    def _run(self):
+        interval = self.queue.lease_seconds / 3
+        while not self._stop.wait(interval):
+            try:
+                if not self.queue.renew(self.job.id, self.worker):
+                    self.lost = True
+                    return
+            except sqlite3.Error as e:
+                print(f"[{self.worker}] 续租失败: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+
+
+def worker_main(
+    db_path: str,
+    worker: str,
+    lease_seconds: float = 120.0,
+    poll_interval: float = 2.0,
+    exit_when_empty: bool = False,
+    profile: Optional[str] = None
+) -> int:
+    """
+    工作进程主循环：领取任务、截图、记录结果
+
+    每个工作进程使用自己的浏览器池，任务之间复用同一个浏览器。
+
+    Returns:
+        处理的任务数
+    """
+    from browser_screenshot import BrowserPool
+
+    queue = CaptureQueue(db_path, lease_seconds)
+    handled = 0
+    pool = BrowserPool.for_profile(profile) if profile else BrowserPool()
+    try:
+        while True:
+            job = queue.claim(worker)
+            if job is None:
+                if exit_when_empty and queue.counts()["running"] == 0:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            print(f"[{worker}] 任务 {job.id}（第 {job.attempts} 次尝试）: {job.url}")
+            handled += 1
+            with _LeaseKeeper(queue, job, worker) as keeper:
+                try:
+                    result = run_job(job, pool, profile)
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                    status = queue.fail(job.id, worker, error)
+                    print(f"[{worker}] 任务 {job.id} 失败（{status or '租约已失效'}）: {error}")
+                    continue
+            if keeper.lost or not queue.complete(job.id, worker, result):
+                print(f"[{worker}] 任务 {job.id} 的租约已被其它进程接手，结果未记录")
+            else:
+                print(f"[{worker}] 任务 {job.id} 完成: {result['output_path']}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.close()
+        queue.close()
+    return handled
+
+
+def run_workers(
+    db_path: str,
+    workers: int,
+    lease_seconds: float = 120.0,
+    poll_interval: float = 2.0,
+    exit_when_empty: bool = False,
+    profile: Optional[str] = None
+):
+    """启动 workers 个工作进程并等待它们退出（Ctrl+C 结束所有进程）"""
+    prefix = f"{socket.gethostname()}-{os.getpid()}"
+    processes = [
+        multiprocessing.Process(
+            target=worker_main,
+            args=(db_path, f"{prefix}-{i}", lease_seconds, poll_interval, exit_when_empty, profile),
+            name=f"capture-worker-{i}"
+        )
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        print("正在停止工作进程...")
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+
+def print_status(status: dict):
+    counts = status["counts"]
+    print(f"等待 {counts['pending']}  执行中 {counts['running']}  完成 {counts['done']}  失败 {counts['failed']}")
+    if status["oldest_pending_seconds"] is not None:
+        print(f"最早的等待任务已等待 {status['oldest_pending_seconds']:.0f} 秒")
+    window = status["window_seconds"] / 60
+    average = f"，平均每个 {status['avg_job_seconds']:.1f} 秒" if status["avg_job_seconds"] is not None else ""
+    print(f"最近 {window:.0f} 分钟完成 {status['done_in_window']} 个、失败 {status['failed_in_window']} 个，"
+          f"吞吐 {status['throughput_per_minute']:.1f} 个/分钟{average}")
+    if status["active_workers"]:
+        print(f"工作进程: {', '.join(status['active_workers'])}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="本地截图任务队列（SQLite）")
+    parser.add_argument("--db", default=DEFAULT_DB, help="队列数据库路径")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="添加任务")
+    add.add_argument("input", help="URL 列表文件，每行一个；- 表示从标准输入读取")
+    add.add_argument("-o", "--output-dir", default="screenshots", help="截图保存目录")
+    add.add_argument("--full-page", action="store_true", help="截取整页")
+    add.add_argument("--width", type=int, help="浏览器宽度，默认由配置档决定")
+    add.add_argument("--height", type=int, help="浏览器高度，默认由配置档决定")
+    add.add_argument("--wait-time", type=float, help="页面加载后最长等待时间（秒）")
+    add.add_argument("--format", default="png", choices=["png", "jpeg"], help="截图格式")
+    add.add_argument("--quality", type=int, help="JPEG 质量 (0-100)")
+    add.add_argument("--selector", help="只截取该 CSS 选择器对应的元素")
+    add.add_argument("--max-attempts", type=int, default=3, help="每个任务最多尝试次数")
+
+    work = commands.add_parser("work", help="启动工作进程")
+    work.add_argument("--workers", type=int, default=2, help="工作进程数量")
+    work.add_argument("--lease", type=float, default=120, help="租约时长（秒）")
+    work.add_argument("--poll-interval", type=float, default=2, help="没有任务时的轮询间隔（秒）")
+    work.add_argument("--exit-when-empty", action="store_true", help="队列清空后退出")
+    work.add_argument("--profile", help="配置档（如 low-memory）")
+
+    status = commands.add_parser("status", help="查看队列深度和吞吐")
+    status.add_argument("--window", type=float, default=300, help="统计吞吐的时间窗口（秒）")
+    status.add_argument("--json", action="store_true", help="以 JSON 输出")
+
+    commands.add_parser("retry-failed", help="把失败的任务重新放回队列")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+
+    if args.command == "work":
+        run_workers(args.db, args.workers, args.lease, args.poll_interval, args.exit_when_empty, args.profile)
+        return 0
+
+    with CaptureQueue(args.db) as queue:
+        if args.command == "add":
+            from batch_capture import read_urls
+            from async_capture import output_name_for_url
+            from browser_screenshot import format_suffix
+
+            if args.input == "-":
+                urls = read_urls(sys.stdin)
+            else:
+                with open(args.input, "r", encoding="utf-8") as f:
+                    urls = read_urls(f)
+            options = {"full_page": args.full_page, "image_format": args.format}
+            for name in ("width", "height", "wait_time", "quality", "selector"):
+                if getattr(args, name) is not None:
+                    options[name] = getattr(args, name)
+            suffix = format_suffix(args.format)
+            ids = queue.enqueue_many(
+                urls, lambda url: Path(args.output_dir) / output_name_for_url(url, suffix),
+                options, args.max_attempts
+            )
+            print(f"已添加 {len(ids)} 个任务")
+        elif args.command == "status":
+            status = queue.status(args.window)
+            if args.json:
+                print(json.dumps(status, ensure_ascii=False, indent=2))
+            else:
+                print_status(status)
+        elif args.command == "retry-failed":
+            print(f"已重新排队 {queue.retry_failed()} 个任务")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
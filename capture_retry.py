@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+截图超时与重试模块
+分阶段超时、有上限的退避重试，以及按主机统计连续失败、暂停访问总是失败的主机
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+import asyncio
+import random
+import threading
+import time
+
+
+@dataclass
+class StageTimeouts:
+    """
+    各阶段超时（秒）
+
+    页面就绪的等待时间由各截图函数的 wait_time 参数控制，超时后照常截图。
+    """
+    goto: float = 30.0
+    screenshot: float = 30.0
+
+
+class HostUnavailable(RuntimeError):
+    """主机连续失败次数过多，暂停访问中"""
+
+
+@dataclass
+class RetryPolicy:
+    """
+    重试策略
+
+    第 n 次重试前等待 backoff * 2^(n-1) 秒（不超过 max_backoff），再加上最多 jitter 比例的随机抖动。
+    设置 hedge_after 时，第一次尝试超过这么多秒还没完成就并行发起第二次，取先成功的结果
+    （只有异步引擎支持）。
+    """
+    attempts: int = 3
+    backoff: float = 1.0
+    max_backoff: float = 10.0
+    jitter: float = 0.2
+    hedge_after: Optional[float] = None
+
+    def delay(self, retry: int) -> float:
+        """第 retry 次重试（从 1 开始）前的等待时间"""
+        base = min(self.max_backoff, self.backoff * (2 ** (retry - 1)))
+        return base * (1 + random.uniform(0, self.jitter))
+
+    def should_retry(self, error: BaseException) -> bool:
+        """参数错误和主机暂停访问不重试"""
+        return not isinstance(error, (ValueError, HostUnavailable))
+
+
+def host_of(url: str) -> str:
+    return (urlsplit(url).hostname or "").lower()
+
+
+class HostHealth:
+    """
+    按主机统计连续失败次数
+
+    某个主机连续失败 max_failures 次后，cooldown 秒内的截图直接失败（HostUnavailable），
+    冷却结束后放行一次试探，成功则恢复，失败则再次进入冷却。多线程 / 协程共用安全。
+    """
+
+    def __init__(self, max_failures: int = 5, cooldown: float = 60.0):
+        """
+        Args:
+            max_failures: 连续失败多少次后暂停访问
+            cooldown: 暂停访问的时间（秒）
+        """
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self._failures: Dict[str, int] = {}
+        self._total_failures: Dict[str, int] = {}
+        self._paused_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def check(self, url: str):
+        """主机暂停访问中时抛出 HostUnavailable"""
+        host = host_of(url)
+        with self._lock:
+            until = self._paused_until.get(host, 0.0)
+            if time.monotonic() < until:
+                raise HostUnavailable(f"{host} 连续失败 {self._failures[host]} 次，"
+                                      f"{until - time.monotonic():.0f} 秒内不再访问")
+
+    def record_success(self, url: str):
+        host = host_of(url)
+        with self._lock:
+            self._failures.pop(host, None)
+            self._paused_until.pop(host, None)
+
+    def record_failure(self, url: str):
+        host = host_of(url)
+        with self._lock:
+            self._failures[host] = self._failures.get(host, 0) + 1
+            self._total_failures[host] = self._total_failures.get(host, 0) + 1
+            if self._failures[host] >= self.max_failures:
+                self._paused_until[host] = time.monotonic() + self.cooldown
+
+    def snapshot(self) -> Dict[str, dict]:
+        """各主机的失败统计：{主机: {"consecutive", "total", "paused"}}"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                host: {
+                    "consecutive": self._failures.get(host, 0),
+                    "total": total,
+                    "paused": self._paused_until.get(host, 0.0) > now,
+                }
+                for host, total in self._total_failures.items()
+            }
+
+
+def call_with_retry(
+    fn,
+    url: str,
+    retry: Optional[RetryPolicy] = None,
+    host_health: Optional[HostHealth] = None,
+    on_retry=None
+):
+    """
+    同步执行 fn()，失败时按 retry 重试
+
+    Args:
+        fn: 无参数的截图函数
+        url: 页面链接，用于按主机统计失败
+        retry: 重试策略，None 表示只执行一次
+        host_health: 主机失败统计，None 表示不统计
+        on_retry: 每次重试前调用 on_retry(第几次重试, 异常)
+
+    Returns:
+        fn 的返回值；最后一次失败的异常原样抛出
+    """
+    attempts = retry.attempts if retry is not None else 1
+    for attempt in range(1, attempts + 1):
+        if host_health is not None:
+            host_health.check(url)
+        try:
+            value = fn()
+        except Exception as e:
+            if host_health is not None and not isinstance(e, ValueError):
+                host_health.record_failure(url)
+            if attempt >= attempts or not retry.should_retry(e):
+                raise
+            if on_retry is not None:
+                on_retry(attempt, e)
+            time.sleep(retry.delay(attempt))
+            continue
+        if host_health is not None:
+            host_health.record_success(url)
+        return value
+
+
+async def _hedged(fn, hedge_after: float):
+    """执行 fn()，超过 hedge_after 秒未完成时并行再执行一次，返回先成功的结果"""
+    first = asyncio.ensure_future(fn())
+    done, _ = await asyncio.wait({first}, timeout=hedge_after)
+    if done:
+        return first.result()
+
+    pending = {first, asyncio.ensure_future(fn())}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def call_with_retry_async(
+    fn,
+    url: str,
+    retry: Optional[RetryPolicy] = None,
+    host_health: Optional[HostHealth] = None,
+    on_retry=None
+):
+    """
+    异步版 call_with_retry，fn 是返回协程的无参数函数
+
+    retry.hedge_after 设置时，每次尝试都可能并行发起一次对冲请求。
+    """
+    attempts = retry.attempts if retry is not None else 1
+    for attempt in range(1, attempts + 1):
+        if host_health is not None:
+            host_health.check(url)
+        try:
+            if retry is not None and retry.hedge_after is not None:
+                value = await _hedged(fn, retry.hedge_after)
+            else:
+                value = await fn()
+        except Exception as e:
+            if host_health is not None and not isinstance(e, ValueError):
+                host_health.record_failure(url)
+            if attempt >= attempts or not retry.should_retry(e):
+                raise
+            if on_retry is not None:
+                on_retry(attempt, e)
+            await asyncio.sleep(retry.delay(attempt))
+            continue
+        if host_health is not None:
+            host_health.record_success(url)
+        return value
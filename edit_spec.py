@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+编辑规格模块
+把一组区域修改和水印设置保存为带版本号的 JSON，界面中做好的修改可以导出，
+再用 render_edits.py 套用到整个文件夹的截图上
+
+格式（version 1）:
+    {
+      "version": 1,
+      "edits": [
+        {"x": 800, "y": 340, "width": 250, "height": 50, "text": "¥999.00",
+         "bg_color": "white", "text_color": "red", "font_size": 24}
+      ],
+      "watermark": {"text": "仅供内部培训使用", "position": "top-left", "opacity": 128}
+    }
+
+edits 中除坐标、尺寸和 text 外都可以省略（使用默认值）；watermark 为 null 或省略表示不加水印。
+"""
+
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+import json
+
+from PIL import Image
+
+from image_editor import RegionEdit, add_watermark, edit_regions
+
+
+SPEC_VERSION = 1
+WATERMARK_POSITIONS = ("top-left", "top-right", "bottom-left", "bottom-right", "center")
+
+_REQUIRED_EDIT_KEYS = ("x", "y", "width", "height", "text")
+
+
+@dataclass
+class WatermarkSettings:
+    """水印设置，参数含义同 add_watermark"""
+    text: str = "仅供内部培训使用"
+    position: str = "top-left"
+    opacity: int = 128
+
+
+@dataclass
+class EditSpec:
+    """一组区域修改（按顺序执行）和可选的水印"""
+    edits: List[RegionEdit] = field(default_factory=list)
+    watermark: Optional[WatermarkSettings] = None
+    version: int = SPEC_VERSION
+
+    def apply(self, image: Image.Image) -> Tuple[Image.Image, List[float]]:
+        """
+        把规格套用到一张图片上
+
+        Returns:
+            (修改后的 Image 对象, 每处修改的耗时（秒）)
+        """
+        result, timings = edit_regions(image, self.edits)
+        if self.watermark is not None:
+            wm = self.watermark
+            result = add_watermark(result, wm.text, wm.position, wm.opacity)
+        return result, timings
+
+    def as_dict(self) -> dict:
+        return {
+            "version": self.version,
+            "edits": [edit.as_dict() for edit in self.edits],
+            "watermark": asdict(self.watermark) if self.watermark is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "EditSpec":
+        """
+        从字典创建并校验
+
+        Raises:
+            ValueError: 版本不支持或字段缺失、类型不对
+        """
+        if not isinstance(data, dict):
+            raise ValueError("编辑规格必须是 JSON 对象")
+        version = data.get("version")
+        if isinstance(version, bool) or not isinstance(version, int) or version < 1:
+            raise ValueError(f"编辑规格缺少有效的 version: {version!r}")
+        if version > SPEC_VERSION:
+            raise ValueError(f"不支持的编辑规格版本 {version}（当前支持到 {SPEC_VERSION}）")
+
+        edits = []
+        for i, item in enumerate(data.get("edits") or []):
+            if not isinstance(item, dict):
+                raise ValueError(f"edits[{i}] 必须是对象")
+            missing = [key for key in _REQUIRED_EDIT_KEYS if key not in item]
+            if missing:
+                raise ValueError(f"edits[{i}] 缺少字段: {', '.join(missing)}")
+            edit = RegionEdit.from_dict(item)
+            for name in ("x", "y", "width", "height", "font_size"):
+                value = getattr(edit, name)
+                if isinstance(value, bool) or not isinstance(value, int):
+                    raise ValueError(f"edits[{i}].{name} 必须是整数: {value!r}")
+            if edit.width <= 0 or edit.height <= 0 or edit.font_size <= 0:
+                raise ValueError(f"edits[{i}] 的宽度、高度和字体大小必须大于 0")
+            for name in ("text", "bg_color", "text_color"):
+                if not isinstance(getattr(edit, name), str):
+                    raise ValueError(f"edits[{i}].{name} 必须是字符串")
+            edits.append(edit)
+
+        watermark = None
+        if data.get("watermark") is not None:
+            item = data["watermark"]
+            if not isinstance(item, dict):
+                raise ValueError("watermark 必须是对象或 null")
+            names = WatermarkSettings.__dataclass_fields__.keys()
+            watermark = WatermarkSettings(**{name: item[name] for name in names if name in item})
+            if watermark.position not in WATERMARK_POSITIONS:
+                raise ValueError(f"不支持的水印位置: {watermark.position}")
+            if isinstance(watermark.opacity, bool) or not isinstance(watermark.opacity, int) \
+                    or not 0 <= watermark.opacity <= 255:
+                raise ValueError(f"水印透明度必须是 0-255 的整数: {watermark.opacity!r}")
+
+        return cls(edits=edits, watermark=watermark, version=version)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "EditSpec":
+        """读取编辑规格 JSON 文件"""
+        text = Path(path).read_text(encoding="utf-8")
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            raise ValueError(f"编辑规格不是有效的 JSON: {e}")
+        return cls.from_dict(data)
+
+    def save(self, path: Union[str, Path]):
+        """保存为 JSON 文件（保存时使用当前版本号）"""
+        data = self.as_dict()
+        data["version"] = SPEC_VERSION
+        Path(path).write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+本地测试站点模块
+在本机启动一个 HTTP 服务，提供结构类似商品详情页的合成页面，截图基准测试不需要联网
+
+页面按 FIXTURE_PAGES 生成，覆盖不同的页面长度、图片数量、懒加载区块和慢速资源：
+    /page/<名称>                     合成页面
+    /img/<宽>x<高>/<编号>.png         生成的图片，?delay=<毫秒> 延迟响应
+    /fragment/<名称>/<编号>           懒加载区块的 HTML 片段
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+import io
+import threading
+import time
+
+from PIL import Image
+
+
+@dataclass
+class FixturePage:
+    """合成页面的参数"""
+    sections: int = 4            # 商品介绍区块数量，决定页面长度
+    images_per_section: int = 3
+    lazy: bool = False           # 图片使用 loading="lazy"，底部推荐区块滚动到时才请求
+    slow_ms: int = 0             # 部分图片和脚本延迟这么多毫秒才响应
+    image_size: tuple = (400, 300)
+
+
+FIXTURE_PAGES: Dict[str, FixturePage] = {
+    "small": FixturePage(sections=1, images_per_section=4),
+    "medium": FixturePage(sections=8, images_per_section=3),
+    "long": FixturePage(sections=40, images_per_section=3, lazy=True),
+    "lazy": FixturePage(sections=12, images_per_section=4, lazy=True),
+    "slow": FixturePage(sections=4, images_per_section=3, slow_ms=1500),
+}
+
+
+@lru_cache(maxsize=256)
+def render_image(width: int, height: int, seed: int) -> bytes:
+    """生成一张纯色加色块的 PNG（同样的参数返回同样的数据）"""
+    color = ((seed * 67) % 256, (seed * 131) % 256, (seed * 199) % 256)
+    image = Image.new("RGB", (width, height), color)
+    block = Image.new("RGB", (width // 2, height // 2), (255 - color[0], 255 - color[1], 255 - color[2]))
+    image.paste(block, (width // 4, height // 4))
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def _image_tag(page: FixturePage, seed: int, slow: bool) -> str:
+    width, height = page.image_size
+    src = f"/img/{width}x{height}/{seed}.png"
+    if slow:
+        src += f"?delay={page.slow_ms}"
+    lazy = ' loading="lazy"' if page.lazy else ""
+    return f'<img src="{src}" width="{width}" height="{height}"{lazy}>'
+
+
+def render_page(name: str, page: FixturePage) -> str:
+    """生成合成页面的 HTML"""
+    parts = [
+        "<!DOCTYPE html><html><head><meta charset='utf-8'>",
+        f"<title>fixture {name}</title>",
+        "<style>",
+        "body{margin:0;font-family:sans-serif}",
+        "header{position:sticky;top:0;height:60px;background:#e1251b;color:#fff}",
+        ".intro{display:flex;gap:24px;padding:24px}",
+        ".price{font-size:32px;color:#e1251b}",
+        ".section{padding:24px;border-top:1px solid #eee}",
+        ".section img{margin:4px}",
+        ".fragment{min-height:320px;padding:24px}",
+        "</style></head><body>",
+        "<header>fixture shop</header>",
+        "<div class='intro' id='product-intro'>",
+        _image_tag(page, 0, False),
+        "<div><h1>合成商品</h1><div class='price' id='price'>¥1999.00</div></div>",
+        "</div>",
+    ]
+
+    seed = 1
+    for index in range(page.sections):
+        parts.append(f"<div class='section'><h2>详情 {index + 1}</h2><p>{'商品介绍文字。' * 40}</p>")
+        for _ in range(page.images_per_section):
+            # 慢速页面中每个区块的第一张图延迟响应
+            slow = page.slow_ms > 0 and seed % page.images_per_section == 1
+            parts.append(_image_tag(page, seed, slow))
+            seed += 1
+        parts.append("</div>")
+
+    if page.lazy:
+        # 推荐区块：进入视口后才请求内容，模拟滚动加载
+        for index in range(3):
+            parts.append(f"<div class='fragment' data-src='/fragment/{name}/{index}'></div>")
+        parts.append("""<script>
+const observer = new IntersectionObserver(entries => {
+    for (const entry of entries) {
+        if (!entry.isIntersecting) continue;
+        observer.unobserve(entry.target);
+        fetch(entry.target.dataset.src).then(r => r.text()).then(html => { entry.target.innerHTML = html; });
+    }
+});
+document.querySelectorAll('.fragment').forEach(el => observer.observe(el));
+</script>""")
+
+    if page.slow_ms:
+        parts.append(f"<script src='/script.js?delay={page.slow_ms}'></script>")
+
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+def render_fragment(name: str, index: int) -> str:
+    """懒加载区块的内容"""
+    page = FIXTURE_PAGES[name]
+    images = "".join(_image_tag(page, 1000 + index * 10 + i, False) for i in range(4))
+    return f"<h2>推荐 {index + 1}</h2>{images}"
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    server_version = "FixtureSite/1.0"
+
+    def log_message(self, format, *args):
+        # 基准测试时不输出访问日志
+        pass
+
+    def _send(self, status: int, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "public, max-age=3600")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.count_request()
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        delay = int(query.get("delay", ["0"])[0])
+        if delay:
+            time.sleep(delay / 1000)
+
+        segments = [s for s in parts.path.split("/") if s]
+        try:
+            if len(segments) == 2 and segments[0] == "page" and segments[1] in FIXTURE_PAGES:
+                html = render_page(segments[1], FIXTURE_PAGES[segments[1]])
+                return self._send(200, "text/html; charset=utf-8", html.encode("utf-8"))
+            if len(segments) == 3 and segments[0] == "img":
+                width, height = (int(v) for v in segments[1].split("x"))
+                seed = int(segments[2].split(".")[0])
+                return self._send(200, "image/png", render_image(width, height, seed))
+            if len(segments) == 3 and segments[0] == "fragment" and segments[1] in FIXTURE_PAGES:
+                html = render_fragment(segments[1], int(segments[2]))
+                return self._send(200, "text/html; charset=utf-8", html.encode("utf-8"))
+            if segments == ["script.js"]:
+                return self._send(200, "application/javascript", b"document.body.dataset.loaded = '1';")
+        except ValueError:
+            pass
+        self._send(404, "text/plain", b"not found")
+
+
+class _FixtureHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address):
+        super().__init__(address, _FixtureHandler)
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+
+    def count_request(self):
+        with self._count_lock:
+            self.request_count += 1
+
+
+class FixtureServer:
+    """
+    本地测试站点，在后台线程中运行
+
+    用法:
+        with FixtureServer() as site:
+            take_jd_screenshot(site.url("medium"), ...)
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        """
+        Args:
+            host: 监听地址
+            port: 监听端口，0 表示自动选择空闲端口
+        """
+        self._server = _FixtureHTTPServer((host, port))
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def request_count(self) -> int:
+        """服务启动以来收到的请求数"""
+        return self._server.request_count
+
+    def url(self, name: str) -> str:
+        """合成页面的地址"""
+        if name not in FIXTURE_PAGES:
+            raise ValueError(f"没有名为 {name} 的测试页面，可选: {', '.join(FIXTURE_PAGES)}")
+        return f"{self.base_url}/page/{name}"
+
+    def urls(self, names: Optional[List[str]] = None) -> List[str]:
+        return [self.url(name) for name in (names or FIXTURE_PAGES)]
+
+    def start(self) -> "FixtureServer":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._server.serve_forever, name="fixture-site", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+if __name__ == "__main__":
+    # 单独运行时一直提供服务，便于在浏览器中查看测试页面
+    with FixtureServer(port=8765) as site:
+        for page_url in site.urls():
+            print(page_url)
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
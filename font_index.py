@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+"""
+字体索引模块
+扫描系统字体目录，读取每个字体（.ttc 中的每个字体）的字符映射表（cmap），
+记录它覆盖的 Unicode 范围，结果保存为 JSON，之后启动时直接读取
+
+绘制文字时按索引为每个字符选择字体：优先使用首选字体，首选字体没有的字符
+（生僻字、符号等）依次用覆盖了它的其它字体，不需要在运行时逐个尝试字体文件。
+字体目录的修改时间变化（安装或删除了字体）时自动重建索引。
+"""
+
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import json
+import os
+import platform
+import struct
+import threading
+
+
+INDEX_VERSION = 1
+FONT_EXTENSIONS = (".ttf", ".otf", ".ttc", ".otc")
+
+# 统计中文覆盖率时使用的范围：CJK 统一汉字基本区
+CJK_RANGE = (0x4E00, 0x9FFF)
+
+
+def default_font_dirs() -> List[str]:
+    """当前系统的字体目录"""
+    home = Path.home()
+    system = platform.system()
+    if system == "Darwin":
+        dirs = ["/System/Library/Fonts", "/Library/Fonts", str(home / "Library" / "Fonts")]
+    elif system == "Windows":
+        windir = os.environ.get("WINDIR", "C:/Windows")
+        dirs = [os.path.join(windir, "Fonts")]
+        local = os.environ.get("LOCALAPPDATA")
+        if local:
+            dirs.append(os.path.join(local, "Microsoft", "Windows", "Fonts"))
+    else:
+        dirs = ["/usr/share/fonts", "/usr/local/share/fonts",
+                str(home / ".local" / "share" / "fonts"), str(home / ".fonts")]
+    return dirs
+
+
+def default_index_path() -> Path:
+    return Path.home() / ".cache" / "jd_screenshot" / "font_index.json"
+
+
+def _merge_ranges(ranges: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """合并重叠或相邻的范围"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _cmap_format4(data: bytes, offset: int) -> List[Tuple[int, int]]:
+    seg_count = struct.unpack_from(">H", data, offset + 6)[0] // 2
+    ends_at = offset + 14
+    starts_at = ends_at + seg_count * 2 + 2
+    deltas_at = starts_at + seg_count * 2
+    range_offsets_at = deltas_at + seg_count * 2
+
+    ends = struct.unpack_from(f">{seg_count}H", data, ends_at)
+    starts = struct.unpack_from(f">{seg_count}H", data, starts_at)
+    deltas = struct.unpack_from(f">{seg_count}h", data, deltas_at)
+    range_offsets = struct.unpack_from(f">{seg_count}H", data, range_offsets_at)
+
+    ranges = []
+    for i in range(seg_count):
+        start, end = starts[i], ends[i]
+        if start == 0xFFFF:
+            continue
+        if range_offsets[i] == 0:
+            ranges.append((start, end))
+            continue
+        # 通过 glyphIdArray 映射的区段逐个检查，映射到 0 号字形（.notdef）的字符不算覆盖
+        base = range_offsets_at + i * 2 + range_offsets[i]
+        for code in range(start, end + 1):
+            position = base + (code - start) * 2
+            if position + 2 > len(data):
+                break
+            if struct.unpack_from(">H", data, position)[0] != 0:
+                ranges.append((code, code))
+    return ranges
+
+
+def _cmap_format12(data: bytes, offset: int) -> List[Tuple[int, int]]:
+    groups = struct.unpack_from(">I", data, offset + 12)[0]
+    return [
+        struct.unpack_from(">II", data, offset + 16 + i * 12)
+        for i in range(groups)
+    ]
+
+
+def parse_cmap(data: bytes) -> List[Tuple[int, int]]:
+    """从 cmap 表中读取字体覆盖的 Unicode 范围"""
+    count = struct.unpack_from(">H", data, 2)[0]
+    subtables = {}
+    for i in range(count):
+        platform_id, encoding_id, offset = struct.unpack_from(">HHI", data, 4 + i * 8)
+        subtables[(platform_id, encoding_id)] = offset
+
+    # 优先完整 Unicode（格式 12），其次基本多文种平面（格式 4）
+    for key in ((3, 10), (0, 6), (0, 4), (3, 1), (0, 3), (0, 2), (0, 1), (0, 0)):
+        offset = subtables.get(key)
+        if offset is None:
+            continue
+        fmt = struct.unpack_from(">H", data, offset)[0]
+        if fmt == 12:
+            return _merge_ranges(_cmap_format12(data, offset))
+        if fmt == 4:
+            return _merge_ranges(_cmap_format4(data, offset))
+    return []
+
+
+def _read_tables(f, offset: int) -> Dict[str, Tuple[int, int]]:
+    """读取一个字体的表目录 {标签: (偏移, 长度)}"""
+    f.seek(offset)
+    num_tables = struct.unpack(">4sH", f.read(6))[1]
+    f.seek(offset + 12)
+    directory = f.read(num_tables * 16)
+    tables = {}
+    for i in range(num_tables):
+        tag, _, table_offset, length = struct.unpack_from(">4sIII", directory, i * 16)
+        tables[tag.decode("latin-1")] = (table_offset, length)
+    return tables
+
+
+def read_font_faces(path: str) -> List[dict]:
+    """
+    读取字体文件中每个字体的覆盖范围
+
+    只有位图（如彩色表情字体）没有轮廓的字体无法按任意字号绘制，跳过。
+
+    Returns:
+        [{"index": 字体索引, "ranges": [[起, 止], ...]}]
+    """
+    faces = []
+    with open(path, "rb") as f:
+        header = f.read(12)
+        if header[:4] == b"ttcf":
+            count = struct.unpack_from(">I", header, 8)[0]
+            offsets = struct.unpack(f">{count}I", f.read(count * 4))
+        else:
+            offsets = (0,)
+
+        for index, offset in enumerate(offsets):
+            tables = _read_tables(f, offset)
+            if not ({"glyf", "CFF ", "CFF2"} & tables.keys()) or "cmap" not in tables:
+                continue
+            cmap_offset, cmap_length = tables["cmap"]
+            f.seek(cmap_offset)
+            ranges = parse_cmap(f.read(cmap_length))
+            if ranges:
+                faces.append({"index": index, "ranges": [list(r) for r in ranges]})
+    return faces
+
+
+@dataclass
+class FontEntry:
+    """索引中的一个字体"""
+    path: str
+    index: int
+    ranges: List[Tuple[int, int]] = field(repr=False)
+    codepoints: int = 0
+    cjk: int = 0
+
+    def __post_init__(self):
+        self.ranges = [tuple(r) for r in self.ranges]
+        # 不是 dataclass 字段，不会写入索引文件
+        self._starts = [start for start, _ in self.ranges]
+        if not self.codepoints:
+            self.codepoints = sum(end - start + 1 for start, end in self.ranges)
+            low, high = CJK_RANGE
+            self.cjk = sum(max(0, min(end, high) - max(start, low) + 1) for start, end in self.ranges)
+
+    def covers(self, codepoint: int) -> bool:
+        i = bisect_right(self._starts, codepoint) - 1
+        return i >= 0 and codepoint <= self.ranges[i][1]
+
+    def as_dict(self) -> dict:
+        return {"path": self.path, "index": self.index, "ranges": [list(r) for r in self.ranges],
+                "codepoints": self.codepoints, "cjk": self.cjk}
+
+
+class FontIndex:
+    """
+    字体索引
+
+    字体按优先级排列：preferred 中列出的字体在前（按列出的顺序），其余按中文覆盖数从多到少，
+    再把覆盖拉丁字母的字体排在纯符号字体之前，最后按总覆盖数。为字符选择字体时取第一个覆盖它的字体。
+    """
+
+    def __init__(
+        self,
+        fonts: Sequence[FontEntry],
+        dirs: Optional[Dict[str, float]] = None,
+        preferred: Sequence[str] = ()
+    ):
+        """
+        Args:
+            fonts: 字体列表
+            dirs: 扫描过的目录及其修改时间，用于判断索引是否过期
+            preferred: 首选字体路径，按优先级排列
+        """
+        rank = {os.path.normcase(os.path.abspath(p)): i for i, p in enumerate(preferred)}
+
+        def order(entry: FontEntry):
+            key = os.path.normcase(os.path.abspath(entry.path))
+            return (rank.get(key, len(rank)), -entry.cjk, not entry.covers(ord("A")), -entry.codepoints,
+                    entry.path, entry.index)
+
+        self.fonts = sorted(fonts, key=order)
+        self.dirs = dict(dirs or {})
+        self._choices: Dict[str, Optional[FontEntry]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def primary(self) -> Optional[FontEntry]:
+        """优先级最高的字体"""
+        return self.fonts[0] if self.fonts else None
+
+    @classmethod
+    def build(cls, dirs: Optional[Sequence[str]] = None, preferred: Sequence[str] = ()) -> "FontIndex":
+        """扫描字体目录，读取每个字体的覆盖范围"""
+        fonts = []
+        scanned = {}
+        for root in dirs or default_font_dirs():
+            if not os.path.isdir(root):
+                continue
+            for current, _, files in os.walk(root):
+                scanned[current] = os.stat(current).st_mtime
+                for name in sorted(files):
+                    if not name.lower().endswith(FONT_EXTENSIONS):
+                        continue
+                    path = os.path.join(current, name)
+                    try:
+                        faces = read_font_faces(path)
+                    except (OSError, struct.error, ValueError):
+                        # 损坏或不支持的字体文件
+                        continue
+                    fonts.extend(FontEntry(path, face["index"], face["ranges"]) for face in faces)
+        return cls(fonts, scanned, preferred)
+
+    def is_stale(self, dirs: Optional[Sequence[str]] = None) -> bool:
+        """扫描过的目录有变化（字体增删）或出现了新的字体目录时返回 True"""
+        for directory, mtime in self.dirs.items():
+            try:
+                if os.stat(directory).st_mtime != mtime:
+                    return True
+            except OSError:
+                return True
+        return any(os.path.isdir(root) and root not in self.dirs for root in dirs or default_font_dirs())
+
+    def save(self, index_path: Optional[str] = None):
+        """保存索引（先写临时文件再替换）"""
+        path = Path(index_path) if index_path else default_index_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {"version": INDEX_VERSION, "dirs": self.dirs, "fonts": [font.as_dict() for font in self.fonts]}
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, index_path: Optional[str] = None, preferred: Sequence[str] = ()) -> Optional["FontIndex"]:
+        """读取已保存的索引，不存在或版本不符时返回 None"""
+        path = Path(index_path) if index_path else default_index_path()
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != INDEX_VERSION:
+            return None
+        fonts = [FontEntry(**font) for font in data["fonts"]]
+        return cls(fonts, data["dirs"], preferred)
+
+    @classmethod
+    def load_or_build(
+        cls,
+        index_path: Optional[str] = None,
+        dirs: Optional[Sequence[str]] = None,
+        preferred: Sequence[str] = ()
+    ) -> "FontIndex":
+        """读取已保存的索引，不存在或已过期时重新扫描并保存"""
+        index = cls.load(index_path, preferred)
+        if index is not None and not index.is_stale(dirs):
+            return index
+        index = cls.build(dirs, preferred)
+        try:
+            index.save(index_path)
+        except OSError as e:
+            print(f"保存字体索引失败: {e}")
+        return index
+
+    def font_for(self, char: str) -> Optional[FontEntry]:
+        """覆盖该字符的第一个字体，没有字体覆盖时返回 None"""
+        with self._lock:
+            if char in self._choices:
+                return self._choices[char]
+        codepoint = ord(char)
+        choice = next((font for font in self.fonts if font.covers(codepoint)), None)
+        with self._lock:
+            self._choices[char] = choice
+        return choice
+
+    def split_runs(self, text: str) -> List[Tuple[Optional[FontEntry], str]]:
+        """
+        把文字按使用的字体切分成连续的片段
+
+        空白和没有任何字体覆盖的字符跟随前一个片段（没有前一个片段时使用首选字体），
+        避免切成过多的片段。
+
+        Returns:
+            [(字体, 片段文字)]，索引为空时字体为 None
+        """
+        runs = []
+        for char in text:
+            font = None if char.isspace() else self.font_for(char)
+            if font is None:
+                font = runs[-1][0] if runs else self.primary
+            if runs and runs[-1][0] is font:
+                runs[-1][1].append(char)
+            else:
+                runs.append((font, [char]))
+        return [(font, "".join(chars)) for font, chars in runs]
+
+    def fallback_chain(self, text: str) -> List[FontEntry]:
+        """绘制这段文字需要的字体，按首次出现的顺序"""
+        chain = []
+        for font, _ in self.split_runs(text):
+            if font is not None and font not in chain:
+                chain.append(font)
+        return chain
@@ -2,56 +2,271 @@
 """
 图片编辑模块
 提供图片区域覆盖和文字绘制功能
+
+界面中反复编辑同一张图片时使用 WorkingImage：修改直接画在工作缓冲区上，
+只保存被覆盖区域的原始内容用于撤销，长截图上每次操作不再复制整张图片。
 """
 
 from PIL import Image, ImageDraw, ImageFont
+from dataclasses import asdict, dataclass
+from functools import lru_cache
 from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
+import math
 import platform
+import time
 
+from font_index import FontEntry, FontIndex
 
-def get_chinese_font(size: int = 24):
-    """
-    获取支持中文的字体
-    
-    Args:
-        size: 字体大小
-    
-    Returns:
-        ImageFont 对象
-    """
+
+# 已加载的字体对象最多缓存这么多个（按路径、字号、字体索引区分）
+FONT_CACHE_SIZE = 32
+
+# 水印字体大小
+WATERMARK_FONT_SIZE = 20
+
+# WorkingImage 直接在这些模式上绘制和缩放预览，其它模式先转换
+EDITABLE_MODES = ("RGB", "RGBA", "L", "LA")
+
+# (left, top, right, bottom)，right / bottom 不含
+Box = Tuple[int, int, int, int]
+
+
+def _font_candidates() -> List[str]:
+    """当前系统上可能存在的中文字体路径，按优先级排列"""
     system = platform.system()
     
     # 不同系统的中文字体路径
-    font_paths = []
-    
     if system == "Darwin":  # macOS
-        font_paths = [
+        return [
             "/System/Library/Fonts/PingFang.ttc",
             "/System/Library/Fonts/STHeiti Light.ttc",
             "/System/Library/Fonts/Hiragino Sans GB.ttc",
             "/Library/Fonts/Arial Unicode.ttf",
         ]
     elif system == "Windows":
-        font_paths = [
+        return [
             "C:/Windows/Fonts/msyh.ttc",  # 微软雅黑
             "C:/Windows/Fonts/simhei.ttf",  # 黑体
             "C:/Windows/Fonts/simsun.ttc",  # 宋体
         ]
     else:  # Linux
-        font_paths = [
+        return [
             "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
             "/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf",
         ]
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def load_font(path: str, size: int, index: int = 0) -> ImageFont.FreeTypeFont:
+    """
+    加载字体文件（带缓存）
+
+    中文字体文件很大，每次 truetype 都要重新解析；同样的路径、字号和字体索引只加载一次。
+    """
+    return ImageFont.truetype(path, size, index=index)
+
+
+@lru_cache(maxsize=1)
+def get_font_index() -> FontIndex:
+    """
+    字体索引（每个进程只读取一次）
+
+    索引保存在 ~/.cache/jd_screenshot/font_index.json，首次运行或字体目录有变化时重新扫描；
+    _font_candidates 中的字体排在最前面。
+    """
+    return FontIndex.load_or_build(preferred=_font_candidates())
+
+
+@lru_cache(maxsize=1)
+def find_chinese_font() -> Optional[FontEntry]:
+    """首选字体（每个进程只查找一次），索引中没有任何字体时返回 None"""
+    primary = get_font_index().primary
+    if primary is None:
+        print("警告: 未找到可用字体，使用默认字体")
+    elif not primary.cjk:
+        print("警告: 未找到中文字体，中文可能无法显示")
+    return primary
+
+
+def font_cache_info() -> dict:
+    """字体缓存统计：命中、未命中次数和当前缓存的字体数量"""
+    info = load_font.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+
+
+def get_chinese_font(size: int = 24):
+    """
+    获取支持中文的字体
+    
+    Args:
+        size: 字体大小
     
-    for font_path in font_paths:
-        try:
-            return ImageFont.truetype(font_path, size)
-        except (OSError, IOError):
-            continue
+    Returns:
+        ImageFont 对象（同样的字号返回同一个缓存的对象）
+    """
+    entry = find_chinese_font()
+    if entry is None:
+        # 如果都找不到，返回默认字体
+        return ImageFont.load_default()
+    return load_font(entry.path, size, entry.index)
+
+
+def _font_runs(text: str, size: int) -> List[Tuple[ImageFont.ImageFont, str]]:
+    """按字体索引把文字切分成 (字体, 片段)，每个片段使用覆盖它的字体"""
+    runs = []
+    for entry, run in get_font_index().split_runs(text):
+        font = load_font(entry.path, size, entry.index) if entry is not None else get_chinese_font(size)
+        runs.append((font, run))
+    return runs or [(get_chinese_font(size), text)]
+
+
+def _layout_text(draw: ImageDraw.ImageDraw, xy: Tuple[int, int], text: str, size: int) -> list:
+    """
+    计算每个片段的绘制位置
+
+    只用一个字体时和直接 draw.text 完全相同；混用多个字体时各片段按同一条基线排列
+    （基线在 y 加上各字体中最大的上升高度处），x 依次累加片段宽度。
+
+    Returns:
+        [(位置, 片段, 字体, anchor)]
+    """
+    runs = _font_runs(text, size)
+    if len(runs) == 1:
+        font, run = runs[0]
+        return [(xy, run, font, None)]
+
+    x, y = xy
+    baseline = y + max(font.getmetrics()[0] for font, _ in runs)
+    layout = []
+    for font, run in runs:
+        layout.append(((x, baseline), run, font, "ls"))
+        x += draw.textlength(run, font=font)
+    return layout
+
+
+def draw_text(draw: ImageDraw.ImageDraw, xy: Tuple[int, int], text: str, fill, size: int = 24):
+    """
+    绘制文字，中文、英文、符号混排时每个字符使用覆盖它的字体
+
+    Args:
+        draw: ImageDraw 对象
+        xy: 文字左上角位置（与 draw.text 相同）
+        text: 文字
+        fill: 文字颜色
+        size: 字体大小
+    """
+    for position, run, font, anchor in _layout_text(draw, xy, text, size):
+        draw.text(position, run, fill=fill, font=font, anchor=anchor)
+
+
+def text_bbox(draw: ImageDraw.ImageDraw, text: str, size: int = 24) -> Tuple[int, int, int, int]:
+    """draw_text 在 (0, 0) 处绘制这段文字时的外接矩形"""
+    boxes = [
+        draw.textbbox(position, run, font=font, anchor=anchor)
+        for position, run, font, anchor in _layout_text(draw, (0, 0), text, size)
+    ]
+    return (
+        min(box[0] for box in boxes), min(box[1] for box in boxes),
+        max(box[2] for box in boxes), max(box[3] for box in boxes),
+    )
+
+
+@dataclass
+class RegionEdit:
+    """一处区域修改：用背景色覆盖矩形区域，再写上新文字"""
+    x: int
+    y: int
+    width: int
+    height: int
+    text: str
+    bg_color: str = "white"
+    text_color: str = "red"
+    font_size: int = 24
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RegionEdit":
+        """从字典创建（前端的修改记录、JSON 等），忽略多余的键"""
+        names = cls.__dataclass_fields__.keys()
+        return cls(**{name: data[name] for name in names if name in data})
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def _clip_box(box, size: Tuple[int, int]) -> Box:
+    """把矩形取整（向外）并限制在图片范围内，完全在图片外时宽或高为 0"""
+    width, height = size
+    left = min(max(int(math.floor(box[0])), 0), width)
+    top = min(max(int(math.floor(box[1])), 0), height)
+    right = min(max(int(math.ceil(box[2])), left), width)
+    bottom = min(max(int(math.ceil(box[3])), top), height)
+    return left, top, right, bottom
+
+
+def _plan_edit(draw: ImageDraw.ImageDraw, edit: RegionEdit) -> Tuple[Tuple[int, int], tuple]:
+    """
+    计算一处修改的文字位置和会改动的范围
+
+    Returns:
+        (文字位置, 会改动的矩形（覆盖区域加上超出区域的文字）)
+    """
+    x, y, width, height = edit.x, edit.y, edit.width, edit.height
+
+    # 计算文字位置（垂直居中）
+    bbox = text_bbox(draw, edit.text, edit.font_size)
+    text_height = bbox[3] - bbox[1]
+    text_x, text_y = x + 5, y + (height - text_height) // 2
+
+    # draw.rectangle 包含右下角的边
+    box = (
+        min(x, text_x + bbox[0]), min(y, text_y + bbox[1]),
+        max(x + width + 1, text_x + bbox[2]), max(y + height + 1, text_y + bbox[3]),
+    )
+    return (text_x, text_y), box
+
+
+def _draw_edit(draw: ImageDraw.ImageDraw, edit: RegionEdit, text_xy: Tuple[int, int]):
+    """在 draw 上执行一处修改（text_xy 由 _plan_edit 计算）"""
+    x, y, width, height = edit.x, edit.y, edit.width, edit.height
+
+    # 用背景色覆盖原区域
+    draw.rectangle([x, y, x + width, y + height], fill=edit.bg_color)
     
-    # 如果都找不到，返回默认字体
-    print("警告: 未找到中文字体，使用默认字体")
-    return ImageFont.load_default()
+    # 绘制新文字
+    draw_text(draw, text_xy, edit.text, edit.text_color, edit.font_size)
+
+
+def edit_regions(
+    image: Image.Image,
+    edits: Sequence[Union[RegionEdit, dict]],
+    in_place: bool = False
+) -> Tuple[Image.Image, List[float]]:
+    """
+    一次执行多处区域修改
+
+    整批修改只复制一次图片、只创建一个 ImageDraw，字体按字号从缓存中取，
+    长截图上一次改十处不会产生十份整图副本。修改按顺序执行，后面的覆盖前面的。
+
+    Args:
+        image: PIL Image 对象
+        edits: RegionEdit 列表（也可以是包含相同键的字典）
+        in_place: 直接修改传入的图片，不复制
+
+    Returns:
+        (修改后的 Image 对象, 每处修改的耗时（秒）)
+    """
+    img = image if in_place else image.copy()
+    draw = ImageDraw.Draw(img)
+    timings = []
+    for edit in edits:
+        if isinstance(edit, dict):
+            edit = RegionEdit.from_dict(edit)
+        started = time.perf_counter()
+        text_xy, _ = _plan_edit(draw, edit)
+        _draw_edit(draw, edit, text_xy)
+        timings.append(time.perf_counter() - started)
+    return img, timings
 
 
 def edit_region(
@@ -66,7 +281,7 @@ def edit_region(
     font_size: int = 24
 ) -> Image.Image:
     """
-    修改图片中的指定区域
+    修改图片中的指定区域（多处修改请用 edit_regions）
     
     Args:
         image: PIL Image 对象
@@ -80,22 +295,60 @@ def edit_region(
     Returns:
         修改后的 Image 对象
     """
-    img = image.copy()
-    draw = ImageDraw.Draw(img)
-    font = get_chinese_font(font_size)
+    edit = RegionEdit(x, y, width, height, new_text, bg_color, text_color, font_size)
+    img, _ = edit_regions(image, [edit])
+    return img
+
+
+def _watermark_layer(
+    size: Tuple[int, int],
+    text: str,
+    position: str,
+    opacity: int
+) -> Tuple[Box, Optional[Image.Image]]:
+    """
+    生成只覆盖文字范围的水印层
+
+    Returns:
+        (水印在图片中的范围, 与该范围同样大小的 RGBA 水印层)，水印完全在图片外时层为 None
+    """
+    # 按 RGBA 图层测量，和在整图大小的透明图层上绘制时完全一致
+    measure = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
     
-    # 用背景色覆盖原区域
-    draw.rectangle([x, y, x + width, y + height], fill=bg_color)
+    # 计算文字大小
+    bbox = text_bbox(measure, text, WATERMARK_FONT_SIZE)
+    text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
+    width, height = size
     
-    # 计算文字位置（垂直居中）
-    text_bbox = draw.textbbox((0, 0), new_text, font=font)
-    text_height = text_bbox[3] - text_bbox[1]
-    text_y = y + (height - text_height) // 2
+    # 计算位置
+    padding = 10
+    if position == "top-left":
+        pos = (padding, padding)
+    elif position == "top-right":
+        pos = (width - text_width - padding, padding)
+    elif position == "bottom-left":
+        pos = (padding, height - text_height - padding)
+    elif position == "bottom-right":
+        pos = (width - text_width - padding, height - text_height - padding)
+    else:  # center
+        pos = ((width - text_width) // 2, (height - text_height) // 2)
     
-    # 绘制新文字
-    draw.text((x + 5, text_y), new_text, fill=text_color, font=font)
+    box = _clip_box((pos[0] + bbox[0], pos[1] + bbox[1], pos[0] + bbox[2], pos[1] + bbox[3]), size)
+    if box[2] == box[0] or box[3] == box[1]:
+        return box, None
     
-    return img
+    # 绘制半透明水印（图层只有文字范围大小，位置相应平移）
+    layer = Image.new("RGBA", (box[2] - box[0], box[3] - box[1]), (255, 255, 255, 0))
+    draw_text(ImageDraw.Draw(layer), (pos[0] - box[0], pos[1] - box[1]), text,
+              (128, 128, 128, opacity), WATERMARK_FONT_SIZE)
+    return box, layer
+
+
+def _composite(image: Image.Image, box: Box, layer: Image.Image):
+    """把水印层就地合并到 image 的 box 范围"""
+    region = image.crop(box).convert("RGBA")
+    image.paste(Image.alpha_composite(region, layer).convert(image.mode), box[:2])
 
 
 def add_watermark(
@@ -114,39 +367,164 @@ def add_watermark(
         opacity: 透明度 (0-255)
     
     Returns:
-        添加水印后的 Image 对象
+        添加水印后的 Image 对象（RGB）
     """
-    img = image.copy().convert("RGBA")
-    
-    # 创建水印层
-    watermark = Image.new("RGBA", img.size, (255, 255, 255, 0))
-    draw = ImageDraw.Draw(watermark)
-    font = get_chinese_font(20)
-    
-    # 计算文字大小
-    text_bbox = draw.textbbox((0, 0), text, font=font)
-    text_width = text_bbox[2] - text_bbox[0]
-    text_height = text_bbox[3] - text_bbox[1]
-    
-    # 计算位置
-    padding = 10
-    if position == "top-left":
-        pos = (padding, padding)
-    elif position == "top-right":
-        pos = (img.width - text_width - padding, padding)
-    elif position == "bottom-left":
-        pos = (padding, img.height - text_height - padding)
-    elif position == "bottom-right":
-        pos = (img.width - text_width - padding, img.height - text_height - padding)
-    else:  # center
-        pos = ((img.width - text_width) // 2, (img.height - text_height) // 2)
-    
-    # 绘制半透明水印
-    draw.text(pos, text, fill=(128, 128, 128, opacity), font=font)
-    
-    # 合并图层
-    result = Image.alpha_composite(img, watermark)
-    return result.convert("RGB")
+    # 只复制一次；透明层和合并都只在文字范围内进行
+    img = image.copy() if image.mode == "RGB" else image.convert("RGB")
+    box, layer = _watermark_layer(img.size, text, position, opacity)
+    if layer is not None:
+        _composite(img, box, layer)
+    return img
+
+
+class WorkingImage:
+    """
+    可就地编辑的工作图片
+
+    - 修改直接画在工作缓冲区上，每次操作前只保存被覆盖区域的原始内容（用于撤销），不复制整图
+    - copy=True 时写时复制：第一次修改时才复制传入的图片，只看不改则不产生副本
+    - 记录修改过的矩形（脏矩形），preview() 只重新缩放这些区域
+    - 需要独立的整图副本时调用 snapshot()
+
+    image 属性返回工作缓冲区本身，调用方只读不写（修改请通过本类的方法）。
+    """
+
+    def __init__(self, image: Image.Image, copy: bool = False):
+        """
+        Args:
+            image: 要编辑的图片。RGB、RGBA、L、LA 模式直接在原模式上修改（透明通道保留）；
+                   调色板等其它模式转换为 RGB，有透明信息时转换为 RGBA（转换会生成新图片）
+            copy: True 时传入的图片保持不变，第一次修改前复制一份；
+                  False 时直接在传入的图片上修改（调用方之后不再单独使用它）
+        """
+        if image.mode not in EDITABLE_MODES:
+            has_alpha = "A" in image.getbands() or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+            copy = False
+        self._source = image
+        self._buffer = None if copy else image
+        self._history: List[List[Tuple[Box, Image.Image]]] = []
+        self.dirty: List[Box] = []          # 加载（或全部撤销）以来修改过的矩形
+        self._preview = None
+        self._preview_dirty: List[Box] = []
+
+    @property
+    def image(self) -> Image.Image:
+        return self._buffer if self._buffer is not None else self._source
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self._source.size
+
+    @property
+    def can_undo(self) -> bool:
+        return bool(self._history)
+
+    def _writable(self) -> Image.Image:
+        if self._buffer is None:
+            self._buffer = self._source.copy()
+        return self._buffer
+
+    def _mark(self, box: Box):
+        self.dirty.append(box)
+        self._preview_dirty.append(box)
+
+    def apply_edits(self, edits: Sequence[Union[RegionEdit, dict]]) -> List[float]:
+        """
+        就地执行多处修改，作为一步操作记入撤销历史
+
+        Returns:
+            每处修改的耗时（秒）
+        """
+        img = self._writable()
+        draw = ImageDraw.Draw(img)
+        patches = []
+        timings = []
+        for edit in edits:
+            if isinstance(edit, dict):
+                edit = RegionEdit.from_dict(edit)
+            started = time.perf_counter()
+            text_xy, box = _plan_edit(draw, edit)
+            box = _clip_box(box, img.size)
+            patches.append((box, img.crop(box)))
+            _draw_edit(draw, edit, text_xy)
+            self._mark(box)
+            timings.append(time.perf_counter() - started)
+        self._history.append(patches)
+        return timings
+
+    def add_watermark(self, text: str = "仅供内部培训使用", position: str = "top-left", opacity: int = 128):
+        """就地添加水印（参数同 add_watermark），作为一步操作记入撤销历史"""
+        img = self._writable()
+        box, layer = _watermark_layer(img.size, text, position, opacity)
+        patches = []
+        if layer is not None:
+            patches.append((box, img.crop(box)))
+            _composite(img, box, layer)
+            self._mark(box)
+        self._history.append(patches)
+
+    def undo(self) -> bool:
+        """撤销最近一步操作，没有可撤销的操作时返回 False"""
+        if not self._history:
+            return False
+        img = self._writable()
+        # 同一步中的修改可能重叠，倒序恢复
+        for box, patch in reversed(self._history.pop()):
+            img.paste(patch, box[:2])
+            self._mark(box)
+        return True
+
+    def reset(self):
+        """撤销所有修改"""
+        if self._buffer is not None and self._buffer is not self._source:
+            # 写时复制的副本直接丢弃，传入的图片没有改动过
+            self._buffer = None
+            self._history = []
+            self._preview = None
+        while self.undo():
+            pass
+        self.dirty = []
+
+    def snapshot(self) -> Image.Image:
+        """当前内容的独立副本"""
+        return self.image.copy()
+
+    def preview(self, size: Tuple[int, int]) -> Image.Image:
+        """
+        缩放到 size 的预览图
+
+        第一次（或尺寸变化时）缩放整图，之后只重新缩放修改过的区域并贴回。
+        size 与原图相同时直接返回工作缓冲区（只读）。
+        """
+        image = self.image
+        if tuple(size) == image.size:
+            # 缓存的缩小预览不跟着更新，丢掉，下次缩放时重新生成
+            self._preview = None
+            self._preview_dirty = []
+            return image
+        if self._preview is None or self._preview.size != tuple(size):
+            self._preview = image.resize(size, Image.Resampling.LANCZOS)
+            self._preview_dirty = []
+            return self._preview
+
+        scale_x, scale_y = size[0] / image.width, size[1] / image.height
+        # LANCZOS 的采样范围是 3 个目标像素，区域向外扩展，保证边缘与整图缩放一致
+        margin_x, margin_y = 3 / scale_x + 1, 3 / scale_y + 1
+        for left, top, right, bottom in self._preview_dirty:
+            target = _clip_box(
+                ((left - margin_x) * scale_x, (top - margin_y) * scale_y,
+                 (right + margin_x) * scale_x, (bottom + margin_y) * scale_y),
+                size
+            )
+            if target[2] == target[0] or target[3] == target[1]:
+                continue
+            source = (target[0] / scale_x, target[1] / scale_y, target[2] / scale_x, target[3] / scale_y)
+            region = image.resize((target[2] - target[0], target[3] - target[1]),
+                                  Image.Resampling.LANCZOS, box=source)
+            self._preview.paste(region, target[:2])
+        self._preview_dirty = []
+        return self._preview
 
 
 def save_image(image: Image.Image, output_path: str, quality: int = 95):
@@ -173,7 +551,7 @@ if __name__ == "__main__":
     # 测试
     img = Image.new("RGB", (800, 600), "white")
     draw = ImageDraw.Draw(img)
-    draw.text((100, 100), "原始文字", fill="black", font=get_chinese_font(30))
+    draw_text(draw, (100, 100), "原始文字", "black", 30)
     
     # 修改区域
     img = edit_region(img, 100, 100, 200, 50, "¥999.00", "white", "red", 30)
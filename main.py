@@ -11,8 +11,14 @@ from pathlib import Path
 import threading
 import os
 
-from browser_screenshot import take_jd_screenshot
-from image_editor import edit_region, add_watermark, save_image, get_chinese_font
+from browser_screenshot import take_jd_screenshot, get_default_pool, jd_context_options
+from capture_cache import get_default_cache
+from image_editor import RegionEdit, WorkingImage, save_image, get_chinese_font
+from edit_spec import EditSpec, WatermarkSettings
+
+
+# 启动时在后台预热的浏览器上下文数量，0 表示不预热
+WARM_CONTEXTS = 2
 
 
 class ScreenshotEditor:
@@ -22,8 +28,7 @@ class ScreenshotEditor:
         self.root.geometry("1400x900")
         
         # 状态变量
-        self.original_image = None  # 原始图片
-        self.current_image = None   # 当前编辑的图片
+        self.work = None            # 当前编辑的图片（WorkingImage，就地修改，可撤销）
         self.photo_image = None     # Tkinter 显示用
         self.image_path = None      # 当前图片路径
         
@@ -31,12 +36,17 @@ class ScreenshotEditor:
         self.start_x = 0
         self.start_y = 0
         self.rect_id = None
-        self.selections = []  # 保存所有选区 [(x, y, w, h, text), ...]
+        self.selections = []  # 已应用的修改 [RegionEdit, ...]
+        self.pending = []     # 批量模式下框选了但还没应用的修改 [RegionEdit, ...]
         
         # 缩放比例（用于显示大图）
         self.scale = 1.0
         
         self._create_ui()
+
+        # 后台启动浏览器并准备好页面，第一次截图不用等浏览器启动
+        if WARM_CONTEXTS:
+            get_default_pool().warm(WARM_CONTEXTS, **jd_context_options())
     
     def _create_ui(self):
         """创建界面"""
@@ -52,9 +62,15 @@ class ScreenshotEditor:
         
         # 按钮
         ttk.Button(control_frame, text="截图", command=self._take_screenshot).pack(side=tk.LEFT, padx=5)
+        self.refresh_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(control_frame, text="忽略缓存", variable=self.refresh_var).pack(side=tk.LEFT)
         ttk.Button(control_frame, text="打开图片", command=self._open_image).pack(side=tk.LEFT, padx=5)
         ttk.Button(control_frame, text="保存", command=self._save_image).pack(side=tk.LEFT, padx=5)
         ttk.Button(control_frame, text="撤销修改", command=self._undo_all).pack(side=tk.LEFT, padx=5)
+        self.batch_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(control_frame, text="批量框选", variable=self.batch_var).pack(side=tk.LEFT, padx=5)
+        ttk.Button(control_frame, text="应用选区", command=self._apply_pending).pack(side=tk.LEFT, padx=5)
+        ttk.Button(control_frame, text="导出编辑", command=self._export_spec).pack(side=tk.LEFT, padx=5)
         
         # 状态标签
         self.status_label = ttk.Label(control_frame, text="就绪", foreground="green")
@@ -89,7 +105,8 @@ class ScreenshotEditor:
         # 提示
         hint_frame = ttk.Frame(self.root, padding=5)
         hint_frame.pack(fill=tk.X)
-        ttk.Label(hint_frame, text="💡 使用方法：输入URL截图 或 打开本地图片 → 用鼠标框选要修改的区域 → 输入新文字 → 保存", 
+        ttk.Label(hint_frame, text="💡 使用方法：输入URL截图 或 打开本地图片 → 用鼠标框选要修改的区域 → 输入新文字 → 保存"
+                                   "（勾选批量框选时先框选多处，再点应用选区一次完成）", 
                   foreground="gray").pack(side=tk.LEFT)
         
         # 图片显示区（带滚动条）
@@ -138,12 +155,19 @@ class ScreenshotEditor:
             return
         
         self._update_status("正在截图...", "orange")
+        refresh = self.refresh_var.get()
         
         def do_screenshot():
             try:
-                output_path = "jd_screenshot.png"
-                take_jd_screenshot(url, output_path)
-                self.root.after(0, lambda: self._load_image(output_path))
+                # 直接拿到解码后的图片，不经过临时文件
+                image = take_jd_screenshot(
+                    url, None,
+                    pool=get_default_pool(),
+                    cache=get_default_cache(),
+                    refresh=refresh,
+                    result="image"
+                )
+                self.root.after(0, lambda: self._set_image(image, url))
                 self.root.after(0, lambda: self._update_status("截图完成", "green"))
             except Exception as e:
                 self.root.after(0, lambda: messagebox.showerror("截图失败", str(e)))
@@ -167,24 +191,28 @@ class ScreenshotEditor:
         """加载图片到画布"""
         try:
             self.image_path = path
-            self.original_image = Image.open(path)
-            self.current_image = self.original_image.copy()
-            self.selections = []
-            self._display_image()
-            self.info_label.config(text=f"图片: {path} | 尺寸: {self.original_image.width}x{self.original_image.height}")
+            self._set_image(Image.open(path), path)
         except Exception as e:
             messagebox.showerror("错误", f"无法加载图片: {e}")
     
+    def _set_image(self, image, source):
+        """显示新的图片并清空修改记录"""
+        self.work = WorkingImage(image)
+        self.selections = []
+        self.pending = []
+        self._display_image()
+        self.info_label.config(text=f"图片: {source} | 尺寸: {self.work.size[0]}x{self.work.size[1]}")
+    
     def _display_image(self):
         """显示图片"""
-        if self.current_image is None:
+        if self.work is None:
             return
         
         # 计算缩放比例（适应画布大小，但不超过原图）
         canvas_width = self.canvas.winfo_width() or 1200
         canvas_height = self.canvas.winfo_height() or 700
         
-        img_width, img_height = self.current_image.size
+        img_width, img_height = self.work.size
         
         # 计算适合的缩放
         scale_w = canvas_width / img_width
@@ -195,9 +223,8 @@ class ScreenshotEditor:
         display_width = int(img_width * self.scale)
         display_height = int(img_height * self.scale)
         
-        display_img = self.current_image.copy()
-        if self.scale < 1.0:
-            display_img = display_img.resize((display_width, display_height), Image.Resampling.LANCZOS)
+        # 只重新缩放上次显示后修改过的区域
+        display_img = self.work.preview((display_width, display_height))
         
         self.photo_image = ImageTk.PhotoImage(display_img)
         
@@ -205,10 +232,21 @@ class ScreenshotEditor:
         self.canvas.delete("all")
         self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo_image)
         self.canvas.config(scrollregion=(0, 0, display_width, display_height))
+        self._draw_pending()
+    
+    def _draw_pending(self):
+        """在画布上标出还没应用的选区"""
+        self.canvas.delete("pending")
+        for edit in self.pending:
+            self.canvas.create_rectangle(
+                edit.x * self.scale, edit.y * self.scale,
+                (edit.x + edit.width) * self.scale, (edit.y + edit.height) * self.scale,
+                outline="blue", width=2, tags="pending"
+            )
     
     def _on_mouse_down(self, event):
         """鼠标按下"""
-        if self.current_image is None:
+        if self.work is None:
             return
         
         # 获取画布坐标
@@ -235,7 +273,7 @@ class ScreenshotEditor:
     
     def _on_mouse_up(self, event):
         """鼠标释放 - 弹出编辑对话框"""
-        if self.current_image is None or self.rect_id is None:
+        if self.work is None or self.rect_id is None:
             return
         
         end_x = self.canvas.canvasx(event.x)
@@ -264,37 +302,82 @@ class ScreenshotEditor:
         )
         
         if new_text:
-            # 执行修改
-            self.current_image = edit_region(
-                self.current_image,
+            edit = RegionEdit(
                 x1, y1, width, height,
                 new_text,
                 bg_color=self.bg_color_var.get() if self.bg_color_var.get() != "auto" else "white",
                 text_color=self.color_var.get(),
                 font_size=self.font_size_var.get()
             )
-            self.selections.append((x1, y1, width, height, new_text))
-            self._display_image()
-            self._update_status(f"已修改 {len(self.selections)} 处", "blue")
+            if self.batch_var.get():
+                # 批量模式：先记下来，点“应用选区”时一次完成
+                self.pending.append(edit)
+                self._draw_pending()
+                self._update_status(f"待应用 {len(self.pending)} 处", "orange")
+            else:
+                self._apply_edits([edit])
         
         # 清除选框
         self.canvas.delete(self.rect_id)
         self.rect_id = None
     
+    def _apply_edits(self, edits):
+        """执行修改（就地修改，不复制图片）"""
+        timings = self.work.apply_edits(edits)
+        self.selections.extend(edits)
+        self._display_image()
+        self._update_status(
+            f"已修改 {len(self.selections)} 处（本次 {len(edits)} 处，{sum(timings) * 1000:.0f} ms）", "blue"
+        )
+    
+    def _apply_pending(self):
+        """应用批量框选的所有选区"""
+        if not self.pending:
+            self._update_status("没有待应用的选区", "orange")
+            return
+        edits, self.pending = self.pending, []
+        self._apply_edits(edits)
+    
     def _undo_all(self):
         """撤销所有修改"""
-        if self.original_image is None:
+        if self.work is None:
             return
         
         if messagebox.askyesno("确认", "确定要撤销所有修改吗？"):
-            self.current_image = self.original_image.copy()
+            self.work.reset()
             self.selections = []
+            self.pending = []
             self._display_image()
             self._update_status("已撤销所有修改", "green")
     
+    def _export_spec(self):
+        """把已应用的修改和水印设置导出为编辑规格，可以用 render_edits.py 套用到其他截图"""
+        if not self.selections:
+            messagebox.showerror("错误", "还没有修改可以导出")
+            return
+        
+        file_path = filedialog.asksaveasfilename(
+            title="导出编辑规格",
+            defaultextension=".json",
+            filetypes=[("JSON", "*.json")],
+            initialfile="edit_spec.json"
+        )
+        if not file_path:
+            return
+        
+        spec = EditSpec(
+            edits=list(self.selections),
+            watermark=WatermarkSettings() if self.watermark_var.get() else None
+        )
+        try:
+            spec.save(file_path)
+            self._update_status(f"已导出 {len(spec.edits)} 处修改: {Path(file_path).name}", "green")
+        except OSError as e:
+            messagebox.showerror("导出失败", str(e))
+    
     def _save_image(self):
         """保存图片"""
-        if self.current_image is None:
+        if self.work is None:
             messagebox.showerror("错误", "没有可保存的图片")
             return
         
@@ -309,14 +392,16 @@ class ScreenshotEditor:
         if not file_path:
             return
         
+        watermark = self.watermark_var.get()
         try:
-            img_to_save = self.current_image.copy()
-            
-            # 添加水印
-            if self.watermark_var.get():
-                img_to_save = add_watermark(img_to_save, "仅供内部培训使用")
-            
-            save_image(img_to_save, file_path)
+            # 水印就地加在工作图片上，保存后撤销，不复制整图
+            if watermark:
+                self.work.add_watermark("仅供内部培训使用")
+            try:
+                save_image(self.work.image, file_path)
+            finally:
+                if watermark:
+                    self.work.undo()
             self._update_status(f"已保存: {Path(file_path).name}", "green")
             messagebox.showinfo("成功", f"图片已保存到:\n{file_path}")
         except Exception as e:
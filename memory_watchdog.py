@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+浏览器内存监控模块
+定期统计 Chromium 进程树的常驻内存（RSS），超过阈值时通知调用方排空页面并重启浏览器
+
+Playwright 不提供浏览器进程号，启动前后各取一次本进程下的 Chromium 主进程，
+新出现的那个就是刚启动的浏览器。装有 psutil 时用 psutil 读取进程信息，
+否则在 Linux 上读取 /proc；两者都不可用时无法统计（返回 None），监控不生效。
+"""
+
+from typing import Dict, Iterable, Optional, Set
+import os
+import threading
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+# 进程名包含这些片段时视为浏览器进程
+BROWSER_PROCESS_NAMES = ("chrome", "chromium", "headless_shell")
+
+
+def _is_browser(name: str) -> bool:
+    name = name.lower()
+    return any(part in name for part in BROWSER_PROCESS_NAMES)
+
+
+def _proc_table() -> Dict[int, tuple]:
+    """返回本进程所有后代进程 {pid: (ppid, 名称, RSS 字节数)}"""
+    table = {}
+    if psutil is not None:
+        for child in psutil.Process().children(recursive=True):
+            try:
+                table[child.pid] = (child.ppid(), child.name(), child.memory_info().rss)
+            except psutil.Error:
+                continue
+        return table
+
+    if not os.path.isdir("/proc"):
+        return table
+
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    everything = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                stat = f.read()
+            with open(f"/proc/{entry}/statm", "r") as f:
+                resident = int(f.read().split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        # 进程名在括号里，可能包含空格
+        name = stat[stat.index("(") + 1:stat.rindex(")")]
+        ppid = int(stat[stat.rindex(")") + 2:].split()[1])
+        everything[int(entry)] = (ppid, name, resident * page_size)
+
+    # 只保留本进程的后代
+    descendants = {os.getpid()}
+    changed = True
+    while changed:
+        changed = False
+        for pid, (ppid, _, _) in everything.items():
+            if ppid in descendants and pid not in descendants:
+                descendants.add(pid)
+                changed = True
+    for pid in descendants - {os.getpid()}:
+        table[pid] = everything[pid]
+    return table
+
+
+def memory_supported() -> bool:
+    """当前环境能否统计浏览器内存"""
+    return psutil is not None or os.path.isdir("/proc")
+
+
+def browser_root_pids() -> Set[int]:
+    """本进程启动的所有 Chromium 主进程（父进程不是浏览器的浏览器进程）"""
+    table = _proc_table()
+    return {
+        pid for pid, (ppid, name, _) in table.items()
+        if _is_browser(name) and not (ppid in table and _is_browser(table[ppid][1]))
+    }
+
+
+def find_new_browser(before: Set[int]) -> Optional[int]:
+    """启动浏览器后调用，返回新出现的 Chromium 主进程号，无法确定时返回 None"""
+    new = browser_root_pids() - before
+    return new.pop() if len(new) == 1 else None
+
+
+def process_tree_rss(pids: Iterable[int]) -> Optional[int]:
+    """这些进程及其所有子进程的 RSS 总和（字节），无法统计时返回 None"""
+    pids = {pid for pid in pids if pid is not None}
+    if not pids or not memory_supported():
+        return None
+
+    table = _proc_table()
+    tree = {pid for pid in pids if pid in table}
+    changed = True
+    while changed:
+        changed = False
+        for pid, (ppid, _, _) in table.items():
+            if ppid in tree and pid not in tree:
+                tree.add(pid)
+                changed = True
+    return sum(table[pid][2] for pid in tree)
+
+
+class MemoryWatchdog:
+    """
+    浏览器内存统计
+
+    sample() 记录一次采样并更新峰值，over_limit() 判断是否超过阈值，
+    何时采样、超过后如何重启由浏览器池 / 异步引擎决定。
+    """
+
+    def __init__(self, limit_mb: Optional[float] = None, interval: float = 5.0):
+        """
+        Args:
+            limit_mb: 内存阈值（MB），None 表示只统计不重启
+            interval: 采样间隔（秒）
+        """
+        self.limit_bytes = int(limit_mb * 1024 * 1024) if limit_mb else None
+        self.interval = interval
+        self.last_rss = 0
+        self.peak_rss = 0
+        self.samples = 0
+        self.restarts = 0
+        self._lock = threading.Lock()
+
+    def sample(self, pids: Iterable[int]) -> Optional[int]:
+        """统计一次浏览器内存，返回 RSS 字节数"""
+        rss = process_tree_rss(pids)
+        self.record(rss)
+        return rss
+
+    def record(self, rss: Optional[int]):
+        """记录一次采样结果（多个浏览器时传入总和）"""
+        if rss is None:
+            return
+        with self._lock:
+            self.last_rss = rss
+            self.peak_rss = max(self.peak_rss, rss)
+            self.samples += 1
+
+    def over_limit(self, rss: Optional[int]) -> bool:
+        return self.limit_bytes is not None and rss is not None and rss > self.limit_bytes
+
+    def record_restart(self, rss: Optional[int]):
+        with self._lock:
+            self.restarts += 1
+        print(f"浏览器内存 {(rss or 0) / 1024 / 1024:.0f} MB 超过阈值 "
+              f"{self.limit_bytes / 1024 / 1024:.0f} MB，重启浏览器")
+
+    def as_dict(self) -> dict:
+        """内存统计：重启次数、峰值和最近一次采样（MB）"""
+        with self._lock:
+            return {
+                "restarts": self.restarts,
+                "peak_rss_mb": round(self.peak_rss / 1024 / 1024, 1),
+                "last_rss_mb": round(self.last_rss / 1024 / 1024, 1),
+                "samples": self.samples,
+                "limit_mb": round(self.limit_bytes / 1024 / 1024, 1) if self.limit_bytes else None,
+            }
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+流式 PNG 写入模块
+按行带逐段压缩写入 PNG，不需要把整张图片放在内存里
+
+PNG 文件头（IHDR）必须写在最前面，但长截图的最终高度要拼完才知道，
+所以先写入占位高度，关闭时再回到文件头补上真实高度和 CRC。
+"""
+
+from pathlib import Path
+from PIL import Image
+import struct
+import zlib
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# 每攒够这么多压缩数据就写出一个 IDAT 块
+IDAT_CHUNK_SIZE = 256 * 1024
+
+
+def _chunk(tag: bytes, data: bytes) -> bytes:
+    crc = zlib.crc32(tag + data) & 0xFFFFFFFF
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", crc)
+
+
+def _ihdr(width: int, height: int) -> bytes:
+    # 8 位 RGB，无隔行
+    return struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+
+
+class PngStreamWriter:
+    """
+    流式 PNG 写入器（RGB）
+
+    用法:
+        with PngStreamWriter("long.png", width=1920) as writer:
+            writer.write_rows(tile_image)
+            ...
+
+    with 块中抛出异常时调用 abort()，删除写了一半的文件，不留下看起来完整的截断图片。
+    """
+
+    def __init__(self, output_path: str, width: int, compress_level: int = 6):
+        """
+        Args:
+            output_path: 输出路径
+            width: 图片宽度（像素）
+            compress_level: zlib 压缩级别 (0-9)
+        """
+        self.output_path = Path(output_path)
+        self.width = width
+        self.height = 0
+        self._file = open(self.output_path, "wb")
+        self._compressor = zlib.compressobj(compress_level)
+        self._pending = []
+        self._pending_size = 0
+
+        self._file.write(PNG_SIGNATURE)
+        self._file.write(_chunk(b"IHDR", _ihdr(width, 0)))
+
+    def _flush_pending(self, force: bool = False):
+        if self._pending and (force or self._pending_size >= IDAT_CHUNK_SIZE):
+            self._file.write(_chunk(b"IDAT", b"".join(self._pending)))
+            self._pending = []
+            self._pending_size = 0
+
+    def _push(self, compressed: bytes):
+        if compressed:
+            self._pending.append(compressed)
+            self._pending_size += len(compressed)
+            self._flush_pending()
+
+    def write_rows(self, image: Image.Image):
+        """
+        追加一段行带，宽度必须与写入器一致
+
+        Args:
+            image: PIL Image，非 RGB 会先转换
+        """
+        if image.width != self.width:
+            raise ValueError(f"行带宽度 {image.width} 与图片宽度 {self.width} 不一致")
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+
+        raw = image.tobytes()
+        stride = self.width * 3
+        # 每行前加一个过滤类型字节（0 = None）
+        rows = bytearray()
+        for offset in range(0, len(raw), stride):
+            rows.append(0)
+            rows += raw[offset:offset + stride]
+        self._push(self._compressor.compress(bytes(rows)))
+        self.height += image.height
+
+    def close(self):
+        """写入结尾并回填真实高度"""
+        if self._file.closed:
+            return
+        self._push(self._compressor.flush())
+        self._flush_pending(force=True)
+        self._file.write(_chunk(b"IEND", b""))
+
+        # IHDR 数据从第 16 字节开始（8 字节签名 + 4 字节长度 + 4 字节类型）
+        self._file.seek(len(PNG_SIGNATURE))
+        self._file.write(_chunk(b"IHDR", _ihdr(self.width, self.height)))
+        self._file.close()
+
+    def abort(self):
+        """放弃写入：关闭文件并删除，不写结尾也不回填高度"""
+        if not self._file.closed:
+            self._file.close()
+        try:
+            self.output_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
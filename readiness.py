@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+页面就绪判断模块
+用可组合的就绪条件代替固定的 sleep，页面一就绪就截图
+
+每个条件只定义两件事：
+- probe(page): 向页面发起（最多）一次调用，同步 API 直接返回值，异步 API 返回 awaitable
+- is_ready(value): 根据 probe 的结果判断是否就绪
+这样同一套条件可以同时用于 sync_api 和 async_api 的页面。
+"""
+
+from typing import List, Optional, Sequence
+import copy
+import hashlib
+import inspect
+import time
+
+
+class ReadyCondition:
+    """就绪条件基类"""
+
+    # 两次检查之间的间隔（秒）
+    interval = 0.1
+
+    def attach(self, page):
+        """开始等待前调用，用于注册事件、重置状态"""
+
+    def probe(self, page):
+        """对页面做一次检查，不需要访问页面时返回 None"""
+        return None
+
+    def is_ready(self, value) -> bool:
+        raise NotImplementedError
+
+
+class WaitForSelector(ReadyCondition):
+    """等待 CSS 选择器对应的元素出现并且有尺寸"""
+
+    _SCRIPT = """selector => {
+        const el = document.querySelector(selector);
+        if (!el) return false;
+        const rect = el.getBoundingClientRect();
+        return rect.width > 0 && rect.height > 0;
+    }"""
+
+    def __init__(self, selector: str):
+        self.selector = selector
+
+    def probe(self, page):
+        return page.evaluate(self._SCRIPT, self.selector)
+
+    def is_ready(self, value) -> bool:
+        return bool(value)
+
+
+class WaitForViewportImages(ReadyCondition):
+    """等待当前视口内的图片全部加载完成（用于滚动触发的懒加载）"""
+
+    _SCRIPT = """() => Array.from(document.images).every(img => {
+        const rect = img.getBoundingClientRect();
+        const visible = rect.bottom > 0 && rect.top < window.innerHeight;
+        return !visible || img.complete;
+    })"""
+
+    def probe(self, page):
+        return page.evaluate(self._SCRIPT)
+
+    def is_ready(self, value) -> bool:
+        return bool(value)
+
+
+class WaitForLoadState(ReadyCondition):
+    """等待 document.readyState 达到指定状态（domcontentloaded 或 load）"""
+
+    def __init__(self, state: str = "load"):
+        if state not in ("domcontentloaded", "load"):
+            raise ValueError(f"不支持的加载状态: {state}")
+        self.state = state
+
+    def probe(self, page):
+        return page.evaluate("document.readyState")
+
+    def is_ready(self, value) -> bool:
+        if self.state == "load":
+            return value == "complete"
+        return value in ("interactive", "complete")
+
+
+class WaitForNetworkQuiet(ReadyCondition):
+    """等待一段时间内没有新的网络请求发出或完成"""
+
+    def __init__(self, quiet_ms: int = 500):
+        self.quiet_ms = quiet_ms
+        self._last_activity = 0.0
+
+    def attach(self, page):
+        self._last_activity = time.monotonic()
+
+        def on_activity(_request):
+            self._last_activity = time.monotonic()
+
+        page.on("request", on_activity)
+        page.on("requestfinished", on_activity)
+        page.on("requestfailed", on_activity)
+
+    def is_ready(self, value) -> bool:
+        return (time.monotonic() - self._last_activity) * 1000 >= self.quiet_ms
+
+
+class WaitForVisualStable(ReadyCondition):
+    """等待页面画面不再变化：连续两次低质量截图完全相同"""
+
+    def __init__(self, interval_ms: int = 250):
+        self.interval = interval_ms / 1000
+        self._previous = None
+
+    def attach(self, page):
+        self._previous = None
+
+    def probe(self, page):
+        # 低质量 JPEG 只用来比较，编码很快
+        return page.screenshot(type="jpeg", quality=20)
+
+    def is_ready(self, value) -> bool:
+        digest = hashlib.md5(value).digest()
+        stable = digest == self._previous
+        self._previous = digest
+        return stable
+
+
+class Sleep(ReadyCondition):
+    """固定等待（兼容旧行为）"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self._started = 0.0
+
+    def attach(self, page):
+        self._started = time.monotonic()
+
+    def is_ready(self, value) -> bool:
+        return time.monotonic() - self._started >= self.seconds
+
+
+# 默认条件：load 事件完成且 500ms 内没有网络活动
+DEFAULT_READY = (WaitForLoadState("load"), WaitForNetworkQuiet(500))
+
+# 等待两帧渲染，代替截图前的固定 sleep
+NEXT_FRAME_SCRIPT = "() => new Promise(r => requestAnimationFrame(() => requestAnimationFrame(r)))"
+
+
+def parse_ready(spec: str) -> ReadyCondition:
+    """
+    解析命令行中的就绪条件
+
+    支持的写法:
+        selector:<css>        等待元素出现
+        load                  等待 load 事件
+        domcontentloaded      等待 DOMContentLoaded
+        viewport-images       等待视口内图片加载完成
+        network-quiet[:ms]    等待网络安静（默认 500ms）
+        visual-stable[:ms]    等待画面稳定（默认每 250ms 比较一次）
+        sleep:<秒>            固定等待
+    """
+    name, _, arg = spec.partition(":")
+    name = name.strip().lower()
+
+    if name == "selector" and arg:
+        return WaitForSelector(arg)
+    if name in ("load", "domcontentloaded"):
+        return WaitForLoadState(name)
+    if name == "viewport-images":
+        return WaitForViewportImages()
+    if name == "network-quiet":
+        return WaitForNetworkQuiet(int(arg) if arg else 500)
+    if name == "visual-stable":
+        return WaitForVisualStable(int(arg) if arg else 250)
+    if name == "sleep" and arg:
+        return Sleep(float(arg))
+    raise ValueError(f"无法识别的就绪条件: {spec}")
+
+
+def _prepare(page, conditions: Optional[Sequence[ReadyCondition]]) -> List[ReadyCondition]:
+    """复制条件（条件带有状态，并发的页面不能共用）并注册到页面"""
+    prepared = [copy.copy(c) for c in (DEFAULT_READY if conditions is None else conditions)]
+    for condition in prepared:
+        condition.attach(page)
+    return prepared
+
+
+def wait_until_ready(page, conditions: Optional[Sequence[ReadyCondition]] = None, timeout: float = 10) -> bool:
+    """
+    依次等待所有条件满足（同步 API）
+
+    Args:
+        page: playwright.sync_api 的 Page
+        conditions: 就绪条件，None 表示 DEFAULT_READY
+        timeout: 所有条件共用的总时限（秒）
+
+    Returns:
+        是否在时限内就绪；超时不抛异常，由调用方决定是否照常截图
+    """
+    deadline = time.monotonic() + timeout
+    for condition in _prepare(page, conditions):
+        while not condition.is_ready(condition.probe(page)):
+            if time.monotonic() >= deadline:
+                return False
+            # 同步 API 只在调用 Playwright 时分发页面事件，不能用 time.sleep
+            page.wait_for_timeout(condition.interval * 1000)
+    return True
+
+
+async def wait_until_ready_async(page, conditions: Optional[Sequence[ReadyCondition]] = None, timeout: float = 10) -> bool:
+    """依次等待所有条件满足（异步 API），参数和返回值同 wait_until_ready"""
+    deadline = time.monotonic() + timeout
+    for condition in _prepare(page, conditions):
+        while True:
+            value = condition.probe(page)
+            if inspect.isawaitable(value):
+                value = await value
+            if condition.is_ready(value):
+                break
+            if time.monotonic() >= deadline:
+                return False
+            await page.wait_for_timeout(condition.interval * 1000)
+    return True
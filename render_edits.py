@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+批量套用编辑规格的命令行工具
+把界面导出的编辑规格（edit_spec.py）套用到一批图片上，多进程并行处理，
+每处理完一张就向标准输出写一行 JSON 结果
+
+用法:
+    python render_edits.py edit_spec.json screenshots/ -o edited
+    python render_edits.py edit_spec.json a.png b.png -o edited --workers 4 --format jpeg
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Optional, Tuple
+import argparse
+import json
+import os
+import sys
+import time
+
+from PIL import Image
+
+from edit_spec import EditSpec
+
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".webp")
+
+# 工作进程中的编辑规格，进程启动时读取一次
+_spec: Optional[EditSpec] = None
+
+
+def collect_inputs(paths: List[str], output_dir: Path, recursive: bool = False) -> List[Tuple[Path, Path]]:
+    """
+    列出要处理的图片和对应的输出路径
+
+    目录中的图片保持相对于该目录的路径，单独指定的文件直接放在输出目录下。
+    """
+    jobs = []
+    for name in paths:
+        path = Path(name)
+        if path.is_dir():
+            pattern = "**/*" if recursive else "*"
+            for source in sorted(path.glob(pattern)):
+                if source.is_file() and source.suffix.lower() in IMAGE_EXTENSIONS:
+                    jobs.append((source, output_dir / source.relative_to(path)))
+        else:
+            jobs.append((path, output_dir / path.name))
+    return jobs
+
+
+def _init_worker(spec_data: dict):
+    global _spec
+    _spec = EditSpec.from_dict(spec_data)
+
+
+def render_one(source: str, target: str, image_format: Optional[str] = None, quality: int = 95) -> dict:
+    """
+    在工作进程中处理一张图片
+
+    Returns:
+        结果记录 {"input", "output", "ok", "seconds", "edit_seconds", "error"}
+    """
+    started = time.perf_counter()
+    record = {"input": source, "output": target, "ok": False}
+    try:
+        with Image.open(source) as opened:
+            opened.load()
+            image = opened
+        result, timings = _spec.apply(image)
+
+        target_path = Path(target)
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        if (image_format or target_path.suffix.lower().lstrip(".")) in ("jpg", "jpeg"):
+            if result.mode not in ("RGB", "L"):
+                result = result.convert("RGB")
+            result.save(target_path, "JPEG", quality=quality)
+        else:
+            # 其余格式按目标文件的扩展名保存（.png、.webp、.bmp 等）
+            result.save(target_path)
+
+        record.update(ok=True, width=result.width, height=result.height,
+                      edit_seconds=[round(t, 4) for t in timings])
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["seconds"] = round(time.perf_counter() - started, 4)
+    return record
+
+
+def run(spec: EditSpec, jobs: List[Tuple[Path, Path]], args) -> int:
+    """并行处理所有图片，逐行输出结果，返回失败数"""
+    workers = args.workers or os.cpu_count() or 1
+    suffix = {"png": ".png", "jpeg": ".jpg"}.get(args.format)
+    manifest = open(args.manifest, "a", encoding="utf-8") if args.manifest else sys.stdout
+    failed = 0
+    started = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(spec.as_dict(),)) as pool:
+            futures = [
+                pool.submit(render_one, str(source), str(target.with_suffix(suffix) if suffix else target),
+                            args.format, args.quality)
+                for source, target in jobs
+            ]
+            for done, future in enumerate(as_completed(futures), 1):
+                record = future.result()
+                if not record["ok"]:
+                    failed += 1
+                manifest.write(json.dumps(record, ensure_ascii=False) + "\n")
+                manifest.flush()
+                status = "完成" if record["ok"] else f"失败: {record['error']}"
+                print(f"[{done}/{len(jobs)}] {record['input']} {status}", file=sys.stderr)
+    finally:
+        if manifest is not sys.stdout:
+            manifest.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"完成 {len(jobs)} 张，失败 {failed} 张，用时 {elapsed:.1f} 秒（{workers} 个进程）", file=sys.stderr)
+    return failed
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="把编辑规格批量套用到图片上")
+    parser.add_argument("spec", help="编辑规格 JSON（界面中导出）")
+    parser.add_argument("inputs", nargs="+", help="图片文件或目录")
+    parser.add_argument("-o", "--output-dir", default="edited", help="输出目录")
+    parser.add_argument("-r", "--recursive", action="store_true", help="包含子目录中的图片")
+    parser.add_argument("--workers", type=int, help="进程数，默认等于 CPU 核数")
+    parser.add_argument("--format", choices=["png", "jpeg"], help="输出格式，默认与输入相同")
+    parser.add_argument("--quality", type=int, default=95, help="JPEG 质量 (1-100)")
+    parser.add_argument("--manifest", help="结果追加写入该文件（JSONL），默认输出到标准输出")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        spec = EditSpec.load(args.spec)
+    except (OSError, ValueError) as e:
+        print(f"无法读取编辑规格: {e}", file=sys.stderr)
+        return 2
+
+    jobs = collect_inputs(args.inputs, Path(args.output_dir), args.recursive)
+    if not jobs:
+        print("没有找到要处理的图片", file=sys.stderr)
+        return 1
+
+    failed = run(spec, jobs, args)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
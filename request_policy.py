@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+请求拦截策略模块
+截图时拦截视频、统计埋点、第三方跟踪等不影响画面的请求，减少页面流量
+
+策略通过 context.route 安装，同一个处理函数同时适用于 sync_api 和 async_api：
+异步 API 会自动 await 处理函数返回的协程。放行的请求通过 route.fallback() 交给
+之前安装的处理函数（如 asset_cache 的静态资源缓存），没有时正常发出。
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+
+# 常见统计 / 广告 / 跟踪域名
+TRACKER_DOMAINS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "hm.baidu.com",
+    "cnzz.com",
+    "mercury.jd.com",
+)
+
+# 埋点上报地址中常见的片段，命中时返回空响应而不是中断请求，避免页面脚本报错重试
+BEACON_PATTERNS = (
+    "/log.gif",
+    "/beacon",
+    "/collect?",
+)
+
+# 静态资源缓存命中时在响应上加的头，watch_requests 据此区分缓存和网络流量
+CACHE_HIT_HEADER = "x-asset-cache"
+
+
+@dataclass
+class RequestStats:
+    """单次截图的请求统计"""
+    total: int = 0
+    blocked: int = 0
+    stubbed: int = 0
+    loaded_bytes: int = 0
+    cache_hits: int = 0
+    cache_bytes: int = 0
+    blocked_by: Dict[str, int] = field(default_factory=dict)
+
+    def as_dict(self) -> dict:
+        return {
+            "total": self.total,
+            "blocked": self.blocked,
+            "stubbed": self.stubbed,
+            "loaded_bytes": self.loaded_bytes,
+            "cache_hits": self.cache_hits,
+            "cache_bytes": self.cache_bytes,
+            "blocked_by": dict(self.blocked_by),
+        }
+
+
+def _domain_matches(host: str, domains) -> bool:
+    """host 等于某个域名或是它的子域名"""
+    return any(host == d or host.endswith("." + d) for d in domains)
+
+
+class RequestPolicy:
+    """
+    请求拦截策略
+
+    判断顺序：主文档始终放行 → 埋点返回空响应 → 拒绝域名 → 允许域名白名单 → 资源类型。
+    """
+
+    def __init__(
+        self,
+        block_types: Iterable[str] = ("media",),
+        deny_domains: Iterable[str] = (),
+        allow_domains: Optional[Iterable[str]] = None,
+        stub_patterns: Iterable[str] = ()
+    ):
+        """
+        Args:
+            block_types: 拦截的资源类型（Playwright 的 resource_type，如 media、font、image）
+            deny_domains: 拦截的域名（包含子域名）
+            allow_domains: 白名单，设置后只放行这些域名（包含子域名）
+            stub_patterns: URL 包含这些片段时返回 204 空响应
+        """
+        self.block_types = frozenset(block_types)
+        self.deny_domains = tuple(deny_domains)
+        self.allow_domains = None if allow_domains is None else tuple(allow_domains)
+        self.stub_patterns = tuple(stub_patterns)
+
+    @classmethod
+    def default(cls) -> "RequestPolicy":
+        """默认策略：拦截视频和常见跟踪域名，埋点返回空响应"""
+        return cls(
+            block_types=("media",),
+            deny_domains=TRACKER_DOMAINS,
+            stub_patterns=BEACON_PATTERNS
+        )
+
+    def decide(self, url: str, resource_type: str) -> str:
+        """
+        判断如何处理一个请求
+
+        Returns:
+            "continue"、"stub" 或 "block:<原因>"
+        """
+        if resource_type == "document":
+            return "continue"
+        if any(p in url for p in self.stub_patterns):
+            return "stub"
+
+        host = (urlsplit(url).hostname or "").lower()
+        if _domain_matches(host, self.deny_domains):
+            return "block:domain"
+        if self.allow_domains is not None and not _domain_matches(host, self.allow_domains):
+            return "block:not-allowed"
+        if resource_type in self.block_types:
+            return f"block:{resource_type}"
+        return "continue"
+
+    def install(self, context, stats: RequestStats):
+        """
+        在浏览器上下文上安装拦截规则
+
+        请求总数和加载字节数由 watch_requests 统计，这里只记录拦截和空响应的数量。
+
+        Args:
+            context: sync_api 或 async_api 的 BrowserContext 或 Page
+            stats: 请求统计，截图过程中持续更新
+
+        Returns:
+            context.route 的返回值，异步 API 下是协程，调用方需要 await
+        """
+        def handle(route):
+            request = route.request
+            action = self.decide(request.url, request.resource_type)
+            if action == "continue":
+                return route.fallback()
+            if action == "stub":
+                stats.stubbed += 1
+                return route.fulfill(status=204, body="")
+            reason = action.split(":", 1)[1]
+            stats.blocked += 1
+            stats.blocked_by[reason] = stats.blocked_by.get(reason, 0) + 1
+            return route.abort("blockedbyclient")
+
+        return context.route("**/*", handle)
+
+
+def watch_requests(context, stats: RequestStats):
+    """
+    统计上下文（或单个页面）发出的请求数和响应字节数（不需要拦截策略，sync_api / async_api 通用）
+
+    字节数取自响应头 content-length，没有该头（如分块传输）的响应不计入；
+    静态资源缓存返回的响应计入 cache_hits / cache_bytes，不计入 loaded_bytes。
+    """
+    def on_request(_request):
+        stats.total += 1
+
+    def on_response(response):
+        # 只读响应头，不额外请求响应体
+        headers = response.headers
+        length = headers.get("content-length")
+        size = int(length) if length and length.isdigit() else 0
+        if CACHE_HIT_HEADER in headers:
+            stats.cache_hits += 1
+            stats.cache_bytes += size
+        else:
+            stats.loaded_bytes += size
+
+    context.on("request", on_request)
+    context.on("response", on_response)
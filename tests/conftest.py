@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""测试时从仓库根目录导入各模块"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""静态资源缓存：可缓存规则和异步 API 下的处理函数"""
+
+import asyncio
+import threading
+
+from asset_cache import AssetCache
+from request_policy import CACHE_HIT_HEADER
+
+
+def test_put_and_get(tmp_path):
+    cache = AssetCache(str(tmp_path))
+    headers = {"content-type": "text/css", "content-encoding": "gzip", "vary": "Accept-Encoding"}
+    assert cache.put("https://static.jd.com/a.css", 200, headers, b"body{}")
+
+    cached = cache.get("https://static.jd.com/a.css")
+    assert cached["body"] == b"body{}"
+    assert "content-encoding" not in cached["headers"]
+    assert cache.stats()["hits"] == 1
+
+
+def test_uncacheable_responses(tmp_path):
+    cache = AssetCache(str(tmp_path))
+    url = "https://static.jd.com/a.js"
+    assert not cache.put(url, 404, {}, b"")
+    assert not cache.put(url, 200, {"cache-control": "no-store"}, b"x")
+    assert not cache.put(url, 200, {"vary": "Accept-Encoding, User-Agent"}, b"x")
+    assert not cache.put(url, 200, {"vary": "*"}, b"x")
+    assert cache.get(url) is None
+
+
+class _Request:
+    def __init__(self, url):
+        self.url = url
+        self.method = "GET"
+        self.resource_type = "stylesheet"
+
+
+class _Response:
+    status = 200
+    headers = {"content-type": "text/css"}
+
+    async def body(self):
+        return b"body{}"
+
+
+class _AsyncRoute:
+    def __init__(self, url):
+        self.request = _Request(url)
+        self.fulfilled = None
+
+    async def fetch(self):
+        return _Response()
+
+    async def fallback(self):
+        self.fulfilled = "fallback"
+
+    async def fulfill(self, **kwargs):
+        self.fulfilled = kwargs
+
+
+class _AsyncContext:
+    def route(self, pattern, handler):
+        self.handler = handler
+
+
+def test_async_handler_reads_and_writes_off_the_event_loop(tmp_path, monkeypatch):
+    cache = AssetCache(str(tmp_path))
+    context = _AsyncContext()
+    cache.install(context)
+
+    threads = []
+    for name in ("get", "put"):
+        original = getattr(cache, name)
+
+        def record(*args, _original=original):
+            threads.append(threading.current_thread())
+            return _original(*args)
+
+        monkeypatch.setattr(cache, name, record)
+
+    async def run():
+        miss, hit = _AsyncRoute("https://static.jd.com/a.css"), _AsyncRoute("https://static.jd.com/a.css")
+        await context.handler(miss)
+        await context.handler(hit)
+        return miss, hit
+
+    miss, hit = asyncio.run(run())
+    assert miss.fulfilled["body"] == b"body{}"
+    assert hit.fulfilled["body"] == b"body{}"
+    assert hit.fulfilled["headers"][CACHE_HIT_HEADER] == "1"
+    assert len(threads) == 3
+    assert threading.main_thread() not in threads
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""截图缓存：缓存键、TTL 和容量淘汰"""
+
+import os
+import time
+
+from capture_cache import CaptureCache
+from readiness import parse_ready
+
+
+def test_key_ignores_option_order():
+    a = CaptureCache.key("https://item.jd.com/1.html", width=1920, height=1080, full_page=False)
+    b = CaptureCache.key("https://item.jd.com/1.html", full_page=False, height=1080, width=1920)
+    assert a == b
+
+
+def test_key_changes_with_url_and_options():
+    base = CaptureCache.key("https://item.jd.com/1.html", width=1920, full_page=False)
+    assert CaptureCache.key("https://item.jd.com/2.html", width=1920, full_page=False) != base
+    assert CaptureCache.key("https://item.jd.com/1.html", width=1280, full_page=False) != base
+    assert CaptureCache.key("https://item.jd.com/1.html", width=1920, full_page=True) != base
+
+
+def test_key_describes_objects_by_public_attributes():
+    a = CaptureCache.key("https://item.jd.com/1.html", ready=[parse_ready("selector:.price")])
+    b = CaptureCache.key("https://item.jd.com/1.html", ready=[parse_ready("selector:.price")])
+    c = CaptureCache.key("https://item.jd.com/1.html", ready=[parse_ready("selector:.title")])
+    assert a == b
+    assert a != c
+
+
+def test_put_and_fetch(tmp_path):
+    cache = CaptureCache(str(tmp_path / "cache"))
+    key = CaptureCache.key("https://item.jd.com/1.html")
+    cache.put_bytes(key, b"png-data", "https://item.jd.com/1.html")
+
+    output = tmp_path / "out.png"
+    assert cache.fetch(key, str(output))
+    assert output.read_bytes() == b"png-data"
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_expired_entry_is_a_miss(tmp_path):
+    cache = CaptureCache(str(tmp_path / "cache"), ttl=60)
+    key = CaptureCache.key("https://item.jd.com/1.html")
+    cache.put_bytes(key, b"png-data", "https://item.jd.com/1.html")
+
+    meta_path = cache.cache_dir / f"{key}.json"
+    meta_path.write_text('{"url": "https://item.jd.com/1.html", "created": %f}' % (time.time() - 120))
+    assert cache.get(key) is None
+    assert cache.misses == 1
+    assert not (cache.cache_dir / f"{key}.png").exists()
+
+
+def test_evict_removes_least_recently_used(tmp_path):
+    cache = CaptureCache(str(tmp_path / "cache"), max_bytes=250)
+    keys = [CaptureCache.key(f"https://item.jd.com/{i}.html") for i in range(3)]
+    now = time.time()
+    for i, key in enumerate(keys[:2]):
+        path = cache.put_bytes(key, b"x" * 100, "url")
+        os.utime(path, (now - 10 + i, now - 10 + i))
+
+    # 第三个条目超出容量，最久未访问的第一个被淘汰
+    cache.put_bytes(keys[2], b"x" * 100, "url")
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[1]) is not None
+    assert cache.get(keys[2]) is not None
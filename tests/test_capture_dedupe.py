@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""截图去重：指纹、变化区域和按 URL 比较"""
+
+import json
+import os
+
+import pytest
+from PIL import Image, ImageDraw
+
+import capture_dedupe
+from capture_dedupe import DedupeStore, diff_regions, fingerprint, hash_distance
+
+
+def _page(*boxes, size=(320, 240)):
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, size[0], 30), fill=(30, 60, 120))
+    for box in boxes:
+        draw.rectangle(box, fill="red")
+    return image
+
+
+def test_fingerprint_ignores_encoding(tmp_path):
+    image = _page()
+    image.save(tmp_path / "fast.png", compress_level=1)
+    image.save(tmp_path / "small.png", compress_level=9)
+    a, b = fingerprint(tmp_path / "fast.png"), fingerprint(tmp_path / "small.png")
+    assert a == b
+    assert (a.width, a.height) == (320, 240)
+    assert fingerprint(_page((10, 100, 20, 110))).sha256 != a.sha256
+
+
+def test_hash_distance():
+    assert hash_distance("00ff", "00ff") == 0
+    assert hash_distance("0000", "000f") == 4 / 16
+    assert hash_distance("00", "0000") == 1.0
+    small_change = fingerprint(_page((100, 100, 104, 104))).phash
+    assert hash_distance(fingerprint(_page()).phash, small_change) <= 0.05
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_diff_regions(monkeypatch, use_numpy):
+    if not use_numpy:
+        monkeypatch.setattr(capture_dedupe, "np", None)
+    elif capture_dedupe.np is None:
+        pytest.skip("numpy 未安装")
+
+    before = _page()
+    after = _page((40, 60, 50, 70), (200, 180, 230, 200))
+    assert diff_regions(before, before) == []
+    regions = diff_regions(before, after, cell=16)
+    if use_numpy:
+        assert regions == [(32, 48, 64, 80), (192, 176, 240, 208)]
+    else:
+        # 没有 numpy 时只给出包含所有变化的一个矩形
+        assert regions == [(40, 60, 231, 201)]
+
+
+def test_diff_regions_ignores_small_differences():
+    before = _page()
+    after = before.point(lambda v: min(255, v + 8))
+    assert diff_regions(before, after, tolerance=16) == []
+
+
+def test_diff_regions_reports_extra_height():
+    regions = diff_regions(_page(size=(320, 240)), _page(size=(320, 300)))
+    assert regions == [(0, 240, 320, 300)]
+
+
+def test_store_statuses(tmp_path):
+    store = DedupeStore(str(tmp_path / "index"))
+    url = "https://item.jd.com/1.html"
+
+    def capture(run, image):
+        path = tmp_path / run / "page.png"
+        path.parent.mkdir()
+        image.save(path)
+        return path
+
+    first = capture("run1", _page())
+    assert store.check(url, first).status == "new"
+
+    same = capture("run2", _page())
+    result = store.check(url, same)
+    assert (result.status, result.linked, result.reference) == ("identical", True, str(first.absolute()))
+    assert os.path.samefile(first, same)
+
+    small = capture("run3", _page((100, 100, 104, 104)))
+    result = store.check(url, small)
+    assert result.status == "near-duplicate"
+    assert result.regions == [(96, 96, 112, 112)]
+
+    redesign = Image.new("RGB", (320, 240), "white")
+    draw = ImageDraw.Draw(redesign)
+    for x in range(0, 320, 40):
+        draw.rectangle((x, 0, x + 19, 240), fill="black")
+    big = capture("run4", redesign)
+    result = store.check(url, big)
+    assert result.status == "changed"
+    assert result.reference == str(small.absolute())
+
+    record = json.loads((big.parent / "page.png.hash.json").read_text(encoding="utf-8"))
+    assert record["status"] == "changed"
+    assert store.previous(url)["path"] == str(big.absolute())
+
+
+def test_store_warns_when_reference_was_overwritten(tmp_path, capsys):
+    store = DedupeStore(str(tmp_path / "index"))
+    path = tmp_path / "page.png"
+    _page().save(path)
+    store.check("https://item.jd.com/1.html", path)
+
+    _page((100, 100, 140, 140)).save(path)
+    result = store.check("https://item.jd.com/1.html", path)
+    assert result.status in ("near-duplicate", "changed")
+    assert result.regions == []
+    assert "覆盖了上一次的截图" in capsys.readouterr().out
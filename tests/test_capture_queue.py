@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""SQLite 任务队列：领取、租约过期、失败重试和 run_job 参数"""
+
+import sys
+import types
+
+import pytest
+
+from capture_queue import CaptureQueue, Job, run_job
+
+
+@pytest.fixture
+def queue(tmp_path):
+    with CaptureQueue(str(tmp_path / "queue.db")) as q:
+        yield q
+
+
+def test_claim_in_order_and_only_once(queue):
+    first = queue.enqueue("https://item.jd.com/1.html", "out/1.png", {"full_page": True})
+    second = queue.enqueue("https://item.jd.com/2.html", "out/2.png")
+
+    job = queue.claim("w1")
+    assert (job.id, job.status, job.attempts, job.worker) == (first, "running", 1, "w1")
+    assert job.options == {"full_page": True}
+    assert queue.claim("w2").id == second
+    assert queue.claim("w3") is None
+
+
+def test_complete_only_by_lease_holder(queue):
+    job_id = queue.enqueue("https://item.jd.com/1.html", "out/1.png")
+    queue.claim("w1")
+    assert not queue.complete(job_id, "w2")
+    assert queue.renew(job_id, "w1")
+    assert queue.complete(job_id, "w1", {"output_path": "out/1.png"})
+    assert queue.counts()["done"] == 1
+    assert not queue.renew(job_id, "w1")
+
+
+def test_expired_lease_is_taken_over(queue):
+    job_id = queue.enqueue("https://item.jd.com/1.html", "out/1.png")
+    queue.lease_seconds = -1
+    queue.claim("w1")
+
+    # w1 的租约已过期，w2 领取时任务回到等待并被接手
+    queue.lease_seconds = 120
+    job = queue.claim("w2")
+    assert (job.id, job.worker, job.attempts) == (job_id, "w2", 2)
+    assert not queue.renew(job_id, "w1")
+    assert not queue.complete(job_id, "w1")
+    assert queue.complete(job_id, "w2")
+
+
+def test_expired_lease_after_last_attempt_fails(queue):
+    job_id = queue.enqueue("https://item.jd.com/1.html", "out/1.png", max_attempts=1)
+    queue.lease_seconds = -1
+    queue.claim("w1")
+
+    assert queue.claim("w2") is None
+    assert queue.counts()["failed"] == 1
+    assert queue.fail(job_id, "w1", "too late") is None
+
+
+def test_fail_retries_until_max_attempts(queue):
+    job_id = queue.enqueue("https://item.jd.com/1.html", "out/1.png", max_attempts=2)
+    queue.claim("w1")
+    assert queue.fail(job_id, "w1", "timeout") == "pending"
+    job = queue.claim("w1")
+    assert (job.attempts, job.error) == (2, "timeout")
+    assert queue.fail(job_id, "w1", "timeout") == "failed"
+    assert queue.claim("w1") is None
+
+    assert queue.retry_failed() == 1
+    job = queue.claim("w1")
+    assert (job.id, job.attempts, job.error) == (job_id, 1, None)
+
+
+def test_run_job_prefers_job_profile(tmp_path, monkeypatch):
+    calls = []
+
+    class Metrics:
+        def as_dict(self):
+            return {}
+
+    def capture(url, output_path, **kwargs):
+        calls.append(kwargs)
+        return output_path, Metrics()
+
+    fake = types.ModuleType("browser_screenshot")
+    fake.take_jd_screenshot = fake.take_screenshot_with_scroll = capture
+    monkeypatch.setitem(sys.modules, "browser_screenshot", fake)
+
+    output = str(tmp_path / "out" / "1.png")
+    job = Job(1, "https://item.jd.com/1.html", output, {"profile": "low-memory", "width": 800}, "running", 1, 3)
+    assert run_job(job, None, "default")["output_path"] == output
+    job = Job(2, "https://item.jd.com/2.html", output, {"full_page": True, "height": 600}, "running", 1, 3)
+    run_job(job, None, "default")
+
+    assert calls[0]["profile"] == "low-memory"
+    assert calls[0]["width"] == 800
+    assert calls[1]["profile"] == "default"
+    assert "height" not in calls[1]
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""编辑规格：版本校验、字段校验和 JSON 往返"""
+
+import json
+
+import pytest
+from PIL import Image, ImageChops
+
+from edit_spec import SPEC_VERSION, EditSpec, WatermarkSettings
+from image_editor import RegionEdit
+
+
+def _spec_data(**overrides):
+    data = {
+        "version": 1,
+        "edits": [{"x": 10, "y": 20, "width": 100, "height": 30, "text": "¥999.00"}],
+        "watermark": {"text": "内部", "position": "center", "opacity": 100},
+    }
+    data.update(overrides)
+    return data
+
+
+def test_from_dict_fills_defaults():
+    spec = EditSpec.from_dict(_spec_data())
+    assert spec.version == 1
+    assert spec.edits == [RegionEdit(10, 20, 100, 30, "¥999.00")]
+    assert spec.watermark == WatermarkSettings("内部", "center", 100)
+
+
+@pytest.mark.parametrize("version", [None, 0, -1, "1", 1.0, True])
+def test_rejects_missing_or_invalid_version(version):
+    data = _spec_data(version=version)
+    if version is None:
+        del data["version"]
+    with pytest.raises(ValueError, match="version"):
+        EditSpec.from_dict(data)
+
+
+def test_rejects_newer_version():
+    with pytest.raises(ValueError, match="不支持的编辑规格版本"):
+        EditSpec.from_dict(_spec_data(version=SPEC_VERSION + 1))
+
+
+@pytest.mark.parametrize("edit, message", [
+    ({"x": 1, "y": 2, "width": 3, "height": 4}, "缺少字段: text"),
+    ({"x": "1", "y": 2, "width": 3, "height": 4, "text": "a"}, "edits\\[0\\].x"),
+    ({"x": 1, "y": 2, "width": 0, "height": 4, "text": "a"}, "大于 0"),
+    ({"x": 1, "y": 2, "width": 3, "height": 4, "text": 5}, "edits\\[0\\].text"),
+])
+def test_rejects_invalid_edits(edit, message):
+    with pytest.raises(ValueError, match=message):
+        EditSpec.from_dict(_spec_data(edits=[edit]))
+
+
+@pytest.mark.parametrize("watermark", [
+    {"position": "middle"},
+    {"opacity": 300},
+    {"opacity": True},
+    "top-left",
+])
+def test_rejects_invalid_watermark(watermark):
+    with pytest.raises(ValueError):
+        EditSpec.from_dict(_spec_data(watermark=watermark))
+
+
+def test_save_and_load_round_trip(tmp_path):
+    spec = EditSpec.from_dict(_spec_data(watermark=None))
+    path = tmp_path / "spec.json"
+    spec.save(path)
+
+    assert json.loads(path.read_text(encoding="utf-8"))["version"] == SPEC_VERSION
+    assert EditSpec.load(path) == spec
+
+
+def test_load_rejects_invalid_json(tmp_path):
+    path = tmp_path / "spec.json"
+    path.write_text("{not json", encoding="utf-8")
+    with pytest.raises(ValueError, match="JSON"):
+        EditSpec.load(path)
+
+
+def test_apply_edits_regions_and_adds_watermark():
+    source = Image.new("RGB", (400, 200), "white")
+    spec = EditSpec.from_dict(_spec_data(edits=[
+        {"x": 10, "y": 20, "width": 100, "height": 30, "text": "¥999.00", "bg_color": "yellow"},
+        {"x": 200, "y": 120, "width": 80, "height": 40, "text": "新品", "bg_color": "black"},
+    ]))
+    result, timings = spec.apply(source)
+
+    assert result.size == source.size
+    assert len(timings) == len(spec.edits)
+    assert result.getpixel((12, 22)) == (255, 255, 0)
+    assert result.getpixel((202, 122)) == (0, 0, 0)
+    assert source.getpixel((12, 22)) == (255, 255, 255)
+
+    # 水印改动了两处修改以外的像素
+    without_watermark, _ = EditSpec(edits=spec.edits).apply(source)
+    assert ImageChops.difference(result, without_watermark).getbbox() is not None
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""字体索引：cmap 格式 4 / 12 解析、字体文件读取和按字符选择字体"""
+
+import struct
+
+from font_index import FontEntry, FontIndex, parse_cmap, read_font_faces
+
+
+def _format4(segments):
+    """
+    构造 cmap 格式 4 子表
+
+    segments: [(start, end, glyphs)]，glyphs 为 None 时用 idDelta 映射（全部覆盖），
+    否则为该区段每个字符的字形编号（0 表示不覆盖），通过 glyphIdArray 映射
+    """
+    segments = list(segments) + [(0xFFFF, 0xFFFF, None)]
+    seg_count = len(segments)
+    glyph_array = []
+    range_offsets = []
+    for i, (_, _, glyphs) in enumerate(segments):
+        if glyphs is None:
+            range_offsets.append(0)
+        else:
+            range_offsets.append((seg_count - i + len(glyph_array)) * 2)
+            glyph_array.extend(glyphs)
+
+    body = struct.pack(f">{seg_count}H", *(end for _, end, _ in segments)) + b"\0\0"
+    body += struct.pack(f">{seg_count}H", *(start for start, _, _ in segments))
+    body += struct.pack(f">{seg_count}h", *([1] * seg_count))
+    body += struct.pack(f">{seg_count}H", *range_offsets)
+    body += struct.pack(f">{len(glyph_array)}H", *glyph_array)
+    header = struct.pack(">HHHHHHH", 4, 14 + len(body), 0, seg_count * 2, 0, 0, 0)
+    return header + body
+
+
+def _format12(groups):
+    body = b"".join(struct.pack(">III", start, end, 1) for start, end in groups)
+    return struct.pack(">HHIII", 12, 0, 16 + len(body), 0, len(groups)) + body
+
+
+def _cmap(subtables):
+    """subtables: [((platform_id, encoding_id), 子表数据)]"""
+    offset = 4 + len(subtables) * 8
+    records, data = b"", b""
+    for (platform_id, encoding_id), table in subtables:
+        records += struct.pack(">HHI", platform_id, encoding_id, offset + len(data))
+        data += table
+    return struct.pack(">HH", 0, len(subtables)) + records + data
+
+
+def _font_file(path, cmap, outline=b"glyf"):
+    """写一个只有表目录、轮廓表占位和 cmap 表的字体文件"""
+    tables = [(outline, b"\0" * 4), (b"cmap", cmap)]
+    offset = 12 + len(tables) * 16
+    directory, data = b"", b""
+    for tag, table in tables:
+        directory += struct.pack(">4sIII", tag, 0, offset + len(data), len(table))
+        data += table
+    path.write_bytes(struct.pack(">IHHHH", 0x00010000, len(tables), 0, 0, 0) + directory + data)
+
+
+def test_format4_delta_segments():
+    cmap = _cmap([((3, 1), _format4([(0x20, 0x7E, None), (0x4E00, 0x4E10, None)]))])
+    assert parse_cmap(cmap) == [(0x20, 0x7E), (0x4E00, 0x4E10)]
+
+
+def test_format4_glyph_array_skips_notdef():
+    cmap = _cmap([((3, 1), _format4([(0x41, 0x45, [5, 0, 7, 8, 0]), (0x61, 0x62, None)]))])
+    assert parse_cmap(cmap) == [(0x41, 0x41), (0x43, 0x44), (0x61, 0x62)]
+
+
+def test_format4_merges_adjacent_segments():
+    cmap = _cmap([((3, 1), _format4([(0x30, 0x39, None), (0x3A, 0x40, None)]))])
+    assert parse_cmap(cmap) == [(0x30, 0x40)]
+
+
+def test_format12_preferred_over_format4():
+    cmap = _cmap([
+        ((3, 1), _format4([(0x20, 0x7E, None)])),
+        ((3, 10), _format12([(0x20, 0x7E), (0x1F600, 0x1F64F), (0x7F, 0xFF)])),
+    ])
+    assert parse_cmap(cmap) == [(0x20, 0xFF), (0x1F600, 0x1F64F)]
+
+
+def test_unsupported_subtables_give_no_ranges():
+    assert parse_cmap(_cmap([((1, 0), _format4([(0x20, 0x7E, None)]))])) == []
+
+
+def test_read_font_faces(tmp_path):
+    font = tmp_path / "test.ttf"
+    _font_file(font, _cmap([((3, 1), _format4([(0x20, 0x7E, None)]))]))
+    assert read_font_faces(str(font)) == [{"index": 0, "ranges": [[0x20, 0x7E]]}]
+
+    # 没有轮廓表（只有位图）的字体跳过
+    bitmap = tmp_path / "bitmap.ttf"
+    _font_file(bitmap, _cmap([((3, 1), _format4([(0x20, 0x7E, None)]))]), outline=b"CBDT")
+    assert read_font_faces(str(bitmap)) == []
+
+
+def test_build_save_and_load(tmp_path):
+    fonts = tmp_path / "fonts"
+    fonts.mkdir()
+    _font_file(fonts / "latin.ttf", _cmap([((3, 1), _format4([(0x20, 0x7E, None)]))]))
+    (fonts / "broken.ttf").write_bytes(b"not a font")
+
+    index = FontIndex.build([str(fonts)])
+    assert [entry.path for entry in index.fonts] == [str(fonts / "latin.ttf")]
+    assert not index.is_stale([str(fonts)])
+
+    index_path = tmp_path / "index.json"
+    index.save(str(index_path))
+    loaded = FontIndex.load(str(index_path))
+    assert [entry.as_dict() for entry in loaded.fonts] == [entry.as_dict() for entry in index.fonts]
+
+
+def test_font_order_and_runs():
+    latin = FontEntry("latin.ttf", 0, [(0x20, 0x7E)])
+    cjk = FontEntry("cjk.ttf", 0, [(0x20, 0x7E), (0x4E00, 0x9FFF)])
+    symbols = FontEntry("symbols.ttf", 0, [(0xF000, 0xF2FF)])
+    index = FontIndex([symbols, latin, cjk])
+
+    # 中文覆盖多的在前，覆盖拉丁字母的排在纯符号字体之前
+    assert [entry.path for entry in index.fonts] == ["cjk.ttf", "latin.ttf", "symbols.ttf"]
+    assert FontIndex([symbols, latin, cjk], preferred=["latin.ttf"]).primary is latin
+
+    # 空白和没有字体覆盖的字符（¥）跟随前一个片段
+    runs = index.split_runs("价格 \uf000\uf001 ¥")
+    assert runs == [(cjk, "价格 "), (symbols, "\uf000\uf001 ¥")]
+    assert index.fallback_chain("价格 \uf000") == [cjk, symbols]
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""可就地编辑的工作图片：写时复制、撤销、脏矩形和增量预览"""
+
+from PIL import Image, ImageChops, ImageDraw
+
+from image_editor import RegionEdit, WorkingImage
+
+
+def _screenshot(size=(400, 300)):
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    for y in range(0, size[1], 10):
+        draw.line((0, y, size[0], y), fill=(y % 256, 120, 200))
+    return image
+
+
+def _same(a, b):
+    return ImageChops.difference(a, b).getbbox() is None
+
+
+def _full_preview(working, size):
+    return working.image.resize(size, Image.Resampling.LANCZOS)
+
+
+def test_copy_on_write_keeps_source():
+    source = _screenshot()
+    original = source.copy()
+    working = WorkingImage(source, copy=True)
+    assert working.image is source
+
+    working.apply_edits([RegionEdit(10, 10, 120, 40, "¥999.00")])
+    assert working.image is not source
+    assert _same(source, original)
+    assert not _same(working.image, original)
+
+
+def test_edits_in_place_without_copy():
+    source = _screenshot()
+    working = WorkingImage(source)
+    working.apply_edits([RegionEdit(10, 10, 120, 40, "¥999.00", bg_color="yellow")])
+    assert working.image is source
+    assert source.getpixel((12, 12)) == (255, 255, 0)
+
+
+def test_keeps_source_mode_and_alpha():
+    source = _screenshot().convert("RGBA")
+    source.putpixel((399, 299), (0, 0, 0, 0))
+    working = WorkingImage(source)
+    working.apply_edits([RegionEdit(10, 10, 120, 40, "¥999.00", bg_color="yellow")])
+    working.add_watermark("测试水印", "center")
+
+    assert working.image is source
+    assert source.mode == "RGBA"
+    assert source.getpixel((12, 12)) == (255, 255, 0, 255)
+    assert source.getpixel((399, 299)) == (0, 0, 0, 0)
+
+    gray = WorkingImage(_screenshot().convert("L"))
+    gray.apply_edits([RegionEdit(10, 10, 120, 40, "a", bg_color="white")])
+    assert gray.image.mode == "L"
+    assert gray.preview((200, 150)).mode == "L"
+
+
+def test_converts_palette_images():
+    opaque = _screenshot().convert("P")
+    assert WorkingImage(opaque).image.mode == "RGB"
+
+    transparent = Image.new("P", (40, 30), 0)
+    transparent.info["transparency"] = 0
+    working = WorkingImage(transparent)
+    assert working.image.mode == "RGBA"
+    assert working.image.getpixel((0, 0))[3] == 0
+
+
+def test_undo_restores_each_step():
+    original = _screenshot()
+    working = WorkingImage(original.copy())
+    working.apply_edits([
+        RegionEdit(10, 10, 150, 50, "第一处"),
+        RegionEdit(100, 30, 150, 50, "重叠", bg_color="black", text_color="white"),
+    ])
+    after_first_step = working.snapshot()
+    working.add_watermark("仅供内部培训使用", "bottom-right")
+    assert working.can_undo
+
+    assert working.undo()
+    assert _same(working.image, after_first_step)
+    assert working.undo()
+    assert _same(working.image, original)
+    assert not working.can_undo
+    assert not working.undo()
+
+
+def test_reset_discards_all_edits():
+    original = _screenshot()
+    for copy in (True, False):
+        working = WorkingImage(original.copy(), copy=copy)
+        working.apply_edits([RegionEdit(20, 20, 100, 40, "a")])
+        working.apply_edits([RegionEdit(200, 100, 100, 40, "b")])
+        working.reset()
+        assert _same(working.image, original)
+        assert working.dirty == []
+        assert not working.can_undo
+
+
+def test_dirty_covers_changed_pixels():
+    original = _screenshot()
+    working = WorkingImage(original.copy())
+    working.apply_edits([RegionEdit(30, 40, 100, 30, "¥12.50")])
+
+    changed = ImageChops.difference(working.image, original).getbbox()
+    left, top, right, bottom = working.dirty[0]
+    assert left <= changed[0] and top <= changed[1] and right >= changed[2] and bottom >= changed[3]
+    assert (left, top) == (30, 40)
+
+
+def test_incremental_preview_matches_full_resize():
+    size = (200, 150)
+    working = WorkingImage(_screenshot())
+    assert _same(working.preview(size), _full_preview(working, size))
+
+    working.apply_edits([RegionEdit(50, 60, 120, 40, "¥999.00")])
+    assert _same(working.preview(size), _full_preview(working, size))
+    working.undo()
+    assert _same(working.preview(size), _full_preview(working, size))
+
+
+def test_preview_after_full_size_preview_is_not_stale():
+    size = (200, 150)
+    working = WorkingImage(_screenshot())
+    working.preview(size)
+    working.apply_edits([RegionEdit(50, 60, 120, 40, "¥999.00", bg_color="black")])
+
+    assert working.preview(working.size) is working.image
+    assert _same(working.preview(size), _full_preview(working, size))
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""流式 PNG 写入：分段写入后用 PIL 读回，与原图逐像素一致"""
+
+import pytest
+from PIL import Image, ImageChops, ImageDraw
+
+import png_stream
+from png_stream import PngStreamWriter
+
+
+def _sample(width, height):
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    for y in range(0, height, 7):
+        draw.line((0, y, width, height - y), fill=(y % 256, 40, 200 - y % 200))
+    draw.rectangle((10, 10, width // 2, height // 3), fill="red")
+    return image
+
+
+def test_round_trip_in_bands(tmp_path):
+    image = _sample(120, 500)
+    output = tmp_path / "long.png"
+    with PngStreamWriter(str(output), width=image.width) as writer:
+        for top in range(0, image.height, 130):
+            writer.write_rows(image.crop((0, top, image.width, min(top + 130, image.height))))
+
+    with Image.open(output) as loaded:
+        loaded.load()
+        assert loaded.size == image.size
+        assert loaded.mode == "RGB"
+        assert ImageChops.difference(loaded, image).getbbox() is None
+
+
+def test_many_idat_chunks(tmp_path, monkeypatch):
+    # 压缩数据超过块大小时拆成多个 IDAT，读回结果不变
+    monkeypatch.setattr(png_stream, "IDAT_CHUNK_SIZE", 64)
+    image = _sample(64, 200)
+    output = tmp_path / "chunks.png"
+    with PngStreamWriter(str(output), width=image.width, compress_level=0) as writer:
+        writer.write_rows(image)
+
+    assert output.read_bytes().count(b"IDAT") > 1
+    with Image.open(output) as loaded:
+        assert ImageChops.difference(loaded.convert("RGB"), image).getbbox() is None
+
+
+def test_converts_non_rgb_rows(tmp_path):
+    band = Image.new("RGBA", (16, 8), (0, 128, 255, 100))
+    output = tmp_path / "rgba.png"
+    with PngStreamWriter(str(output), width=16) as writer:
+        writer.write_rows(band)
+
+    with Image.open(output) as loaded:
+        assert loaded.size == (16, 8)
+        assert loaded.getpixel((0, 0)) == (0, 128, 255)
+
+
+def test_rejects_wrong_width(tmp_path):
+    with PngStreamWriter(str(tmp_path / "bad.png"), width=10) as writer:
+        with pytest.raises(ValueError):
+            writer.write_rows(Image.new("RGB", (11, 4)))
+
+
+def test_abort_removes_partial_file(tmp_path):
+    output = tmp_path / "partial.png"
+    writer = PngStreamWriter(str(output), width=32)
+    writer.write_rows(_sample(32, 40))
+    writer.abort()
+    assert not output.exists()
+    writer.abort()
+
+
+def test_exception_in_with_block_aborts(tmp_path):
+    output = tmp_path / "partial.png"
+    with pytest.raises(RuntimeError):
+        with PngStreamWriter(str(output), width=32) as writer:
+            writer.write_rows(_sample(32, 40))
+            raise RuntimeError("页面关闭了")
+    assert not output.exists()
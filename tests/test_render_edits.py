@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""批量套用编辑规格：输出格式跟随目标文件的扩展名"""
+
+import pytest
+from PIL import Image
+
+import render_edits
+from edit_spec import EditSpec
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("out.png", "PNG"),
+    ("out.jpg", "JPEG"),
+    ("out.webp", "WEBP"),
+    ("out.bmp", "BMP"),
+])
+def test_render_one_saves_by_suffix(tmp_path, name, expected):
+    source = tmp_path / "source.png"
+    Image.new("RGBA", (64, 48), (255, 0, 0, 255)).save(source)
+    render_edits._init_worker(EditSpec().as_dict())
+
+    target = tmp_path / "out" / name
+    record = render_edits.render_one(str(source), str(target))
+    assert record["ok"], record.get("error")
+    with Image.open(target) as result:
+        assert result.format == expected
+        assert result.size == (64, 48)